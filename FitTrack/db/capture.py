@@ -0,0 +1,50 @@
+"""
+Query capture for the index advisor.
+
+When ``QUERY_CAPTURE_FILE`` is set, ``QueryCaptureMiddleware`` appends every
+SQL statement a request runs to that file as JSON lines, ready for
+``manage.py index_advisor`` to replay through EXPLAIN QUERY PLAN.
+"""
+import datetime
+import decimal
+import json
+import threading
+
+_lock = threading.Lock()
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, memoryview)):
+        return None
+    return value
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` hook that logs statements to a file"""
+    
+    def __init__(self, path, alias):
+        self.path = path
+        self.alias = alias
+    
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            record = {
+                'alias': self.alias,
+                'sql': sql,
+                'params': [_jsonable(p) for p in params or ()],
+            }
+            with _lock, open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        return result
+
+
+def read_captured(path):
+    """Yield captured statements from a capture file"""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
@@ -0,0 +1,101 @@
+"""
+SQLite backend tuned for concurrent web traffic.
+
+Wraps Django's stock sqlite3 backend and, on every new connection, applies
+the pragmas in ``DEFAULT_PRAGMAS`` (overridable through
+``OPTIONS['pragmas']``). Statements that hit "database is locked" outside of
+an open transaction are retried with jittered exponential backoff, which
+covers the BEGIN IMMEDIATE that starts every atomic block when
+``OPTIONS['transaction_mode']`` is ``'IMMEDIATE'``.
+
+Extra OPTIONS understood by this backend:
+
+    pragmas        dict of PRAGMA name -> value, merged over DEFAULT_PRAGMAS
+    lock_retries   how many times a locked statement is retried (default 5)
+    lock_backoff   base backoff in seconds (default 0.05)
+"""
+import random
+import sqlite3
+import time
+
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,          # milliseconds
+    'cache_size': -20000,          # negative means KiB, i.e. ~20 MB
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+LOCK_RETRIES = 5
+LOCK_BACKOFF = 0.05
+LOCK_BACKOFF_MAX = 2.0
+
+
+def apply_pragmas(conn, pragmas):
+    """Run PRAGMA statements on a raw sqlite3 connection"""
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+def is_lock_error(exc):
+    """Whether an OperationalError is SQLite lock contention"""
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def retry_on_lock(func, retries=LOCK_RETRIES, backoff=LOCK_BACKOFF):
+    """Call ``func`` and retry it with full-jitter backoff on lock errors"""
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except sqlite3.OperationalError as exc:
+            if attempt == retries or not is_lock_error(exc):
+                raise
+            time.sleep(random.uniform(0, min(LOCK_BACKOFF_MAX, backoff * 2 ** attempt)))
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    """Cursor that retries statements rejected because the database is locked"""
+    
+    retries = LOCK_RETRIES
+    backoff = LOCK_BACKOFF
+    
+    def _retryable(self, query):
+        # Inside a transaction SQLite may return BUSY to break a deadlock;
+        # retrying the statement there would only spin, so give up at once.
+        return not self.connection.in_transaction or query.lstrip().upper().startswith('BEGIN')
+    
+    def execute(self, query, params=None):
+        if not self._retryable(query):
+            return super().execute(query, params)
+        return retry_on_lock(lambda: super(RetryingCursorWrapper, self).execute(query, params), self.retries, self.backoff)
+    
+    def executemany(self, query, param_list):
+        if not self._retryable(query):
+            return super().executemany(query, param_list)
+        param_list = list(param_list)
+        return retry_on_lock(lambda: super(RetryingCursorWrapper, self).executemany(query, param_list), self.retries, self.backoff)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {**DEFAULT_PRAGMAS, **kwargs.pop('pragmas', {})}
+        self.lock_retries = kwargs.pop('lock_retries', LOCK_RETRIES)
+        self.lock_backoff = kwargs.pop('lock_backoff', LOCK_BACKOFF)
+        return kwargs
+    
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        apply_pragmas(conn, self.pragmas)
+        return conn
+    
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.retries = self.lock_retries
+        cursor.backoff = self.lock_backoff
+        return cursor
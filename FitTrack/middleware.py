@@ -0,0 +1,73 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import routers, sharding
+from .db.capture import QueryRecorder
+
+SESSION_KEY = '_db_last_write_at'
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Pin a user's reads to the primary database for REPLICA_STICKY_SECONDS
+    after they write, so they read their own writes despite replica lag.
+    Must come after SessionMiddleware.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if not routers.replica_enabled():
+            return self.get_response(request)
+        
+        window = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        last_write = request.session.get(SESSION_KEY, 0)
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS') or time.time() - last_write < window
+        
+        token = routers.begin_request(pinned=pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.end_request(token)
+        
+        if wrote:
+            request.session[SESSION_KEY] = time.time()
+        return response
+
+
+class ShardMiddleware:
+    """
+    Bind the logged-in user to the request so per-user tables are routed to
+    their shard. Must come after AuthenticationMiddleware.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if not sharding.sharding_enabled() or not request.user.is_authenticated:
+            return self.get_response(request)
+        
+        with sharding.use_shard(request.user.id):
+            return self.get_response(request)
+
+
+class QueryCaptureMiddleware:
+    """Record each request's SELECTs to QUERY_CAPTURE_FILE for index_advisor"""
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        path = getattr(settings, 'QUERY_CAPTURE_FILE', None)
+        if not path:
+            return self.get_response(request)
+        
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(QueryRecorder(path, conn.alias)))
+            return self.get_response(request)
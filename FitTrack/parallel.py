@@ -0,0 +1,37 @@
+"""
+Run a function over many items in a pool of spawned processes.
+
+Used by the rebuild commands to fan per-user work out across CPUs. Each
+child runs ``django.setup()`` and opens its own database connections; the
+function is passed by dotted path so this module stays importable before
+the app registry is ready.
+"""
+import multiprocessing
+from functools import partial
+
+from django.db import connections
+from django.utils.module_loading import import_string
+
+
+def _setup():
+    import django
+    django.setup()
+
+
+def _call(func_path, item):
+    return item, import_string(func_path)(item)
+
+
+def map_in_processes(func_path, items, processes=None, chunksize=16):
+    """Yield ``(item, result)`` for every item, in completion order"""
+    if processes == 1:
+        func = import_string(func_path)
+        for item in items:
+            yield item, func(item)
+        return
+    
+    # Connections must not be shared with the children
+    connections.close_all()
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(processes, initializer=_setup) as pool:
+        yield from pool.imap_unordered(partial(_call, func_path), items, chunksize)
@@ -0,0 +1,117 @@
+"""
+Database routers for FitTrack.
+
+``PrimaryReplicaRouter`` sends reads to the ``replica`` alias and writes to
+``default``. Reads are pinned to the primary for the rest of a request once
+it has written, for unsafe (POST etc.) requests, and for
+``REPLICA_STICKY_SECONDS`` after a user's last write, so people always see
+their own changes even though the replica lags behind. The router is a
+no-op unless a ``replica`` database is configured.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICA = 'replica'
+PRIMARY = 'default'
+
+# Per-request routing state, installed by ReplicaStickinessMiddleware
+_request_state = ContextVar('db_request_state', default=None)
+_pinned = ContextVar('db_pinned', default=False)
+
+
+class ReplicaStats:
+    """Process-wide counters of where reads were routed"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.replica_reads = 0
+            self.primary_reads = 0
+    
+    def record(self, alias):
+        with self._lock:
+            if alias == REPLICA:
+                self.replica_reads += 1
+            else:
+                self.primary_reads += 1
+    
+    def snapshot(self):
+        with self._lock:
+            total = self.replica_reads + self.primary_reads
+            return {
+                'replica_reads': self.replica_reads,
+                'primary_reads': self.primary_reads,
+                'replica_share': round(self.replica_reads / total, 4) if total else 0.0,
+            }
+
+
+stats = ReplicaStats()
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def use_primary():
+    """Route every read inside the block to the primary"""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def begin_request(pinned=False):
+    """Start tracking writes for a request; returns a token for end_request"""
+    return _request_state.set({'pinned': pinned, 'wrote': False})
+
+
+def end_request(token):
+    """Stop tracking and report whether the request wrote anything"""
+    state = _request_state.get()
+    _request_state.reset(token)
+    return bool(state and state['wrote'])
+
+
+class PrimaryReplicaRouter:
+    
+    def _primary_only(self, model):
+        return model._meta.app_label in getattr(settings, 'REPLICA_PRIMARY_ONLY_APPS', ())
+    
+    def db_for_read(self, model, **hints):
+        if not replica_enabled():
+            return None
+        
+        state = _request_state.get()
+        pinned = _pinned.get() or (state and (state['pinned'] or state['wrote']))
+        alias = PRIMARY if pinned or self._primary_only(model) else REPLICA
+        stats.record(alias)
+        return alias
+    
+    def db_for_write(self, model, **hints):
+        if not replica_enabled():
+            return None
+        
+        state = _request_state.get()
+        if state is not None and not self._primary_only(model):
+            state['wrote'] = True
+        return PRIMARY
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, REPLICA}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a byte-for-byte copy of the primary (see sync_replica)
+        if db == REPLICA:
+            return False
+        return None
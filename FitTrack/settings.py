@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,16 +41,20 @@ INSTALLED_APPS = [
     'workouts',
     'nutrition',
     'core',
+    'jobs',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'FitTrack.middleware.ReplicaStickinessMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'FitTrack.middleware.ShardMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'FitTrack.middleware.QueryCaptureMiddleware',
 ]
 
 ROOT_URLCONF = 'FitTrack.urls'
@@ -75,13 +80,80 @@ WSGI_APPLICATION = 'FitTrack.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# FitTrack.db.sqlite3 wraps the stock backend to enable WAL and friends on
+# every connection and to retry statements rejected with "database is locked".
+# BEGIN IMMEDIATE takes the write lock up front so concurrent writers wait
+# instead of failing mid-transaction.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'FitTrack.db.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'lock_retries': 5,
+            'lock_backoff': 0.05,
+        },
     }
 }
 
+# Optional read replica: a second SQLite file refreshed from the primary with
+# `python manage.py sync_replica --interval 5`. Reads go to the replica except
+# right after the user has written (see FitTrack.routers).
+
+if os.environ.get('FITTRACK_READ_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Optional user sharding: FITTRACK_SHARDS=N adds N shard databases holding
+# the per-user tables (see FitTrack.sharding). Foreign keys into the global
+# tables cannot be enforced across files, so shards run with them off.
+
+SHARD_DATABASES = []
+
+for i in range(int(os.environ.get('FITTRACK_SHARDS', 0))):
+    alias = f'shard_{i}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db.{alias}.sqlite3',
+        'OPTIONS': {
+            **DATABASES['default']['OPTIONS'],
+            'pragmas': {'foreign_keys': 'OFF'},
+        },
+    }
+    SHARD_DATABASES.append(alias)
+
+DATABASE_ROUTERS = [
+    'FitTrack.sharding.ShardRouter',
+    'FitTrack.routers.PrimaryReplicaRouter',
+]
+
+# Seconds a user's reads stay on the primary after they write
+REPLICA_STICKY_SECONDS = 10
+
+# Apps whose reads must never see replica lag
+REPLICA_PRIMARY_ONLY_APPS = ['sessions', 'jobs']
+
+
+# Cache
+# Holds derived analytics (strength curves, ...) that are invalidated on write.
+# Point this at a shared backend when running several web processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fittrack',
+    }
+}
+
+# Set to a file path to capture SELECTs for `python manage.py index_advisor`
+QUERY_CAPTURE_FILE = os.environ.get('FITTRACK_QUERY_CAPTURE')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,3 +199,17 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Background jobs
+# Workers are started with `python manage.py run_workers`
+
+JOBS_POLL_INTERVAL = 1.0
+JOBS_BACKOFF_BASE = 5
+JOBS_BACKOFF_MAX = 3600
+JOBS_STALE_AFTER = 600
+JOBS_STALE_CHECK_INTERVAL = 60
+
+# Achievement thresholds (see core.rules)
+STREAK_THRESHOLDS = [3, 7, 14, 30, 60, 100, 365]
+WORKOUT_MILESTONES = [1, 10, 25, 50, 100, 250, 500]
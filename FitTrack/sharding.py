@@ -0,0 +1,171 @@
+"""
+User-sharded database layout.
+
+Per-user tables (see ``SHARDED_MODELS``) live on one of the
+``SHARD_DATABASES`` aliases, chosen per user: ``core.UserShard`` records
+explicit placements made by ``manage.py rebalance_shards``; everyone else is
+placed by ``user_id % len(SHARD_DATABASES)``. Shared catalogs (exercises,
+workouts, recipes, food items) and auth stay on ``default``.
+
+Django routers only see the model being queried, not the filter, so the
+shard is taken from the user bound to the current context:
+``ShardMiddleware`` binds ``request.user`` for each request and background
+jobs are bound to the user who enqueued them. Code running outside either
+can use ``use_shard(user_id)``. Queries on sharded models without a bound
+user fall through to ``default``.
+
+Shards carry the full schema, but their copies of the global tables are
+empty, so queries on sharded models must not join global tables: load the
+related catalog rows separately (see ``attach_global``).
+
+Sharding is disabled when ``SHARD_DATABASES`` is empty.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+GLOBAL = 'default'
+
+# Sharded model label -> lookup path from the model to its owning user
+SHARDED_MODELS = {
+    'workouts.workoutsession': 'user',
+    'workouts.exerciselog': 'session__user',
+    'workouts.personalrecord': 'user',
+    'workouts.weeklytrainingsummary': 'user',
+    'workouts.dirtytrainingweek': 'user',
+    'workouts.exercisehistory': 'user',
+    'workouts.sessiontarget': 'session__user',
+    'nutrition.nutritionlog': 'user',
+    'nutrition.meallog': 'nutrition_log__user',
+    'nutrition.mealsuggestion': 'user',
+    'core.goal': 'user',
+    'core.progresslog': 'user',
+    'core.achievement': 'user',
+    'core.weighttrend': 'user',
+    'core.dailyenergybalance': 'user',
+    'core.activityyear': 'user',
+    'core.trainingstreak': 'user',
+    'core.usercounters': 'user',
+}
+
+_context = ContextVar('shard_context', default=None)
+
+
+def shard_databases():
+    return list(getattr(settings, 'SHARD_DATABASES', []))
+
+
+def sharding_enabled():
+    return bool(shard_databases())
+
+
+def is_sharded(model):
+    """Whether a model (or model instance) lives on the user shards"""
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def lookup_shard(user_id):
+    """Resolve the shard alias for a user (one indexed query on the directory)"""
+    from core.models import UserShard
+    
+    alias = UserShard.objects.using(GLOBAL).filter(user_id=user_id).values_list('alias', flat=True).first()
+    if alias:
+        return alias
+    
+    shards = shard_databases()
+    return shards[user_id % len(shards)]
+
+
+def shard_for_user(user_id):
+    """Shard alias for a user, memoised for the current context"""
+    ctx = _context.get()
+    if ctx is not None and ctx['user_id'] == user_id:
+        if ctx['alias'] is None:
+            ctx['alias'] = lookup_shard(user_id)
+        return ctx['alias']
+    return lookup_shard(user_id)
+
+
+def current_user_id():
+    """The user bound to the current context, if any"""
+    ctx = _context.get()
+    return ctx['user_id'] if ctx else None
+
+
+@contextmanager
+def use_shard(user_id):
+    """Route sharded queries in the block to ``user_id``'s shard"""
+    token = _context.set({'user_id': user_id, 'alias': None} if user_id else None)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def attach_global(rows, field_name):
+    """
+    Fill the foreign key ``field_name`` of per-user ``rows`` with the global
+    rows it points at, loaded with one query on ``GLOBAL``. Shards only hold
+    empty copies of the global tables, so sharded querysets must not join
+    them (``select_related``, ``fk__field`` lookups).
+    """
+    rows = list(rows)
+    if not rows:
+        return rows
+    field = rows[0]._meta.get_field(field_name)
+    ids = {getattr(row, field.attname) for row in rows} - {None}
+    related = field.related_model.objects.using(GLOBAL).in_bulk(ids)
+    for row in rows:
+        field.set_cached_value(row, related.get(getattr(row, field.attname)))
+    return rows
+
+
+class ShardRouter:
+    
+    def _user_id_from_hints(self, model, hints):
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if isinstance(instance, get_user_model()):
+            return instance.pk
+        if isinstance(instance, model) and SHARDED_MODELS[model._meta.label_lower] == 'user':
+            return instance.user_id
+        return None
+    
+    def _route(self, model, **hints):
+        if not sharding_enabled():
+            return None
+        
+        instance = hints.get('instance')
+        if not is_sharded(model):
+            # Global tables: don't let related lookups follow a shard instance
+            if instance is not None and instance._state.db in shard_databases():
+                return GLOBAL
+            return None
+        
+        # Objects loaded from a shard stay on it
+        if instance is not None and instance._state.db in shard_databases():
+            return instance._state.db
+        
+        user_id = self._user_id_from_hints(model, hints) or current_user_id()
+        if user_id is None:
+            return None
+        return shard_for_user(user_id)
+    
+    def db_for_read(self, model, **hints):
+        return self._route(model, **hints)
+    
+    def db_for_write(self, model, **hints):
+        return self._route(model, **hints)
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Per-user rows on a shard may point at users and catalog rows on default
+        if sharding_enabled() and (is_sharded(obj1) or is_sharded(obj2)):
+            return True
+        return None
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every shard gets the full schema; only the per-user tables hold rows.
+        return None
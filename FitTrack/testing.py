@@ -0,0 +1,58 @@
+"""
+Test helpers for the sharded database layout.
+
+``ShardedTestCase`` adds in-memory shard databases next to the test
+``default`` database and enables sharding for the test class, so per-user
+rows land on a shard and catalog rows on ``default`` exactly as they do
+with ``FITTRACK_SHARDS`` set.
+"""
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import TestCase, override_settings
+
+from .sharding import lookup_shard
+
+SHARDS = ['shard_test_0', 'shard_test_1']
+
+
+def create_shards():
+    """Configure and migrate the test shard databases (once per test run)"""
+    default = connections.settings['default']
+    for alias in SHARDS:
+        if alias in connections.settings:
+            continue
+        connections.settings[alias] = {
+            **default,
+            'NAME': alias,
+            'TEST': {**default['TEST'], 'NAME': None, 'MIRROR': None},
+            'OPTIONS': {**default['OPTIONS'], 'pragmas': {'foreign_keys': 'OFF'}},
+        }
+        connections[alias].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+
+def user_on(shard, prefix):
+    """A new user placed on ``shard`` by the default id-modulo rule"""
+    for i in range(len(SHARDS) + 1):
+        user = User.objects.create_user(f'{prefix}{i}')
+        if lookup_shard(user.id) == shard:
+            return user
+    raise AssertionError(f'No user landed on {shard}')
+
+
+class ShardedTestCase(TestCase):
+    """TestCase with sharding enabled across ``SHARDS``"""
+
+    @classmethod
+    def setUpClass(cls):
+        # The shards only exist once created, so they can't be declared up
+        # front where the test runner would look for them in settings
+        create_shards()
+        cls.databases = {'default', *SHARDS}
+        cls._sharding = override_settings(SHARD_DATABASES=SHARDS)
+        cls._sharding.enable()
+        cls.addClassCleanup(cls._sharding.disable)
+        super().setUpClass()
+
+    def _should_check_constraints(self, connection):
+        # Shard rows point at users and catalog rows on default
+        return connection.alias not in SHARDS and super()._should_check_constraints(connection)
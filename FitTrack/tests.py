@@ -0,0 +1,271 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from core.models import ProgressLog, UserShard
+from jobs.models import Job
+from nutrition.models import MealLog, NutritionLog
+from workouts.models import Exercise, PersonalRecord
+from . import routers
+from .db.sqlite3.base import DatabaseWrapper, RetryingCursorWrapper, retry_on_lock
+from .middleware import SESSION_KEY, ReplicaStickinessMiddleware
+from .sharding import GLOBAL, ShardRouter, attach_global, lookup_shard, shard_for_user, use_shard
+from .testing import SHARDS, ShardedTestCase, user_on
+
+
+def locked():
+    return sqlite3.OperationalError('database is locked')
+
+
+class RetryOnLockTest(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('FitTrack.db.sqlite3.base.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_until_the_lock_clears(self):
+        func = mock.Mock(side_effect=[locked(), locked(), 'ok'])
+        self.assertEqual(retry_on_lock(func, retries=5, backoff=0.05), 'ok')
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_backoff_grows_and_is_capped(self):
+        func = mock.Mock(side_effect=[locked()] * 8 + ['ok'])
+        with mock.patch('FitTrack.db.sqlite3.base.random.uniform', side_effect=lambda low, high: high):
+            retry_on_lock(func, retries=8, backoff=0.05)
+        self.assertEqual([c.args[0] for c in self.sleep.call_args_list], [0.05, 0.1, 0.2, 0.4, 0.8, 1.6, 2.0, 2.0])
+
+    def test_gives_up_after_the_last_retry(self):
+        func = mock.Mock(side_effect=locked())
+        with self.assertRaises(sqlite3.OperationalError):
+            retry_on_lock(func, retries=2)
+        self.assertEqual(func.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        func = mock.Mock(side_effect=sqlite3.OperationalError('no such table: x'))
+        with self.assertRaises(sqlite3.OperationalError):
+            retry_on_lock(func)
+        self.assertEqual(func.call_count, 1)
+
+
+class SQLiteBackendTest(TestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -20000)
+
+    def test_statements_in_a_transaction_are_not_retried(self):
+        cursor = RetryingCursorWrapper(sqlite3.connect(':memory:'))
+        cursor.connection.execute('BEGIN')
+        self.assertFalse(cursor._retryable('UPDATE t SET a = 1'))
+        self.assertTrue(cursor._retryable('BEGIN IMMEDIATE'))
+        cursor.connection.rollback()
+        self.assertTrue(cursor._retryable('UPDATE t SET a = 1'))
+
+
+class LockContentionTest(SimpleTestCase):
+    """Two connections on one file: the second waits out the first's write lock"""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        for suffix in ('', '-wal', '-shm'):
+            self.addCleanup(lambda path=self.path + suffix: os.path.exists(path) and os.remove(path))
+        self.holder = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.addCleanup(self.holder.close)
+        # As left behind by the first connection through the backend
+        self.holder.execute('PRAGMA journal_mode = WAL')
+        self.holder.execute('CREATE TABLE counter (n INTEGER)')
+        self.holder.execute('INSERT INTO counter VALUES (0)')
+
+    def wrapper(self, retries):
+        db = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': self.path,
+            'OPTIONS': {'pragmas': {'busy_timeout': 0}, 'lock_retries': retries, 'lock_backoff': 0.02},
+        }, alias='lock_test')
+        self.addCleanup(db.close)
+        return db
+
+    def increment(self, db):
+        with db.cursor() as cursor:
+            cursor.execute('UPDATE counter SET n = n + 1')
+
+    def test_waits_for_the_lock(self):
+        db = self.wrapper(retries=20)
+        self.holder.execute('BEGIN IMMEDIATE')
+        release = threading.Timer(0.1, self.holder.execute, ['COMMIT'])
+        release.start()
+        self.addCleanup(release.cancel)
+
+        self.increment(db)
+        release.join()
+        self.assertEqual(self.holder.execute('SELECT n FROM counter').fetchone()[0], 1)
+
+    def test_fails_when_the_lock_is_held_too_long(self):
+        db = self.wrapper(retries=2)
+        self.holder.execute('BEGIN IMMEDIATE')
+        self.addCleanup(self.holder.execute, 'ROLLBACK')
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            self.increment(db)
+
+
+class PrimaryReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('FitTrack.routers.replica_enabled', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = routers.PrimaryReplicaRouter()
+        routers.stats.reset()
+
+    def test_noop_without_a_replica(self):
+        with mock.patch('FitTrack.routers.replica_enabled', return_value=False):
+            self.assertIsNone(self.router.db_for_read(ProgressLog))
+            self.assertIsNone(self.router.db_for_write(ProgressLog))
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        self.assertEqual(self.router.db_for_read(ProgressLog), 'replica')
+        self.assertEqual(self.router.db_for_write(ProgressLog), 'default')
+        with routers.use_primary():
+            self.assertEqual(self.router.db_for_read(ProgressLog), 'default')
+
+    def test_a_request_reads_its_own_writes(self):
+        token = routers.begin_request()
+        self.assertEqual(self.router.db_for_read(ProgressLog), 'replica')
+        self.router.db_for_write(ProgressLog)
+        self.assertEqual(self.router.db_for_read(ProgressLog), 'default')
+        self.assertTrue(routers.end_request(token))
+        self.assertEqual(self.router.db_for_read(ProgressLog), 'replica')
+
+    def test_pinned_requests_read_the_primary(self):
+        token = routers.begin_request(pinned=True)
+        self.assertEqual(self.router.db_for_read(ProgressLog), 'default')
+        self.assertFalse(routers.end_request(token))
+
+    def test_primary_only_apps(self):
+        token = routers.begin_request()
+        self.assertEqual(self.router.db_for_read(Job), 'default')
+        self.router.db_for_write(Job)
+        self.assertEqual(self.router.db_for_read(ProgressLog), 'replica')
+        self.assertFalse(routers.end_request(token))
+
+    def test_stats(self):
+        self.router.db_for_read(ProgressLog)
+        self.router.db_for_read(ProgressLog)
+        self.router.db_for_read(Job)
+        self.assertEqual(routers.stats.snapshot(), {'replica_reads': 2, 'primary_reads': 1, 'replica_share': 0.6667})
+
+    def test_the_replica_is_never_migrated(self):
+        self.assertIs(self.router.allow_migrate('replica', 'core'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+
+class ReplicaStickinessMiddlewareTest(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('FitTrack.routers.replica_enabled', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = routers.PrimaryReplicaRouter()
+        self.reads = []
+
+    def request(self, method='get', session=None, write=False):
+        def view(request):
+            self.reads.append(self.router.db_for_read(ProgressLog))
+            if write:
+                self.router.db_for_write(ProgressLog)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.session = session if session is not None else {}
+        ReplicaStickinessMiddleware(view)(request)
+        return request.session
+
+    def test_writes_pin_later_reads_for_a_while(self):
+        session = self.request(write=True)
+        self.assertIn(SESSION_KEY, session)
+        self.request(session=session)
+        with self.settings(REPLICA_STICKY_SECONDS=10):
+            session[SESSION_KEY] = time.time() - 11
+            self.request(session=session)
+        self.assertEqual(self.reads, ['replica', 'default', 'replica'])
+
+    def test_unsafe_methods_read_the_primary(self):
+        session = self.request(method='post')
+        self.assertEqual(self.reads, ['default'])
+        self.assertNotIn(SESSION_KEY, session)
+
+
+class ShardRouterTest(ShardedTestCase):
+
+    def setUp(self):
+        self.router = ShardRouter()
+        self.user = user_on(SHARDS[1], 'lifter')
+
+    def test_users_are_placed_by_id_unless_moved(self):
+        self.assertEqual(lookup_shard(self.user.id), SHARDS[self.user.id % len(SHARDS)])
+        UserShard.objects.create(user=self.user, alias=SHARDS[0])
+        self.assertEqual(lookup_shard(self.user.id), SHARDS[0])
+
+    def test_placement_is_looked_up_once_per_context(self):
+        with use_shard(self.user.id):
+            shard_for_user(self.user.id)
+            with self.assertNumQueries(0):
+                self.assertEqual(shard_for_user(self.user.id), SHARDS[1])
+
+    def test_per_user_models_follow_the_bound_user(self):
+        self.assertIsNone(self.router.db_for_read(ProgressLog))
+        with use_shard(self.user.id):
+            self.assertEqual(self.router.db_for_read(ProgressLog), SHARDS[1])
+            self.assertEqual(self.router.db_for_write(MealLog), SHARDS[1])
+            self.assertIsNone(self.router.db_for_read(Exercise))
+
+    def test_instances_route_their_own_rows(self):
+        other = user_on(SHARDS[0], 'other')
+        self.assertEqual(self.router.db_for_write(ProgressLog, instance=ProgressLog(user=other)), SHARDS[0])
+        self.assertEqual(self.router.db_for_read(ProgressLog, instance=other), SHARDS[0])
+
+        with use_shard(self.user.id):
+            log = NutritionLog.objects.create(user=self.user, date='2024-01-01')
+        self.assertEqual(log._state.db, SHARDS[1])
+        self.assertEqual(self.router.db_for_read(MealLog, instance=log), SHARDS[1])
+        # Related catalog and auth rows of a shard row come from default
+        self.assertEqual(self.router.db_for_read(User, instance=log), GLOBAL)
+
+    def test_relations_between_shards_and_default_are_allowed(self):
+        with use_shard(self.user.id):
+            log = NutritionLog.objects.create(user=self.user, date='2024-01-01')
+        self.assertIs(self.router.allow_relation(log, self.user), True)
+        self.assertIsNone(self.router.allow_relation(self.user, User()))
+
+    def test_disabled_without_shards(self):
+        with self.settings(SHARD_DATABASES=[]), use_shard(self.user.id):
+            self.assertIsNone(self.router.db_for_read(ProgressLog))
+
+    def test_attach_global_loads_catalog_rows_once(self):
+        squat = Exercise.objects.create(name='Squat', description='', category='strength', muscle_group='legs', instructions='')
+        with use_shard(self.user.id):
+            for record_type, value in [('weight', 100), ('reps', 12)]:
+                PersonalRecord.objects.create(user=self.user, exercise=squat, record_type=record_type, value=value, unit='kg')
+            records = list(PersonalRecord.objects.all())
+
+        with self.assertNumQueries(1, using=GLOBAL):
+            attached = attach_global(records, 'exercise')
+        self.assertEqual([record.exercise.name for record in attached], ['Squat', 'Squat'])
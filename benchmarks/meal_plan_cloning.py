@@ -0,0 +1,127 @@
+"""
+Meal plan creation and cloning benchmark.
+
+Builds plans of several lengths (six recipes a day) in a throwaway test
+database and compares, for each length:
+
+    create  one INSERT per day (the old create_meal_plan) vs. bulk_create
+    clone   copying row by row with .save() vs. nutrition.cloning.clone_plan
+
+reporting queries and wall time per operation. The bulk paths should show
+the same query count at every length.
+
+Usage:
+    python benchmarks/meal_plan_cloning.py --days 7 30 90 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FitTrack.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection, reset_queries  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from nutrition.cloning import clone_plan  # noqa: E402
+from nutrition.models import MealPlan, MealPlanDay, MealPlanRecipe, Recipe  # noqa: E402
+
+MEAL_TIMES = ['breakfast', 'morning_snack', 'lunch', 'afternoon_snack', 'dinner', 'evening_snack']
+
+
+def new_plan(user, days):
+    return MealPlan.objects.create(
+        creator=user, name=f'{days}-day plan', description='', plan_type='balanced', duration_days=days,
+        daily_calories=2000, daily_protein=150, daily_carbs=200, daily_fats=70,
+    )
+
+
+def create_looped(user, days):
+    plan = new_plan(user, days)
+    for day_num in range(1, days + 1):
+        MealPlanDay.objects.create(meal_plan=plan, day_number=day_num)
+    return plan
+
+
+def create_bulk(user, days):
+    plan = new_plan(user, days)
+    MealPlanDay.objects.bulk_create([MealPlanDay(meal_plan=plan, day_number=n) for n in range(1, days + 1)])
+    return plan
+
+
+def fill(plan, recipes):
+    MealPlanRecipe.objects.bulk_create([
+        MealPlanRecipe(meal_plan_day=day, recipe=recipes[(day.day_number + i) % len(recipes)], meal_time=meal_time)
+        for day in plan.days.all()
+        for i, meal_time in enumerate(MEAL_TIMES)
+    ])
+
+
+def clone_looped(plan, user):
+    clone = MealPlan.objects.get(pk=plan.pk)
+    clone.pk, clone.creator, clone.is_public = None, user, False
+    clone.save()
+    for day in plan.days.all():
+        entries = list(day.recipes.all())
+        day.pk, day.meal_plan = None, clone
+        day.save()
+        for entry in entries:
+            entry.pk, entry.meal_plan_day = None, day
+            entry.save()
+    return clone
+
+
+def measure(fn, repeat):
+    timings, queries = [], 0
+    for _ in range(repeat):
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        queries = len(captured)
+    return queries, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 30, 90])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user('bench')
+        recipes = Recipe.objects.bulk_create([
+            Recipe(name=f'Recipe {i}', description='', meal_type='lunch', calories=400 + i,
+                   protein=30, carbs=40, fats=12, prep_time=5, cook_time=10, ingredients='', instructions='')
+            for i in range(50)
+        ])
+
+        print(f"{'days':>5} {'op':>7} {'looped':>22} {'bulk':>22}")
+        for days in args.days:
+            source = create_bulk(user, days)
+            fill(source, recipes)
+            rows = [
+                ('create', measure(lambda: create_looped(user, days), args.repeat),
+                 measure(lambda: create_bulk(user, days), args.repeat)),
+                ('clone', measure(lambda: clone_looped(source, user), args.repeat),
+                 measure(lambda: clone_plan(source, user), args.repeat)),
+            ]
+            for op, (slow_q, slow_t), (fast_q, fast_t) in rows:
+                print(
+                    f"{days:>5} {op:>7} {slow_q:>6} queries {slow_t * 1000:7.1f}ms "
+                    f"{fast_q:>6} queries {fast_t * 1000:7.1f}ms"
+                )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
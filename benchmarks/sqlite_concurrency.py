@@ -0,0 +1,155 @@
+"""
+Concurrency benchmark for the SQLite backend settings.
+
+Simulates the add_meal_log write path (read the day's log, insert a meal,
+bump the day's totals) from several processes at once, plus readers doing
+what nutrition_log does, and compares:
+
+    stock   Django's defaults: rollback journal, deferred transactions
+    tuned   FitTrack.db.sqlite3: DEFAULT_PRAGMAS, BEGIN IMMEDIATE, lock retries
+
+Usage:
+    python benchmarks/sqlite_concurrency.py --writers 8 --readers 4 --transactions 200
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FitTrack.db.sqlite3.base import DEFAULT_PRAGMAS, apply_pragmas, is_lock_error, retry_on_lock  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE nutrition_log (id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT,
+                            total_calories INTEGER DEFAULT 0, UNIQUE (user_id, date));
+CREATE TABLE meal_log (id INTEGER PRIMARY KEY, nutrition_log_id INTEGER, meal_name TEXT, calories INTEGER);
+"""
+
+
+def connect(path, tuned):
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    if tuned:
+        apply_pragmas(conn, DEFAULT_PRAGMAS)
+    return conn
+
+
+def write_once(conn, tuned, user_id):
+    begin = 'BEGIN IMMEDIATE' if tuned else 'BEGIN'
+    if tuned:
+        retry_on_lock(lambda: conn.execute(begin))
+    else:
+        conn.execute(begin)
+    try:
+        # get_or_create: the read takes a shared lock that must later be upgraded
+        row = conn.execute(
+            "SELECT id FROM nutrition_log WHERE user_id = ? AND date = '2026-01-01'", (user_id,)
+        ).fetchone()
+        if row:
+            log_id = row[0]
+        else:
+            log_id = conn.execute(
+                "INSERT INTO nutrition_log (user_id, date) VALUES (?, '2026-01-01')", (user_id,)
+            ).lastrowid
+        conn.execute("INSERT INTO meal_log (nutrition_log_id, meal_name, calories) VALUES (?, 'Oats', 350)", (log_id,))
+        conn.execute("UPDATE nutrition_log SET total_calories = total_calories + 350 WHERE id = ?", (log_id,))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def writer(path, tuned, transactions, user_id, results):
+    conn = connect(path, tuned)
+    latencies, errors = [], 0
+    started = time.time()
+    for _ in range(transactions):
+        start = time.perf_counter()
+        try:
+            write_once(conn, tuned, user_id)
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.OperationalError as exc:
+            if not is_lock_error(exc):
+                raise
+            errors += 1
+    results.put(('write', (started, time.time(), latencies), errors))
+
+
+def reader(path, tuned, stop, results):
+    conn = connect(path, tuned)
+    reads, errors = 0, 0
+    while not stop.is_set():
+        try:
+            conn.execute('SELECT SUM(calories) FROM meal_log WHERE nutrition_log_id = 1').fetchone()
+            reads += 1
+        except sqlite3.OperationalError as exc:
+            if not is_lock_error(exc):
+                raise
+            errors += 1
+    results.put(('read', reads, errors))
+
+
+def run(mode, writers, readers, transactions):
+    tuned = mode == 'tuned'
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.sqlite3')
+        setup = connect(path, tuned)
+        setup.executescript(SCHEMA)
+        setup.close()
+        
+        ctx = multiprocessing.get_context('spawn')
+        results, stop = ctx.Queue(), ctx.Event()
+        procs = [ctx.Process(target=reader, args=(path, tuned, stop, results)) for _ in range(readers)]
+        write_procs = [ctx.Process(target=writer, args=(path, tuned, transactions, i, results)) for i in range(writers)]
+        
+        for proc in procs + write_procs:
+            proc.start()
+        for proc in write_procs:
+            proc.join()
+        stop.set()
+        for proc in procs:
+            proc.join()
+        
+        latencies, spans, write_errors, reads, read_errors = [], [], 0, 0, 0
+        for _ in range(writers + readers):
+            kind, value, errors = results.get()
+            if kind == 'write':
+                started, finished, writer_latencies = value
+                spans.append((started, finished))
+                latencies.extend(writer_latencies)
+                write_errors += errors
+            else:
+                reads += value
+                read_errors += errors
+    
+    # Measure from the first writer starting to the last one finishing,
+    # so process start-up time is not counted
+    elapsed = max(end for _, end in spans) - min(start for start, _ in spans)
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(
+        f"{mode:>6}: {len(latencies):>6} commits in {elapsed:6.2f}s "
+        f"({len(latencies) / elapsed:8.1f}/s)  locked writes: {write_errors:>5}  "
+        f"reads: {reads:>7} (locked {read_errors})  "
+        f"p50 {statistics.median(latencies or [0]) * 1000:6.2f}ms  p95 {p95 * 1000:6.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--transactions', type=int, default=200, help='Transactions per writer')
+    args = parser.parse_args()
+    
+    print(f"{args.writers} writers x {args.transactions} transactions, {args.readers} readers")
+    for mode in ('stock', 'tuned'):
+        run(mode, args.writers, args.readers, args.transactions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Achievement engine.
+
+Domain code emits events (``emit(user_id, 'session_completed', ...)``)
+together with the counter changes they imply. The user's counters live in
+UserCounters and are cached, so evaluating an event is a counter update plus
+the rules indexed under that event (see core.rules) -- never a scan of the
+user's history, except once to seed a user's counters the first time they are
+needed.
+
+Every automatically awarded Achievement carries a ``code`` that is unique
+per user, so awards are written with ``ignore_conflicts`` and re-evaluating
+the same milestone never duplicates it.
+"""
+from django.core.cache import cache
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast
+
+from .models import Achievement, DailyEnergyBalance, Goal, ProgressLog, TrainingStreak, UserCounters
+from .rules import RULES, RULES_BY_EVENT
+
+COUNTERS = [
+    'workouts_completed',
+    'longest_streak',
+    'total_volume',
+    'personal_records',
+    'progress_logs',
+    'weight_goals_reached',
+    'nutrition_days_on_target',
+]
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def award(user_id, specs):
+    """
+    Write achievements for a user, skipping any already earned.
+    ``specs`` are dicts with code, achievement_type, title, description and
+    optionally icon.
+    """
+    rows = [Achievement(user_id=user_id, **spec) for spec in specs]
+    if rows:
+        Achievement.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def cache_key(user_id):
+    return f'achievement-counters:{user_id}'
+
+
+def stored_counters(user_id):
+    """The user's counters as a dict, from the cache when possible; None without a row"""
+    key = cache_key(user_id)
+    values = cache.get(key)
+    if values is None:
+        values = UserCounters.objects.filter(user_id=user_id).values(*COUNTERS).first()
+        if values is not None:
+            cache.set(key, values, CACHE_TIMEOUT)
+    return values
+
+
+def counters(user_id):
+    """The user's counters as a dict, seeded from their history on first use"""
+    values = stored_counters(user_id)
+    return values if values is not None else rebuild_user(user_id)
+
+
+def emit(user_id, event, add=None, values=None):
+    """
+    Apply an event's counter changes -- ``add`` increments, ``values`` sets --
+    and award whatever the rules listening to ``event`` now grant.
+    Returns the counters after the event.
+    """
+    add = {k: v for k, v in (add or {}).items() if v}
+    before = stored_counters(user_id)
+    if before is None:
+        # Events fire once their change is saved, so seeding the counters
+        # from history already counts (and awards) this one
+        return rebuild_user(user_id)
+    after = before
+
+    if add or values:
+        changes = {name: F(name) + delta for name, delta in add.items()}
+        changes.update(values or {})
+        UserCounters.objects.filter(user_id=user_id).update(**changes)
+        after = UserCounters.objects.filter(user_id=user_id).values(*COUNTERS).first()
+        if after is None:
+            # The cached row is gone
+            return rebuild_user(user_id)
+        cache.set(cache_key(user_id), after, CACHE_TIMEOUT)
+        # Increments are exact even if the cached copy was stale
+        before = {**before, **{name: after[name] - delta for name, delta in add.items()}}
+
+    rules = RULES_BY_EVENT.get(event, [])
+    award(user_id, [spec for rule in rules for spec in rule.crossed(before, after)])
+    return after
+
+
+def rebuild_user(user_id):
+    """
+    Recompute a user's counters from their history and award everything they
+    have earned. Maintenance only; events keep the counters current.
+    """
+    from workouts.models import ExerciseLog, PersonalRecord
+
+    streak = TrainingStreak.objects.filter(user_id=user_id).first()
+    volume = ExerciseLog.objects.filter(session__user_id=user_id).aggregate(
+        total=Sum(
+            Cast('sets_completed', FloatField()) * Cast('reps_completed', FloatField()) * Cast('weight_used', FloatField())
+        )
+    )['total']
+    goals = Goal.objects.filter(user_id=user_id, target_weight__isnull=False).aggregate(
+        reached=Count('id', filter=Q(status='completed') | Q(progress_percentage__gte=100))
+    )['reached']
+
+    values = {
+        'workouts_completed': streak.workouts_completed if streak else 0,
+        'longest_streak': streak.longest if streak else 0,
+        'total_volume': volume or 0,
+        'personal_records': PersonalRecord.objects.filter(user_id=user_id).count(),
+        'progress_logs': ProgressLog.objects.filter(user_id=user_id).count(),
+        'weight_goals_reached': goals,
+        'nutrition_days_on_target': DailyEnergyBalance.objects.filter(user_id=user_id, on_target=True).count(),
+    }
+    UserCounters.objects.update_or_create(user_id=user_id, defaults=values)
+    cache.set(cache_key(user_id), values, CACHE_TIMEOUT)
+
+    award(user_id, [spec for rule in RULES for spec in rule.crossed({}, values)])
+    return values
@@ -0,0 +1,137 @@
+"""
+Activity heatmaps backed by per-user day bitmaps.
+
+Each (user, year, kind) has a 46-byte bitmap with one bit per day of the
+year (bit ``n`` is day-of-year ``n + 1``, least significant bit first within
+each byte). Writes to WorkoutSession, MealLog and ProgressLog flip the bit
+for their day, so rendering a year is a single row read and several
+years of all three kinds fit in a few hundred bytes of JSON.
+
+A training day is a day with a completed workout session, a nutrition day
+one with a logged meal (an empty NutritionLog, e.g. from opening the day or
+tapping in water, doesn't count) and a progress day one with a progress log.
+"""
+import base64
+import datetime
+
+from django.db import router, transaction
+
+from nutrition.models import MealLog
+from workouts.models import WorkoutSession
+from .models import ActivityYear, ProgressLog
+
+BITMAP_BYTES = 46  # 366 bits
+
+# Kind -> (model, user field, date field, extra filter)
+SOURCES = {
+    'workout': (WorkoutSession, 'user_id', 'scheduled_date', {'status': 'completed'}),
+    'nutrition': (MealLog, 'nutrition_log__user_id', 'nutrition_log__date', {}),
+    'progress': (ProgressLog, 'user_id', 'date', {}),
+}
+
+
+def _as_date(day):
+    return day if isinstance(day, datetime.date) else datetime.date.fromisoformat(str(day))
+
+
+def bit_index(day):
+    return day.timetuple().tm_yday - 1
+
+
+def set_bit(bits, day, active):
+    index = bit_index(day)
+    if active:
+        bits[index >> 3] |= 1 << (index & 7)
+    else:
+        bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+
+def mark(user_id, kind, day, active=True):
+    """Set or clear one day's bit"""
+    day = _as_date(day)
+    with transaction.atomic(using=router.db_for_write(ActivityYear)):
+        rows = ActivityYear.objects.select_for_update()
+        if active:
+            row, _ = rows.get_or_create(
+                user_id=user_id, year=day.year, kind=kind,
+                defaults={'bits': bytes(BITMAP_BYTES)},
+            )
+        else:
+            row = rows.filter(user_id=user_id, year=day.year, kind=kind).first()
+            if row is None:
+                return
+        bits = bytearray(row.bits)
+        set_bit(bits, day, active)
+        if bits != row.bits:
+            ActivityYear.objects.filter(pk=row.pk).update(bits=bytes(bits))
+
+
+def mark_days(user_id, kind, days, active=True):
+    """Set or clear the bits for many days at once (one locked read-modify-write per year)"""
+    by_year = {}
+    for day in {_as_date(d) for d in days}:
+        by_year.setdefault(day.year, []).append(day)
+
+    with transaction.atomic(using=router.db_for_write(ActivityYear)):
+        for year, year_days in by_year.items():
+            rows = ActivityYear.objects.select_for_update()
+            if active:
+                row, _ = rows.get_or_create(
+                    user_id=user_id, year=year, kind=kind,
+                    defaults={'bits': bytes(BITMAP_BYTES)},
+                )
+            else:
+                row = rows.filter(user_id=user_id, year=year, kind=kind).first()
+                if row is None:
+                    continue
+            bits = bytearray(row.bits)
+            for day in year_days:
+                set_bit(bits, day, active)
+            if bits != row.bits:
+                ActivityYear.objects.filter(pk=row.pk).update(bits=bytes(bits))
+
+
+def sync_day(user_id, kind, day):
+    """Re-derive one day's bit after a row was removed or changed"""
+    model, user_field, field, extra = SOURCES[kind]
+    day = _as_date(day)
+    active = model.objects.filter(**{user_field: user_id, field: day}, **extra).exists()
+    mark(user_id, kind, day, active)
+
+
+def heatmaps(user_id, years):
+    """{year: {kind: {'bits': base64, 'days': count}}} for the requested years"""
+    result = {str(year): {} for year in years}
+    for year, kind, bits in ActivityYear.objects.filter(user_id=user_id, year__in=years).values_list('year', 'kind', 'bits'):
+        bits = bytes(bits)
+        result[str(year)][kind] = {
+            'bits': base64.b64encode(bits).decode('ascii'),
+            'days': int.from_bytes(bits, 'little').bit_count(),
+        }
+    return result
+
+
+def rebuild(using=None):
+    """
+    Recompute every bitmap on a database from one ordered pass per kind.
+    Returns the number of bitmaps written.
+    """
+    rows = []
+    for kind, (model, user_field, field, extra) in SOURCES.items():
+        days = model.objects.using(using).filter(**extra).order_by(user_field, field).values_list(user_field, field).distinct()
+
+        current, bits = None, None
+        for user_id, day in days.iterator():
+            key = (user_id, day.year)
+            if key != current:
+                if current:
+                    rows.append(ActivityYear(user_id=current[0], year=current[1], kind=kind, bits=bytes(bits)))
+                current, bits = key, bytearray(BITMAP_BYTES)
+            set_bit(bits, day, True)
+        if current:
+            rows.append(ActivityYear(user_id=current[0], year=current[1], kind=kind, bits=bytes(bits)))
+
+    with transaction.atomic(using=using):
+        ActivityYear.objects.using(using).all().delete()
+        ActivityYear.objects.using(using).bulk_create(rows, batch_size=500)
+    return len(rows)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, Goal, ProgressLog, Achievement
+from .models import UserProfile, Goal, ProgressLog, Achievement, UserShard, WeightTrend, DailyEnergyBalance, ActivityYear, TrainingStreak, UserCounters
 
 
 @admin.register(UserProfile)
@@ -31,7 +31,7 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 @admin.register(Goal)
 class GoalAdmin(admin.ModelAdmin):
-    list_display = ['user', 'title', 'goal_type', 'status', 'progress_percentage', 'target_date']
+    list_display = ['user', 'title', 'goal_type', 'status', 'progress_percentage', 'target_date', 'projected_date']
     list_filter = ['goal_type', 'status', 'created_at']
     search_fields = ['user__username', 'title', 'description']
     readonly_fields = ['created_at', 'updated_at', 'completed_at']
@@ -42,10 +42,10 @@ class GoalAdmin(admin.ModelAdmin):
             'fields': ('user', 'goal_type', 'title', 'description')
         }),
         ('Targets', {
-            'fields': ('target_weight', 'target_date')
+            'fields': ('target_weight', 'target_date', 'start_weight')
         }),
         ('Progress', {
-            'fields': ('status', 'progress_percentage')
+            'fields': ('status', 'progress_percentage', 'projected_date')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at', 'completed_at'),
@@ -92,7 +92,7 @@ class AchievementAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Basic Info', {
-            'fields': ('user', 'achievement_type', 'title', 'icon')
+            'fields': ('user', 'achievement_type', 'title', 'icon', 'code')
         }),
         ('Description', {
             'fields': ('description',)
@@ -100,4 +100,48 @@ class AchievementAdmin(admin.ModelAdmin):
         ('Timestamp', {
             'fields': ('earned_at',)
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(UserShard)
+class UserShardAdmin(admin.ModelAdmin):
+    list_display = ['user', 'alias', 'moved_at']
+    list_filter = ['alias']
+    search_fields = ['user__username']
+    readonly_fields = ['moved_at']
+
+
+@admin.register(WeightTrend)
+class WeightTrendAdmin(admin.ModelAdmin):
+    list_display = ['user', 'as_of', 'trend_weight', 'weekly_rate', 'samples']
+    search_fields = ['user__username']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(DailyEnergyBalance)
+class DailyEnergyBalanceAdmin(admin.ModelAdmin):
+    list_display = ['user', 'date', 'intake', 'burned', 'baseline', 'net']
+    search_fields = ['user__username']
+    readonly_fields = ['updated_at']
+    date_hierarchy = 'date'
+
+
+@admin.register(ActivityYear)
+class ActivityYearAdmin(admin.ModelAdmin):
+    list_display = ['user', 'year', 'kind']
+    list_filter = ['kind', 'year']
+    search_fields = ['user__username']
+
+
+@admin.register(TrainingStreak)
+class TrainingStreakAdmin(admin.ModelAdmin):
+    list_display = ['user', 'current', 'longest', 'last_active', 'workouts_completed']
+    search_fields = ['user__username']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(UserCounters)
+class UserCountersAdmin(admin.ModelAdmin):
+    list_display = ['user', 'workouts_completed', 'longest_streak', 'total_volume', 'personal_records', 'progress_logs', 'weight_goals_reached', 'nutrition_days_on_target']
+    search_fields = ['user__username']
+    readonly_fields = ['updated_at']
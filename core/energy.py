@@ -0,0 +1,190 @@
+"""
+Energy balance: calories eaten against calories spent.
+
+Resting expenditure comes from the profile (Mifflin-St Jeor BMR) and is
+cached per user until the profile changes. TDEE applies the profile's
+activity multiplier; since that multiplier already allows for typical
+exercise, the daily timeline uses the sedentary baseline plus the calories
+of logged workouts instead, so training is not counted twice.
+
+Each day's intake (NutritionLog) and workout burn (WorkoutSession) are read
+in one UNION query and materialized into DailyEnergyBalance whenever either
+side changes; weekly and monthly views aggregate those rows in the database.
+Editing the profile fields behind the baseline re-materializes all of the
+user's days in a background job, so past rows and their on-target flags
+follow the new baseline.
+"""
+import datetime
+
+from django.core.cache import cache
+from django.db.models import F, IntegerField, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+
+from nutrition.models import NutritionLog
+from workouts.models import WorkoutSession
+from .achievements import emit
+from .models import DailyEnergyBalance, UserProfile
+
+ACTIVITY_FACTORS = {
+    'sedentary': 1.2,
+    'light': 1.375,
+    'moderate': 1.55,
+    'very': 1.725,
+    'extra': 1.9,
+}
+SEDENTARY_FACTOR = ACTIVITY_FACTORS['sedentary']
+
+# Mifflin-St Jeor sex constant; 'Other' uses the midpoint
+GENDER_OFFSETS = {'M': 5, 'F': -161, 'O': -78}
+
+# UserProfile fields the BMR/TDEE are computed from
+PROFILE_FIELDS = ['current_weight', 'height', 'date_of_birth', 'gender', 'activity_level']
+
+# A day is on target when intake is within this share of TDEE
+ADHERENCE_TOLERANCE = 0.1
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+PERIODS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def bmr(weight, height, age, gender):
+    """Basal metabolic rate in kcal/day, or None if the profile is incomplete"""
+    if not (weight and height and age is not None):
+        return None
+    return 10 * float(weight) + 6.25 * float(height) - 5 * age + GENDER_OFFSETS.get(gender, GENDER_OFFSETS['O'])
+
+
+def cache_key(user_id):
+    return f'energy:profile:{user_id}'
+
+
+def invalidate_profile(user_id):
+    """Forget the cached BMR/TDEE after the profile changes"""
+    cache.delete(cache_key(user_id))
+
+
+def profile_energy(user_id):
+    """{'bmr', 'tdee', 'baseline'} in kcal/day for a user (None values if unknown)"""
+    key = cache_key(user_id)
+    energy = cache.get(key)
+    if energy is None:
+        profile = UserProfile.objects.filter(user_id=user_id).first()
+        rate = bmr(profile.current_weight, profile.height, profile.age, profile.gender) if profile else None
+        factor = ACTIVITY_FACTORS.get(profile.activity_level, ACTIVITY_FACTORS['moderate']) if profile else None
+        energy = {
+            'bmr': round(rate) if rate else None,
+            'tdee': round(rate * factor) if rate else None,
+            'baseline': round(rate * SEDENTARY_FACTOR) if rate else None,
+        }
+        cache.set(key, energy, CACHE_TIMEOUT)
+    return energy
+
+
+def daily_totals(user_id, dates=None):
+    """
+    {date: (intake, burned)} for the user's logged days, optionally limited
+    to ``dates``, from a single UNION query over both apps.
+    """
+    intake = NutritionLog.objects.filter(user_id=user_id)
+    burned = WorkoutSession.objects.filter(user_id=user_id, status='completed')
+    if dates is not None:
+        intake = intake.filter(date__in=dates)
+        burned = burned.filter(scheduled_date__in=dates)
+
+    intake = intake.values('date').annotate(
+        intake=Coalesce(Sum('total_calories'), 0),
+        burned=Value(0, output_field=IntegerField()),
+    ).order_by()
+    burned = burned.values(date=F('scheduled_date')).annotate(
+        intake=Value(0, output_field=IntegerField()),
+        burned=Coalesce(Sum('calories_burned'), 0),
+    ).order_by()
+
+    totals = {}
+    for day, eaten, spent in intake.union(burned, all=True).values_list('date', 'intake', 'burned'):
+        previous = totals.get(day, (0, 0))
+        totals[day] = (previous[0] + eaten, previous[1] + spent)
+    return totals
+
+
+def _rows(user_id, totals):
+    energy = profile_energy(user_id)
+    baseline, tdee = energy['baseline'] or 0, energy['tdee']
+    return [
+        DailyEnergyBalance(
+            user_id=user_id,
+            date=day,
+            intake=eaten,
+            burned=spent,
+            baseline=baseline,
+            net=eaten - baseline - spent,
+            on_target=bool(tdee and eaten and abs(eaten - tdee) <= ADHERENCE_TOLERANCE * tdee),
+        )
+        for day, (eaten, spent) in totals.items()
+    ]
+
+
+def refresh_days(user_id, dates):
+    """Re-materialize the given days after either side of the balance changed"""
+    dates = {d if isinstance(d, datetime.date) else datetime.date.fromisoformat(str(d)) for d in dates if d}
+    if not dates:
+        return
+
+    totals = daily_totals(user_id, dates)
+    rows = _rows(user_id, totals)
+    was_on_target = DailyEnergyBalance.objects.filter(user_id=user_id, date__in=dates, on_target=True).count()
+
+    empty = dates - set(totals)
+    if empty:
+        DailyEnergyBalance.objects.filter(user_id=user_id, date__in=empty).delete()
+    if rows:
+        DailyEnergyBalance.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=['intake', 'burned', 'baseline', 'net', 'on_target', 'updated_at'],
+        )
+
+    on_target = sum(row.on_target for row in rows)
+    if on_target != was_on_target:
+        emit(user_id, 'nutrition_day', add={'nutrition_days_on_target': on_target - was_on_target})
+
+
+def rebuild_user(user_id):
+    """Recompute every day for a user (e.g. after a profile change); returns the row count"""
+    rows = _rows(user_id, daily_totals(user_id))
+    was_on_target = DailyEnergyBalance.objects.filter(user_id=user_id, on_target=True).count()
+    DailyEnergyBalance.objects.filter(user_id=user_id).delete()
+    DailyEnergyBalance.objects.bulk_create(rows, batch_size=500)
+
+    on_target = sum(row.on_target for row in rows)
+    if on_target != was_on_target:
+        emit(user_id, 'nutrition_day', add={'nutrition_days_on_target': on_target - was_on_target})
+    return len(rows)
+
+
+def timeline(user_id, period='day', start=None, end=None):
+    """Materialized balance per day, or summed per week/month"""
+    rows = DailyEnergyBalance.objects.filter(user_id=user_id)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+
+    if period in PERIODS:
+        rows = rows.annotate(period=PERIODS[period]('date')).values('period').annotate(
+            intake=Sum('intake'), burned=Sum('burned'), baseline=Sum('baseline'), net=Sum('net'),
+        ).order_by('period')
+        return [
+            {'date': row['period'].isoformat(), **{k: row[k] for k in ('intake', 'burned', 'baseline', 'net')}}
+            for row in rows
+        ]
+
+    return [
+        {'date': row['date'].isoformat(), **{k: row[k] for k in ('intake', 'burned', 'baseline', 'net')}}
+        for row in rows.order_by('date').values('date', 'intake', 'burned', 'baseline', 'net')
+    ]
@@ -0,0 +1,197 @@
+"""
+Weight trend smoothing and goal forecasting.
+
+Daily weigh-ins are noisy, so goals are judged against an exponentially
+smoothed trend: each weigh-in folds SMOOTHING of its deviation into the
+trend per day elapsed (so gaps between weigh-ins are handled). The rate of
+change is the least-squares slope of the trend over the last four weeks, and
+active weight goals get their progress and projected completion date from
+the trend and rate.
+
+Users are processed together: their weigh-ins are padded into one
+[user, weigh-in] matrix and smoothed one column at a time, so a nightly batch
+over every user with an active weight goal costs one query and a few array
+passes per database. New or deleted ProgressLog rows refresh just that user
+through the same code. Goals whose progress reaches 100% raise a
+``goal_progress`` achievement event.
+"""
+import datetime
+from collections import Counter
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from FitTrack.sharding import use_shard
+from .achievements import emit
+from .models import Goal, ProgressLog, WeightTrend
+
+WINDOW_DAYS = 120
+SMOOTHING = 0.1
+
+RATE_WINDOW_DAYS = 28
+MIN_RATE_POINTS = 3
+MIN_RATE_SPAN_DAYS = 7
+
+MAX_PROJECTION_DAYS = 730
+
+
+def load_weights(user_ids, using=None, today=None):
+    """
+    One query for the weigh-ins in the window; returns (user_ids, days, weights)
+    arrays sorted by user then day, with days as date ordinals.
+    """
+    since = (today or datetime.date.today()) - datetime.timedelta(days=WINDOW_DAYS)
+    rows = ProgressLog.objects.using(using).filter(
+        user_id__in=user_ids,
+        weight__isnull=False,
+        date__gte=since,
+    ).order_by('user_id', 'date').values_list('user_id', 'date', Cast('weight', FloatField()))
+
+    users, days, weights = [], [], []
+    for user_id, day, weight in rows:
+        users.append(user_id)
+        days.append(day.toordinal())
+        weights.append(weight)
+    return np.array(users, dtype=np.int64), np.array(days, dtype=np.int64), np.array(weights, dtype=float)
+
+
+def fit_trends(users, days, weights):
+    """Smooth every user's series and fit the trend's recent rate of change"""
+    if not len(users):
+        return None
+
+    ids, start, counts = np.unique(users, return_index=True, return_counts=True)
+    row = np.repeat(np.arange(len(ids)), counts)
+    col = np.arange(len(users)) - np.repeat(start, counts)
+    width = counts.max()
+
+    valid = np.arange(width) < counts[:, None]
+    W = np.zeros((len(ids), width))
+    D = np.zeros((len(ids), width), dtype=np.int64)
+    W[row, col] = weights
+    D[row, col] = days
+
+    # Irregular spacing: a gap of g days decays the old trend by (1 - SMOOTHING) ** g
+    trend = np.empty_like(W)
+    trend[:, 0] = W[:, 0]
+    for j in range(1, width):
+        alpha = 1 - (1 - SMOOTHING) ** np.maximum(D[:, j] - D[:, j - 1], 1)
+        step = trend[:, j - 1] + alpha * (W[:, j] - trend[:, j - 1])
+        trend[:, j] = np.where(valid[:, j], step, trend[:, j - 1])
+
+    last = counts - 1
+    last_day = D[np.arange(len(ids)), last]
+
+    # Least-squares slope of the trend over the rate window
+    x = (D - last_day[:, None]).astype(float)
+    mask = valid & (x >= -RATE_WINDOW_DAYS)
+    n = mask.sum(axis=1)
+    sx = np.where(mask, x, 0).sum(axis=1)
+    sy = np.where(mask, trend, 0).sum(axis=1)
+    sxx = np.where(mask, x * x, 0).sum(axis=1)
+    sxy = np.where(mask, x * trend, 0).sum(axis=1)
+    span = -np.where(mask, x, 0).min(axis=1)
+    denom = n * sxx - sx * sx
+
+    fitted = (n >= MIN_RATE_POINTS) & (span >= MIN_RATE_SPAN_DAYS) & (denom > 0)
+    slope = np.full(len(ids), np.nan)
+    slope[fitted] = (n * sxy - sx * sy)[fitted] / denom[fitted]
+
+    return {
+        'users': ids,
+        'as_of': last_day,
+        'trend': trend[np.arange(len(ids)), last],
+        'weekly_rate': slope * 7,
+        'samples': counts,
+        'first_weight': W[:, 0],
+    }
+
+
+def forecast_goals(goals, fits):
+    """
+    Set progress_percentage, projected_date and (if missing) start_weight on
+    each goal from its owner's fit. Returns the goals that were updated.
+    """
+    index = {user_id: i for i, user_id in enumerate(fits['users'].tolist())}
+    goals = [g for g in goals if g.user_id in index]
+    if not goals:
+        return []
+
+    rows = np.array([index[g.user_id] for g in goals])
+    trend = fits['trend'][rows]
+    daily_rate = fits['weekly_rate'][rows] / 7
+    as_of = fits['as_of'][rows]
+    target = np.array([float(g.target_weight) for g in goals])
+    start = np.array([
+        float(g.start_weight) if g.start_weight is not None else fits['first_weight'][i]
+        for g, i in zip(goals, rows)
+    ])
+
+    span = start - target
+    remaining = target - trend
+    reached = remaining * np.sign(span) >= 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        progress = np.where(span != 0, (start - trend) / span, 1.0)
+        days_left = remaining / daily_rate
+    progress = np.clip(np.round(np.where(reached, 1.0, progress) * 100), 0, 100).astype(int)
+
+    on_track = np.isfinite(days_left) & (days_left > 0) & (days_left <= MAX_PROJECTION_DAYS)
+    projected = np.where(reached, as_of, np.where(on_track, as_of + np.ceil(np.nan_to_num(days_left)), -1)).astype(np.int64)
+
+    for goal, start_weight, pct, day in zip(goals, start, progress, projected):
+        if goal.start_weight is None:
+            goal.start_weight = Decimal(f'{start_weight:.2f}')
+        goal.progress_percentage = int(pct)
+        goal.projected_date = datetime.date.fromordinal(int(day)) if day > 0 else None
+    return goals
+
+
+def refresh(user_ids=None, using=None, today=None):
+    """
+    Recompute weight trends and weight-goal forecasts. With no user_ids, every
+    user with an active weight goal on the database is refreshed (the nightly
+    batch). Returns the number of users with a trend.
+    """
+    goals = Goal.objects.using(using).filter(status='active', target_weight__isnull=False)
+    if user_ids is None:
+        goals = list(goals)
+        user_ids = sorted({g.user_id for g in goals})
+    else:
+        goals = list(goals.filter(user_id__in=user_ids))
+
+    fits = fit_trends(*load_weights(user_ids, using=using, today=today))
+    if fits is None:
+        return 0
+
+    trends = [
+        WeightTrend(
+            user_id=int(user_id),
+            as_of=datetime.date.fromordinal(int(day)),
+            trend_weight=Decimal(f'{trend:.2f}'),
+            weekly_rate=None if np.isnan(rate) else round(float(rate), 3),
+            samples=int(samples),
+        )
+        for user_id, day, trend, rate, samples in zip(
+            fits['users'], fits['as_of'], fits['trend'], fits['weekly_rate'], fits['samples']
+        )
+    ]
+    WeightTrend.objects.using(using).bulk_create(
+        trends,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['as_of', 'trend_weight', 'weekly_rate', 'samples', 'updated_at'],
+    )
+
+    previous = {g.pk: g.progress_percentage for g in goals}
+    updated = forecast_goals(goals, fits)
+    if updated:
+        Goal.objects.using(using).bulk_update(updated, ['start_weight', 'progress_percentage', 'projected_date'])
+
+    reached = Counter(g.user_id for g in updated if g.progress_percentage >= 100 > previous[g.pk])
+    for user_id, count in reached.items():
+        with use_shard(user_id):
+            emit(user_id, 'goal_progress', add={'weight_goals_reached': count})
+    return len(trends)
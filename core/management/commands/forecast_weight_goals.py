@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from FitTrack.sharding import GLOBAL, shard_databases
+from core.forecasting import refresh
+
+
+class Command(BaseCommand):
+    help = 'Recompute weight trends and goal forecasts for every user with an active weight goal (run nightly)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only refresh these user ids')
+    
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        
+        total = 0
+        for alias in shard_databases() or [GLOBAL]:
+            users = refresh(options['users'], using=alias)
+            total += users
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{alias}: {users} users')
+        
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(self.style.SUCCESS(f'Forecast {total} weight trends in {elapsed:.1f}ms'))
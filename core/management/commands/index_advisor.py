@@ -0,0 +1,114 @@
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+
+from FitTrack.db.capture import read_captured
+
+# "table"."column" <op> in Django-generated WHERE clauses
+COMPARISON_RE = re.compile(r'"(\w+)"\."(\w+)"\s*(=|IN\b|IS\b|<=|>=|<|>|BETWEEN\b)', re.IGNORECASE)
+ORDER_BY_RE = re.compile(r'ORDER BY (.+?)(?: LIMIT | OFFSET |$)', re.IGNORECASE | re.DOTALL)
+COLUMN_RE = re.compile(r'"(\w+)"\."(\w+)"')
+SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+class Command(BaseCommand):
+    help = 'Replay captured queries through EXPLAIN QUERY PLAN and suggest indexes for full table scans'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=getattr(settings, 'QUERY_CAPTURE_FILE', None), help='Capture file (defaults to QUERY_CAPTURE_FILE)')
+        parser.add_argument('--min-count', type=int, default=1, help='Ignore queries seen fewer times than this')
+        parser.add_argument('--show-sql', action='store_true', help='Print the offending statements')
+    
+    def handle(self, *args, **options):
+        if not options['file']:
+            raise CommandError('No capture file: pass --file or set FITTRACK_QUERY_CAPTURE while serving traffic')
+        
+        # Deduplicate on the statement text; parameters only affect selectivity
+        seen = Counter()
+        samples = {}
+        for record in read_captured(options['file']):
+            key = (record['alias'], record['sql'])
+            seen[key] += 1
+            samples.setdefault(key, record['params'])
+        
+        suggestions = defaultdict(lambda: {'count': 0, 'queries': []})
+        scanned = 0
+        for (alias, sql), count in seen.most_common():
+            if count < options['min_count'] or alias not in connections:
+                continue
+            
+            try:
+                plan = explain(connections[alias], sql, samples[(alias, sql)])
+            except DatabaseError as exc:
+                self.stderr.write(f'Could not explain query: {exc}')
+                continue
+            
+            tables = set(connections[alias].introspection.table_names())
+            for table in full_scans(plan, tables):
+                scanned += 1
+                columns = suggest_columns(sql, table)
+                entry = suggestions[(table, columns)]
+                entry['count'] += count
+                entry['queries'].append(sql)
+        
+        self.stdout.write(f'Replayed {len(seen)} distinct queries, {scanned} full table scans\n')
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS('No full table scans found'))
+            return
+        
+        for (table, columns), entry in sorted(suggestions.items(), key=lambda item: -item[1]['count']):
+            self.stdout.write(self.style.WARNING(f"SCAN {table} ({entry['count']} executions)"))
+            if columns:
+                name = f"{table}_{'_'.join(columns)}_idx"
+                self.stdout.write(f"  suggest: CREATE INDEX {name} ON {table} ({', '.join(columns)});")
+                if any(' OR ' in sql for sql in entry['queries']):
+                    self.stdout.write('  note: the filter ORs columns together; one index per OR branch may serve better')
+            else:
+                self.stdout.write('  no filter columns found; the query reads the whole table by design')
+            if options['show_sql']:
+                for sql in entry['queries']:
+                    self.stdout.write(f'    {sql}')
+
+
+def explain(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan, tables):
+    """Tables read with a full scan (no index) in an EXPLAIN QUERY PLAN result"""
+    for detail in plan:
+        match = SCAN_RE.match(detail.strip())
+        # Scans of subqueries and CTEs are not table scans
+        if match and match.group(1) in tables:
+            yield match.group(1)
+
+
+def suggest_columns(sql, table):
+    """
+    Index columns for ``table``: equality filters first, then range filters,
+    then ORDER BY columns, following the usual left-to-right index rule.
+    """
+    where = sql.split(' WHERE ', 1)[1] if ' WHERE ' in sql else ''
+    where = ORDER_BY_RE.sub('', where)
+    
+    equality, ranges = [], []
+    for tbl, column, op in COMPARISON_RE.findall(where):
+        if tbl != table:
+            continue
+        target = equality if op.upper() in ('=', 'IN', 'IS') else ranges
+        if column not in equality + ranges:
+            target.append(column)
+    
+    order = []
+    order_match = ORDER_BY_RE.search(sql)
+    if order_match:
+        order = [column for tbl, column in COLUMN_RE.findall(order_match.group(1)) if tbl == table]
+    
+    columns = equality + ranges
+    columns += [column for column in order if column not in columns]
+    return tuple(columns)
@@ -0,0 +1,131 @@
+from collections import Counter
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from FitTrack import sharding
+from core.models import UserShard
+
+
+class Command(BaseCommand):
+    help = 'Move users (and all their per-user rows) between shard databases'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='User id to move (repeatable)')
+        parser.add_argument('--to', dest='target', help='Destination shard alias')
+        parser.add_argument('--even', action='store_true', help='Move users from the fullest shards until counts are even')
+        parser.add_argument('--dry-run', action='store_true')
+    
+    def handle(self, *args, **options):
+        shards = sharding.shard_databases()
+        if not shards:
+            raise CommandError('Sharding is disabled (set FITTRACK_SHARDS)')
+        
+        if options['even']:
+            moves = self.plan_even(shards)
+        elif options['users'] and options['target']:
+            if options['target'] not in shards:
+                raise CommandError(f"Unknown shard '{options['target']}'")
+            moves = [(user_id, options['target']) for user_id in options['users']]
+        else:
+            raise CommandError('Pass --user ID --to ALIAS, or --even')
+        
+        for user_id, target in moves:
+            source = sharding.lookup_shard(user_id)
+            if source == target:
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'Would move user {user_id}: {source} -> {target}')
+                continue
+            
+            copied = move_user(user_id, source, target)
+            self.stdout.write(self.style.SUCCESS(f'Moved user {user_id}: {source} -> {target} ({copied} rows)'))
+    
+    def plan_even(self, shards):
+        """Pick moves that bring every shard to within one user of the mean"""
+        placement = {user_id: sharding.lookup_shard(user_id) for user_id in User.objects.values_list('id', flat=True)}
+        counts = Counter({alias: 0 for alias in shards})
+        counts.update(placement.values())
+        
+        moves = []
+        target_size = -(-len(placement) // len(shards))
+        for user_id, alias in sorted(placement.items(), reverse=True):
+            if counts[alias] <= target_size:
+                continue
+            lightest = min(shards, key=lambda a: counts[a])
+            if counts[lightest] >= target_size:
+                break
+            counts[alias] -= 1
+            counts[lightest] += 1
+            moves.append((user_id, lightest))
+        return moves
+
+
+def sharded_foreign_keys(model):
+    """The model's foreign keys to other sharded models (these hold shard-local primary keys)"""
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, models.ForeignKey) and sharding.is_sharded(field.related_model)
+    ]
+
+
+def copy_order():
+    """Sharded models ordered so each comes after every sharded model it references"""
+    pending = [apps.get_model(label) for label in sharding.SHARDED_MODELS]
+    ordered = []
+    while pending:
+        ready = [
+            model for model in pending
+            if all(field.related_model in ordered for field in sharded_foreign_keys(model))
+        ]
+        if not ready:
+            raise CommandError('Foreign keys between sharded models form a cycle')
+        ordered += ready
+        pending = [model for model in pending if model not in ready]
+    return ordered
+
+
+def move_user(user_id, source, target):
+    """Copy a user's rows from source to target, then delete them from source"""
+    ordered = copy_order()
+    id_maps = {}
+    copied = 0
+    
+    # Commit the copy before touching the source: a failure after this point
+    # leaves orphaned rows on the source, never lost ones.
+    with transaction.atomic(using=target):
+        # Referenced models first so every foreign key between sharded rows
+        # can be re-pointed at the new primary keys
+        for model in ordered:
+            path = sharding.SHARDED_MODELS[model._meta.label_lower]
+            rows = list(model.objects.using(source).filter(**{path: user_id}).order_by('pk'))
+            if not rows:
+                continue
+            
+            old_ids = [row.pk for row in rows]
+            foreign_keys = sharded_foreign_keys(model)
+            for row in rows:
+                row.pk = None
+                row._state.adding = True
+                for field in foreign_keys:
+                    old = getattr(row, field.attname)
+                    if old is not None:
+                        # Missing from the map: the row pointed outside the user's data
+                        setattr(row, field.attname, id_maps.get(field.related_model, {}).get(old))
+            
+            model.objects.using(target).bulk_create(rows)
+            id_maps[model] = dict(zip(old_ids, (row.pk for row in rows)))
+            copied += len(rows)
+    
+    UserShard.objects.using(sharding.GLOBAL).update_or_create(user_id=user_id, defaults={'alias': target})
+    
+    with transaction.atomic(using=source):
+        # Referencing models first so the joins on the user path still
+        # resolve. A raw delete skips signals: the rows were moved, not deleted.
+        for model in reversed(ordered):
+            path = sharding.SHARDED_MODELS[model._meta.label_lower]
+            model.objects.using(source).filter(**{path: user_id})._raw_delete(source)
+    
+    return copied
@@ -0,0 +1,25 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from FitTrack.sharding import use_shard
+from core.achievements import rebuild_user
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's achievement counters from their history and award anything missing"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only rebuild these user ids')
+    
+    def handle(self, *args, **options):
+        user_ids = options['users'] or list(User.objects.values_list('id', flat=True))
+        started = time.perf_counter()
+        
+        for user_id in user_ids:
+            with use_shard(user_id):
+                rebuild_user(user_id)
+        
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt achievement counters for {len(user_ids)} users in {elapsed:.1f}s'))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from FitTrack.sharding import GLOBAL, shard_databases
+from core.activity import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the activity heatmap bitmaps from workout, nutrition and progress logs'
+    
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        
+        total = 0
+        for alias in shard_databases() or [GLOBAL]:
+            total += rebuild(using=alias)
+        
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} activity bitmaps in {elapsed:.1f}ms'))
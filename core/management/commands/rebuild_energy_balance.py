@@ -0,0 +1,26 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from FitTrack.sharding import use_shard
+from core.energy import rebuild_user
+
+
+class Command(BaseCommand):
+    help = 'Recompute DailyEnergyBalance rows from nutrition logs and completed workouts'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only rebuild these user ids')
+    
+    def handle(self, *args, **options):
+        user_ids = options['users'] or list(User.objects.values_list('id', flat=True))
+        started = time.perf_counter()
+        
+        total = 0
+        for user_id in user_ids:
+            with use_shard(user_id):
+                total += rebuild_user(user_id)
+        
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} energy balance days for {len(user_ids)} users in {elapsed:.1f}s'))
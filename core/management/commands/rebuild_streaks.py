@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from FitTrack.sharding import GLOBAL, shard_databases
+from core.streaks import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's training streak in one pass over completed sessions and award missing achievements"
+    
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        
+        total = 0
+        for alias in shard_databases() or [GLOBAL]:
+            total += rebuild(using=alias)
+        
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt streaks for {total} users in {elapsed:.1f}ms'))
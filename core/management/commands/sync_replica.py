@@ -0,0 +1,39 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from FitTrack import routers
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto the read replica using the online backup API'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Keep syncing every N seconds')
+        parser.add_argument('--pages', type=int, default=1024, help='Pages copied per backup step')
+    
+    def handle(self, *args, **options):
+        if not routers.replica_enabled():
+            raise CommandError("No 'replica' database is configured (set FITTRACK_READ_REPLICA=1)")
+        
+        while True:
+            started = time.perf_counter()
+            self.sync(options['pages'])
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(self.style.SUCCESS(f'Replica synced in {elapsed:.1f}ms'))
+            
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+    
+    def sync(self, pages):
+        primary = connections[routers.PRIMARY]
+        primary.ensure_connection()
+        
+        target = sqlite3.connect(connections[routers.REPLICA].settings_dict['NAME'])
+        try:
+            primary.connection.backup(target, pages=pages)
+        finally:
+            target.close()
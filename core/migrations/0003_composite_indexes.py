@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_usershard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='achievement',
+            index=models.Index(fields=['user', '-earned_at'], name='achievement_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['user', 'status'], name='goal_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(condition=models.Q(('status', 'active'), ('target_weight__isnull', False)), fields=['user'], name='goal_active_weight_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goal',
+            name='projected_date',
+            field=models.DateField(blank=True, help_text='When the weight trend reaches the target', null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='start_weight',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Weight in kg when the goal was set', max_digits=5, null=True),
+        ),
+        migrations.CreateModel(
+            name='WeightTrend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(help_text='Date of the latest weigh-in')),
+                ('trend_weight', models.DecimalField(decimal_places=2, help_text='Smoothed weight in kg', max_digits=5)),
+                ('weekly_rate', models.FloatField(blank=True, help_text='Trend change in kg per week', null=True)),
+                ('samples', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='weight_trend', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Weight Trend',
+                'verbose_name_plural': 'Weight Trends',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_weight_forecast'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyEnergyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('intake', models.IntegerField(default=0, help_text='Calories eaten')),
+                ('burned', models.IntegerField(default=0, help_text='Calories burned in completed workouts')),
+                ('baseline', models.IntegerField(default=0, help_text='Resting expenditure when the day was last updated')),
+                ('net', models.IntegerField(default=0, help_text='Intake minus baseline and workouts')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='energy_balance', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Energy Balance',
+                'verbose_name_plural': 'Daily Energy Balances',
+                'ordering': ['-date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
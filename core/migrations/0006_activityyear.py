@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_dailyenergybalance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('kind', models.CharField(choices=[('workout', 'Training'), ('nutrition', 'Nutrition Logged'), ('progress', 'Progress Logged')], max_length=20)),
+                ('bits', models.BinaryField(max_length=46)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_years', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Activity Year',
+                'verbose_name_plural': 'Activity Years',
+                'unique_together': {('user', 'year', 'kind')},
+            },
+        ),
+    ]
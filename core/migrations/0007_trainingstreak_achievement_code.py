@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:28
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_streaks(apps, schema_editor):
+    """Replay every user's completed sessions into a TrainingStreak row"""
+    TrainingStreak = apps.get_model('core', 'TrainingStreak')
+    WorkoutSession = apps.get_model('workouts', 'WorkoutSession')
+    db = schema_editor.connection.alias
+
+    sessions = WorkoutSession.objects.using(db).filter(status='completed').order_by(
+        'user_id', 'scheduled_date'
+    ).values_list('user_id', 'scheduled_date')
+
+    states = []
+    state = None
+    for user_id, day in sessions.iterator():
+        if state is None or state.user_id != user_id:
+            state = TrainingStreak(user_id=user_id)
+            states.append(state)
+        state.workouts_completed += 1
+        if state.last_active is None or day > state.last_active + datetime.timedelta(days=1):
+            state.current = 1
+        elif day == state.last_active + datetime.timedelta(days=1):
+            state.current += 1
+        state.last_active = day
+        state.longest = max(state.longest, state.current)
+
+    TrainingStreak.objects.using(db).bulk_create(states, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_activityyear'),
+        ('workouts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingStreak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current', models.IntegerField(default=0, help_text='Consecutive training days ending on last_active')),
+                ('longest', models.IntegerField(default=0)),
+                ('last_active', models.DateField(blank=True, null=True)),
+                ('workouts_completed', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Training Streak',
+                'verbose_name_plural': 'Training Streaks',
+            },
+        ),
+        migrations.AddField(
+            model_name='achievement',
+            name='code',
+            field=models.CharField(blank=True, help_text='Identifies automatically awarded achievements', max_length=50, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='achievement',
+            constraint=models.UniqueConstraint(fields=('user', 'code'), name='achievement_user_code_uniq'),
+        ),
+        migrations.AddField(
+            model_name='trainingstreak',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='training_streak', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_streaks, migrations.RunPython.noop),
+    ]
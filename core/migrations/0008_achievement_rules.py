@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_trainingstreak_achievement_code'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyenergybalance',
+            name='on_target',
+            field=models.BooleanField(default=False, help_text='Intake within tolerance of TDEE'),
+        ),
+        migrations.AlterField(
+            model_name='achievement',
+            name='achievement_type',
+            field=models.CharField(choices=[('workout', 'Workout Milestone'), ('streak', 'Streak Achievement'), ('weight', 'Weight Goal'), ('strength', 'Strength Milestone'), ('endurance', 'Endurance Milestone'), ('nutrition', 'Nutrition Milestone')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workouts_completed', models.IntegerField(default=0)),
+                ('longest_streak', models.IntegerField(default=0)),
+                ('total_volume', models.FloatField(default=0, help_text='Sets x reps x weight, in kg')),
+                ('personal_records', models.IntegerField(default=0)),
+                ('progress_logs', models.IntegerField(default=0)),
+                ('weight_goals_reached', models.IntegerField(default=0)),
+                ('nutrition_days_on_target', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='achievement_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Counters',
+                'verbose_name_plural': 'User Counters',
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 
 
@@ -70,6 +71,26 @@ def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
 
 
+@receiver(pre_save, sender=UserProfile)
+def remember_profile_energy(sender, instance, **kwargs):
+    """Keep the stored fields the energy baseline is computed from"""
+    from .energy import PROFILE_FIELDS
+    instance._previous_energy = UserProfile.objects.filter(pk=instance.pk).values_list(*PROFILE_FIELDS).first() if instance.pk else None
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    """Drop the cached BMR/TDEE and re-materialize the balance if the baseline inputs changed"""
+    from jobs.queue import enqueue_on_commit
+    from .energy import PROFILE_FIELDS, invalidate_profile
+    from .tasks import rebuild_energy_balance
+    invalidate_profile(instance.user_id)
+    previous = getattr(instance, '_previous_energy', None)
+    current = tuple(sender._meta.get_field(f).to_python(getattr(instance, f)) for f in PROFILE_FIELDS)
+    if previous and previous != current:
+        enqueue_on_commit(rebuild_energy_balance, args=[instance.user_id], dedupe_key=f'energy-balance:{instance.user_id}')
+
+
 class Goal(models.Model):
     """User fitness goals"""
     
@@ -98,6 +119,10 @@ class Goal(models.Model):
     # Target metrics
     target_weight = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, help_text="Target weight in kg")
     target_date = models.DateField(null=True, blank=True)
+    start_weight = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, help_text="Weight in kg when the goal was set")
+    
+    # Forecast (see core.forecasting)
+    projected_date = models.DateField(null=True, blank=True, help_text="When the weight trend reaches the target")
     
     # Status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
@@ -115,6 +140,10 @@ class Goal(models.Model):
         ordering = ['-created_at']
         verbose_name = "Goal"
         verbose_name_plural = "Goals"
+        indexes = [
+            models.Index(fields=['user', 'status'], name='goal_user_status_idx'),
+            models.Index(fields=['user'], condition=Q(status='active', target_weight__isnull=False), name='goal_active_weight_idx'),
+        ]
 
 
 class ProgressLog(models.Model):
@@ -170,6 +199,7 @@ class Achievement(models.Model):
         ('weight', 'Weight Goal'),
         ('strength', 'Strength Milestone'),
         ('endurance', 'Endurance Milestone'),
+        ('nutrition', 'Nutrition Milestone'),
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='achievements')
@@ -177,6 +207,7 @@ class Achievement(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     icon = models.CharField(max_length=10, default='🏆', help_text="Emoji or icon")
+    code = models.CharField(max_length=50, null=True, blank=True, help_text="Identifies automatically awarded achievements")
     
     earned_at = models.DateTimeField(auto_now_add=True)
     
@@ -186,4 +217,180 @@ class Achievement(models.Model):
     class Meta:
         ordering = ['-earned_at']
         verbose_name = "Achievement"
-        verbose_name_plural = "Achievements"
\ No newline at end of file
+        verbose_name_plural = "Achievements"
+        indexes = [
+            models.Index(fields=['user', '-earned_at'], name='achievement_user_recent_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'code'], name='achievement_user_code_uniq'),
+        ]
+
+
+class UserCounters(models.Model):
+    """Running per-user totals the achievement rules are evaluated against (see core.achievements)"""
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='achievement_counters')
+    
+    workouts_completed = models.IntegerField(default=0)
+    longest_streak = models.IntegerField(default=0)
+    total_volume = models.FloatField(default=0, help_text="Sets x reps x weight, in kg")
+    personal_records = models.IntegerField(default=0)
+    progress_logs = models.IntegerField(default=0)
+    weight_goals_reached = models.IntegerField(default=0)
+    nutrition_days_on_target = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username}'s Counters"
+    
+    class Meta:
+        verbose_name = "User Counters"
+        verbose_name_plural = "User Counters"
+
+
+class TrainingStreak(models.Model):
+    """Running streak state for a user (see core.streaks)"""
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='training_streak')
+    
+    current = models.IntegerField(default=0, help_text="Consecutive training days ending on last_active")
+    longest = models.IntegerField(default=0)
+    last_active = models.DateField(null=True, blank=True)
+    workouts_completed = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.current} days"
+    
+    @property
+    def live_streak(self):
+        """The current streak, or 0 once a full day has passed without training"""
+        from datetime import date, timedelta
+        if self.last_active and self.last_active >= date.today() - timedelta(days=1):
+            return self.current
+        return 0
+    
+    class Meta:
+        verbose_name = "Training Streak"
+        verbose_name_plural = "Training Streaks"
+
+
+class WeightTrend(models.Model):
+    """Smoothed weight and its rate of change, refreshed from ProgressLog"""
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='weight_trend')
+    as_of = models.DateField(help_text="Date of the latest weigh-in")
+    
+    trend_weight = models.DecimalField(max_digits=5, decimal_places=2, help_text="Smoothed weight in kg")
+    weekly_rate = models.FloatField(null=True, blank=True, help_text="Trend change in kg per week")
+    samples = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.trend_weight} kg ({self.as_of})"
+    
+    class Meta:
+        verbose_name = "Weight Trend"
+        verbose_name_plural = "Weight Trends"
+
+
+class DailyEnergyBalance(models.Model):
+    """Calories eaten vs spent for one day, materialized by core.energy"""
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='energy_balance')
+    date = models.DateField()
+    
+    intake = models.IntegerField(default=0, help_text="Calories eaten")
+    burned = models.IntegerField(default=0, help_text="Calories burned in completed workouts")
+    baseline = models.IntegerField(default=0, help_text="Resting expenditure when the day was last updated")
+    net = models.IntegerField(default=0, help_text="Intake minus baseline and workouts")
+    on_target = models.BooleanField(default=False, help_text="Intake within tolerance of TDEE")
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.date}: {self.net:+d} kcal"
+    
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['user', 'date']
+        verbose_name = "Daily Energy Balance"
+        verbose_name_plural = "Daily Energy Balances"
+
+
+class ActivityYear(models.Model):
+    """One bit per day of a year for an activity kind (see core.activity)"""
+    
+    KIND_CHOICES = [
+        ('workout', 'Training'),
+        ('nutrition', 'Nutrition Logged'),
+        ('progress', 'Progress Logged'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_years')
+    year = models.IntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    bits = models.BinaryField(max_length=46)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.year} {self.kind}"
+    
+    class Meta:
+        unique_together = ['user', 'year', 'kind']
+        verbose_name = "Activity Year"
+        verbose_name_plural = "Activity Years"
+
+
+@receiver(post_save, sender=ProgressLog)
+@receiver(post_delete, sender=ProgressLog)
+def progress_logged(sender, instance, signal, **kwargs):
+    """Refresh the weight trend, goal forecasts, cached series, activity bitmap and counters"""
+    from .achievements import emit
+    from .activity import mark, sync_day
+    from .forecasting import refresh
+    from .series import touch
+    refresh([instance.user_id])
+    touch(instance.user_id, 'progress')
+    if signal is post_delete:
+        sync_day(instance.user_id, 'progress', instance.date)
+        emit(instance.user_id, 'progress_deleted', add={'progress_logs': -1})
+    else:
+        mark(instance.user_id, 'progress', instance.date)
+        if kwargs.get('created'):
+            emit(instance.user_id, 'progress_logged', add={'progress_logs': 1})
+
+
+@receiver(pre_save, sender=Goal)
+def remember_goal_state(sender, instance, **kwargs):
+    """Keep the previous status and progress so completion can be detected"""
+    if instance.pk:
+        previous = Goal.objects.filter(pk=instance.pk).values_list('status', 'progress_percentage').first()
+        instance._previous_status, instance._previous_progress = previous or (None, 0)
+
+
+@receiver(post_save, sender=Goal)
+def goal_changed(sender, instance, **kwargs):
+    """Count a weight goal as reached when it is completed before its trend got there"""
+    from .achievements import emit
+    completed = instance.status == 'completed' and getattr(instance, '_previous_status', None) != 'completed'
+    if completed and instance.target_weight is not None and (getattr(instance, '_previous_progress', 0) or 0) < 100:
+        emit(instance.user_id, 'goal_completed', add={'weight_goals_reached': 1})
+
+
+class UserShard(models.Model):
+    """Explicit shard placement for a user (see FitTrack.sharding)"""
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='shard')
+    alias = models.CharField(max_length=50, help_text="Database alias holding this user's data")
+    
+    moved_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} -> {self.alias}"
+    
+    class Meta:
+        verbose_name = "User Shard"
+        verbose_name_plural = "User Shards"
@@ -0,0 +1,94 @@
+"""
+Declarative achievement rules.
+
+A rule awards one achievement per threshold a per-user counter (see
+UserCounters) reaches, and lists the events that can move that counter.
+Rules are indexed by event, so an event only evaluates the rules that
+listen to it, against the counters before and after the event.
+
+To add an achievement family, append a Rule and make sure something emits
+one of its events with the counter change (see core.achievements.emit).
+"""
+from collections import defaultdict
+
+from django.conf import settings
+
+
+class Rule:
+
+    def __init__(self, code, counter, thresholds, events, achievement_type, title, description, icon='🏆', names=None):
+        self.code = code
+        self.counter = counter
+        self.thresholds = sorted(thresholds)
+        self.events = tuple(events)
+        self.achievement_type = achievement_type
+        self.title = title
+        self.description = description
+        self.icon = icon
+        self.names = names or {}
+
+    def __repr__(self):
+        return f'<Rule {self.code}>'
+
+    def achievement(self, threshold):
+        return {
+            'code': self.code.format(n=threshold),
+            'achievement_type': self.achievement_type,
+            'title': self.names.get(threshold) or self.title.format(n=threshold),
+            'description': self.description.format(n=threshold),
+            'icon': self.icon,
+        }
+
+    def crossed(self, before, after):
+        """Achievements for thresholds in (before, after] of the rule's counter"""
+        low = before.get(self.counter) or 0
+        high = after.get(self.counter) or 0
+        return [self.achievement(n) for n in self.thresholds if low < n <= high]
+
+
+RULES = [
+    Rule(
+        'workouts-{n}', 'workouts_completed', settings.WORKOUT_MILESTONES, ['session_completed'],
+        'workout', '{n} Workouts', 'Completed {n} workout sessions.', '💪',
+        names={1: 'First Workout'},
+    ),
+    Rule(
+        'streak-{n}', 'longest_streak', settings.STREAK_THRESHOLDS, ['session_completed'],
+        'streak', '{n}-Day Streak', 'Trained {n} days in a row.', '🔥',
+    ),
+    Rule(
+        'volume-{n}', 'total_volume', [1000, 10000, 50000, 100000, 500000, 1000000], ['exercise_logged'],
+        'strength', '{n:,} kg Lifted', 'Lifted a total of {n:,} kg.', '🏋️',
+    ),
+    Rule(
+        'prs-{n}', 'personal_records', [1, 5, 10, 25, 50, 100], ['personal_record'],
+        'strength', '{n} Personal Records', 'Set {n} personal records.', '⭐',
+        names={1: 'First Personal Record'},
+    ),
+    Rule(
+        'weight-goals-{n}', 'weight_goals_reached', [1, 3, 5], ['goal_completed', 'goal_progress'],
+        'weight', '{n} Weight Goals Reached', 'Reached {n} target weights.', '🎯',
+        names={1: 'Goal Weight Reached'},
+    ),
+    Rule(
+        'check-ins-{n}', 'progress_logs', [1, 10, 50, 100, 365], ['progress_logged'],
+        'weight', '{n} Check-ins', 'Logged your progress {n} times.', '📈',
+        names={1: 'First Check-in'},
+    ),
+    Rule(
+        'nutrition-{n}', 'nutrition_days_on_target', [7, 30, 100, 365], ['nutrition_day'],
+        'nutrition', '{n} Days On Target', 'Ate within your calorie target on {n} days.', '🥗',
+    ),
+]
+
+
+def index_rules(rules):
+    """{event: [rules listening to it]}"""
+    index = defaultdict(list)
+    for rule in rules:
+        for event in rule.events:
+            index[event].append(rule)
+    return dict(index)
+
+
+RULES_BY_EVENT = index_rules(RULES)
@@ -0,0 +1,152 @@
+"""
+Downsampled time series for long-range charts.
+
+Body measurements (ProgressLog) and daily nutrition totals (NutritionLog)
+are reduced to a point budget with Largest-Triangle-Three-Buckets: the
+first and last points are kept, the rest are split into equal buckets and
+from each bucket the point forming the largest triangle with the previously
+kept point and the next bucket's average is chosen. This keeps peaks and
+dips that plain averaging would flatten.
+
+Results are cached per (user, metric, range, budget). Each source carries a
+per-user version number that is bumped whenever the user's rows change, so
+cached series are dropped as soon as new data arrives.
+"""
+import datetime
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from nutrition.models import NutritionLog
+from .models import ProgressLog
+
+SOURCES = {
+    'progress': ProgressLog,
+    'nutrition': NutritionLog,
+}
+
+# Metric -> (source, field)
+METRICS = {
+    'weight': ('progress', 'weight'),
+    'body_fat': ('progress', 'body_fat_percentage'),
+    'muscle_mass': ('progress', 'muscle_mass'),
+    'waist': ('progress', 'waist'),
+    'chest': ('progress', 'chest'),
+    'arms': ('progress', 'arms'),
+    'legs': ('progress', 'legs'),
+    'calories': ('nutrition', 'total_calories'),
+    'protein': ('nutrition', 'total_protein'),
+    'carbs': ('nutrition', 'total_carbs'),
+    'fats': ('nutrition', 'total_fats'),
+    'fiber': ('nutrition', 'total_fiber'),
+    'water': ('nutrition', 'water_intake'),
+}
+
+DEFAULT_POINTS = 300
+# LTTB keeps the first and last point plus at least one from the buckets
+MIN_POINTS = 3
+MAX_POINTS = 2000
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def version_key(user_id, source):
+    return f'series-version:{user_id}:{source}'
+
+
+def touch(user_id, source):
+    """Invalidate a user's cached series for one source"""
+    key = version_key(user_id, source)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def lttb(x, y, threshold):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Buckets 0..threshold-3 split the interior points; the last bucket is the final point
+    every = (n - 2) / (threshold - 2)
+    bounds = np.append(np.floor(np.arange(threshold - 1) * every).astype(int) + 1, n)
+    sizes = np.diff(bounds)
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    mean_x = (cx[bounds[1:]] - cx[bounds[:-1]]) / sizes
+    mean_y = (cy[bounds[1:]] - cy[bounds[:-1]]) / sizes
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        area = np.abs(
+            (x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def _load(user_id, source, metrics, start, end):
+    """One query for the requested columns of a source, ordered by date"""
+    fields = [METRICS[m][1] for m in metrics]
+    rows = SOURCES[source].objects.filter(user_id=user_id)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    rows = list(rows.order_by('date').values_list(
+        'date', *[Cast(f, FloatField()) for f in fields]
+    ))
+
+    days = np.array([row[0].toordinal() for row in rows], dtype=np.int64)
+    values = np.array([row[1:] for row in rows], dtype=float).reshape(len(rows), len(fields))
+    return days, values
+
+
+def downsample(days, values, points):
+    """[[iso date, value], ...] for the non-missing values, reduced to the budget"""
+    # Nutrition logs are created empty (e.g. by a water update), so zero totals mean no data
+    present = ~np.isnan(values) & (values != 0)
+    days, values = days[present], values[present]
+    keep = lttb(days.astype(float), values, points)
+    return {
+        'total': len(days),
+        'points': [
+            [datetime.date.fromordinal(int(d)).isoformat(), round(float(v), 2)]
+            for d, v in zip(days[keep], values[keep])
+        ],
+    }
+
+
+def series_for_user(user_id, metrics, start=None, end=None, points=DEFAULT_POINTS):
+    """Downsampled series for each metric, reading each source at most once"""
+    sources = {METRICS[m][0] for m in metrics}
+    versions = cache.get_many([version_key(user_id, s) for s in sources])
+
+    keys = {
+        m: 'series:{}:{}:{}:{}:{}:{}'.format(
+            user_id, m, start or '', end or '', points,
+            versions.get(version_key(user_id, METRICS[m][0]), 0),
+        )
+        for m in metrics
+    }
+    cached = cache.get_many(keys.values())
+    results = {m: cached[keys[m]] for m in metrics if keys[m] in cached}
+
+    for source in sources:
+        missing = [m for m in metrics if METRICS[m][0] == source and m not in results]
+        if not missing:
+            continue
+        days, values = _load(user_id, source, missing, start, end)
+        for i, metric in enumerate(missing):
+            results[metric] = downsample(days, values[:, i], points)
+        cache.set_many({keys[m]: results[m] for m in missing}, CACHE_TIMEOUT)
+
+    return {m: results[m] for m in metrics}
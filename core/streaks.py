@@ -0,0 +1,141 @@
+"""
+Training streaks.
+
+A streak is a run of consecutive days with at least one completed workout
+session. Each user's TrainingStreak row holds the running state (current and
+longest streak, last active day and completed-session count). Completing a
+session on the last active day or the day after only looks at that row.
+Anything that would rewrite history (backdated sessions, un-completing or
+deleting one) replays that user's sessions instead.
+
+Each change feeds the achievement engine a ``session_completed`` event
+carrying the new workout count and longest streak (see core.rules).
+"""
+import datetime
+
+from django.core.cache import cache
+from django.db import router, transaction
+from django.utils import timezone
+
+from workouts.models import WorkoutSession
+from .achievements import cache_key, emit
+from .models import Achievement, TrainingStreak, UserCounters
+from .rules import RULES_BY_EVENT
+
+
+def _as_date(day):
+    return day if isinstance(day, datetime.date) else datetime.date.fromisoformat(str(day))
+
+
+def advance(state, day):
+    """Fold one completed session on ``day`` (not before state.last_active) into the state"""
+    state.workouts_completed += 1
+    if state.last_active is None or day > state.last_active + datetime.timedelta(days=1):
+        state.current = 1
+    elif day == state.last_active + datetime.timedelta(days=1):
+        state.current += 1
+    state.last_active = day
+    state.longest = max(state.longest, state.current)
+
+
+def emit_state(state):
+    emit(state.user_id, 'session_completed', values={
+        'workouts_completed': state.workouts_completed,
+        'longest_streak': state.longest,
+    })
+
+
+def record_completion(user_id, day):
+    """O(1) update when a session is completed"""
+    day = _as_date(day)
+    with transaction.atomic(using=router.db_for_write(TrainingStreak)):
+        state, created = TrainingStreak.objects.select_for_update().get_or_create(user_id=user_id)
+        backdated = state.last_active is not None and day < state.last_active
+        if not (created or backdated):
+            advance(state, day)
+            state.save()
+
+    # The running state can't absorb a session before the last active day,
+    # and a missing row may just mean the user trained before it existed
+    if created or backdated:
+        return rebuild_user(user_id)
+    emit_state(state)
+    return state
+
+
+def replay(user_id, days):
+    """A fresh state from the user's completed-session dates in ascending order"""
+    state = TrainingStreak(user_id=user_id)
+    for day in days:
+        advance(state, day)
+    return state
+
+
+def rebuild_user(user_id):
+    """Replay one user's completed sessions"""
+    days = WorkoutSession.objects.filter(user_id=user_id, status='completed').order_by('scheduled_date').values_list('scheduled_date', flat=True)
+    state = replay(user_id, days.iterator())
+    TrainingStreak.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'current': state.current,
+            'longest': state.longest,
+            'last_active': state.last_active,
+            'workouts_completed': state.workouts_completed,
+        },
+    )
+    emit_state(state)
+    return state
+
+
+def rebuild(using=None):
+    """
+    Recompute every user's streak on a database in one streaming pass over
+    completed sessions. Returns the number of users.
+    """
+    sessions = WorkoutSession.objects.using(using).filter(status='completed').order_by(
+        'user_id', 'scheduled_date'
+    ).values_list('user_id', 'scheduled_date')
+
+    states = []
+    state = None
+    for user_id, day in sessions.iterator():
+        if state is None or state.user_id != user_id:
+            state = TrainingStreak(user_id=user_id)
+            states.append(state)
+        advance(state, day)
+
+    with transaction.atomic(using=using):
+        TrainingStreak.objects.using(using).all().delete()
+        TrainingStreak.objects.using(using).bulk_create(states, batch_size=500)
+        # Only existing counters are corrected; a missing row is seeded from
+        # the whole history (volume, records, ...) the first time it is needed
+        by_user = {state.user_id: state for state in states}
+        now = timezone.now()
+        existing = list(UserCounters.objects.using(using).values_list('pk', 'user_id'))
+        counters = [
+            UserCounters(
+                pk=pk,
+                workouts_completed=by_user[user_id].workouts_completed if user_id in by_user else 0,
+                longest_streak=by_user[user_id].longest if user_id in by_user else 0,
+                updated_at=now,
+            )
+            for pk, user_id in existing
+        ]
+        UserCounters.objects.using(using).bulk_update(
+            counters, ['workouts_completed', 'longest_streak', 'updated_at'], batch_size=500,
+        )
+        
+        rules = RULES_BY_EVENT['session_completed']
+        Achievement.objects.using(using).bulk_create(
+            [
+                Achievement(user_id=state.user_id, **spec)
+                for state in states
+                for rule in rules
+                for spec in rule.crossed({}, {'workouts_completed': state.workouts_completed, 'longest_streak': state.longest})
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+    cache.delete_many([cache_key(user_id) for user_id in {*by_user, *(user_id for _, user_id in existing)}])
+    return len(states)
@@ -0,0 +1,39 @@
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from jobs.registry import task
+from .energy import rebuild_user
+from .models import UserProfile
+
+PROFILE_PICTURE_SIZE = (512, 512)
+
+
+@task(name='core.resize_profile_picture')
+def resize_profile_picture(profile_id):
+    """Shrink an uploaded profile picture to a sensible display size"""
+    profile = UserProfile.objects.get(id=profile_id)
+    if not profile.profile_picture:
+        return
+    
+    with profile.profile_picture.open('rb') as f:
+        image = Image.open(f)
+        image.load()
+    
+    if image.width <= PROFILE_PICTURE_SIZE[0] and image.height <= PROFILE_PICTURE_SIZE[1]:
+        return
+    
+    image.thumbnail(PROFILE_PICTURE_SIZE)
+    buffer = BytesIO()
+    image.save(buffer, format=image.format or 'PNG')
+    
+    name = profile.profile_picture.name.rsplit('/', 1)[-1]
+    profile.profile_picture.save(name, ContentFile(buffer.getvalue()), save=False)
+    UserProfile.objects.filter(id=profile.id).update(profile_picture=profile.profile_picture.name)
+
+
+@task(name='core.rebuild_energy_balance')
+def rebuild_energy_balance(user_id):
+    """Re-materialize a user's energy balance after their baseline changed"""
+    rebuild_user(user_id)
@@ -1,3 +1,462 @@
+import datetime
+import importlib
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+
+import numpy as np
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from FitTrack.db.capture import QueryRecorder
+from FitTrack.sharding import SHARDED_MODELS, lookup_shard, use_shard
+from FitTrack.testing import SHARDS, ShardedTestCase, user_on
+from core.achievements import counters, emit, rebuild_user
+from core.energy import bmr, profile_energy, timeline
+from core.forecasting import fit_trends, forecast_goals
+from core.management.commands.index_advisor import full_scans, suggest_columns
+from core.management.commands.rebalance_shards import copy_order, move_user
+from core.models import Achievement, DailyEnergyBalance, Goal, ProgressLog, TrainingStreak, UserCounters, WeightTrend
+from core.rules import RULES_BY_EVENT, Rule
+from core.series import lttb
+from core.streaks import rebuild as rebuild_streaks
+from jobs.models import Job
+from jobs.worker import work
+from nutrition.models import MealLog, NutritionLog
+from workouts.models import Exercise, ExerciseHistory, ExerciseLog, PersonalRecord, SessionTarget, Workout, WorkoutSession
+
+
+class RebalanceShardsTest(ShardedTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.source, self.target = SHARDS
+        self.mover = user_on(self.source, 'mover')
+        self.other = user_on(self.target, 'other')
+        self.exercise = Exercise.objects.create(
+            name='Squat', description='', category='strength', muscle_group='legs', instructions='',
+        )
+        self.workout = Workout.objects.create(
+            name='Legs', description='', difficulty='beginner', goal='strength', duration=45, estimated_calories=300,
+        )
+
+        # Occupy the low primary keys on the target so copied rows get new ones
+        with use_shard(self.other.id):
+            for day in range(1, 4):
+                self.session(self.other, day)
+            NutritionLog.objects.create(user=self.other, date=datetime.date(2024, 1, 1))
+
+        with use_shard(self.mover.id):
+            self.session(self.mover, 10)
+            last = self.session(self.mover, 11)
+            ExerciseLog.objects.create(session=last, exercise=self.exercise, sets_completed=3, reps_completed=5, weight_used=80)
+            SessionTarget.objects.create(session=last, exercise=self.exercise, target_sets=3, target_reps=5, target_weight=82.5)
+            ExerciseHistory.objects.update_or_create(
+                user=self.mover, exercise=self.exercise,
+                defaults={'last_session': last, 'last_date': last.scheduled_date, 'last_sets': 3},
+            )
+            log = NutritionLog.objects.create(user=self.mover, date=datetime.date(2024, 1, 11))
+            MealLog.objects.create(nutrition_log=log, meal_type='lunch', meal_name='Rice', calories=400, protein=8, carbs=80, fats=2)
+
+    def session(self, user, day):
+        return WorkoutSession.objects.create(
+            user=user, workout=self.workout, scheduled_date=datetime.date(2024, 1, day), status='planned',
+        )
+
+    def test_copy_order_puts_referenced_models_first(self):
+        order = [model._meta.label_lower for model in copy_order()]
+        self.assertEqual(sorted(order), sorted(SHARDED_MODELS))
+        self.assertLess(order.index('workouts.workoutsession'), order.index('workouts.exerciselog'))
+        self.assertLess(order.index('workouts.workoutsession'), order.index('workouts.exercisehistory'))
+        self.assertLess(order.index('nutrition.nutritionlog'), order.index('nutrition.meallog'))
+
+    def test_move_remaps_foreign_keys_between_sharded_rows(self):
+        move_user(self.mover.id, self.source, self.target)
+        sessions = WorkoutSession.objects.using(self.target)
+        mover_sessions = set(sessions.filter(user=self.mover).values_list('id', flat=True))
+        self.assertEqual(len(mover_sessions), 2)
+
+        log = ExerciseLog.objects.using(self.target).get()
+        self.assertIn(log.session_id, mover_sessions)
+        self.assertEqual(sessions.get(pk=log.session_id).scheduled_date, datetime.date(2024, 1, 11))
+
+        target = SessionTarget.objects.using(self.target).get()
+        self.assertEqual(target.session_id, log.session_id)
+
+        history = ExerciseHistory.objects.using(self.target).get()
+        self.assertEqual(history.last_session_id, log.session_id)
+
+        meal = MealLog.objects.using(self.target).get()
+        self.assertEqual(NutritionLog.objects.using(self.target).get(pk=meal.nutrition_log_id).user_id, self.mover.id)
+
+    def test_move_removes_rows_from_source(self):
+        move_user(self.mover.id, self.source, self.target)
+        self.assertEqual(lookup_shard(self.mover.id), self.target)
+        for model in copy_order():
+            self.assertFalse(model.objects.using(self.source).exists(), model._meta.label)
+
+
+class TrainingStreakTest(TestCase):
+    """Streaks pick up sessions completed before the user had a TrainingStreak row"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('runner')
+        self.workout = Workout.objects.create(
+            name='Run', description='', difficulty='beginner', goal='endurance', duration=30, estimated_calories=250,
+        )
+        # Completed before streaks were tracked, so no signals ran
+        WorkoutSession.objects.bulk_create([
+            WorkoutSession(user=self.user, workout=self.workout, scheduled_date=datetime.date(2024, 3, day), status='completed')
+            for day in (1, 2, 3, 5)
+        ])
+
+    def complete(self, day):
+        return WorkoutSession.objects.create(
+            user=self.user, workout=self.workout, scheduled_date=datetime.date(2024, 3, day), status='completed',
+        )
+
+    def state(self):
+        streak = TrainingStreak.objects.get(user=self.user)
+        return streak.current, streak.longest, streak.last_active, streak.workouts_completed
+
+    def test_migration_backfills_streaks(self):
+        migration = importlib.import_module('core.migrations.0007_trainingstreak_achievement_code')
+        migration.backfill_streaks(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(self.state(), (1, 3, datetime.date(2024, 3, 5), 4))
+
+    def test_first_tracked_session_replays_history(self):
+        self.complete(6)
+        self.assertEqual(self.state(), (2, 3, datetime.date(2024, 3, 6), 5))
+
+        self.complete(7)
+        self.assertEqual(self.state(), (3, 3, datetime.date(2024, 3, 7), 6))
+
+    def test_rebuild_leaves_missing_counters_to_be_seeded_from_history(self):
+        ProgressLog.objects.bulk_create([ProgressLog(user=self.user, date=datetime.date(2024, 2, day), weight=80) for day in (1, 2)])
+        rebuild_streaks()
+        self.assertFalse(UserCounters.objects.filter(user=self.user).exists())
+        values = counters(self.user.id)
+        self.assertEqual((values['workouts_completed'], values['longest_streak'], values['progress_logs']), (4, 3, 2))
+
+    def test_rebuild_corrects_existing_counters(self):
+        UserCounters.objects.create(user=self.user, workouts_completed=1, longest_streak=1, total_volume=5000)
+        other = User.objects.create_user('idle')
+        UserCounters.objects.create(user=other, workouts_completed=2, longest_streak=2)
+        rebuild_streaks()
+        self.assertEqual(
+            list(UserCounters.objects.order_by('user_id').values_list('workouts_completed', 'longest_streak', 'total_volume')),
+            [(4, 3, 5000), (0, 0, 0)],
+        )
+        self.assertEqual(counters(self.user.id)['workouts_completed'], 4)
+
+
+class UserCountersTest(TestCase):
+    """Counters of users with history from before UserCounters start from that history"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('checker')
+        # Logged before the counters existed, so no events were emitted
+        ProgressLog.objects.bulk_create([
+            ProgressLog(user=self.user, date=datetime.date(2024, 2, day), weight=80) for day in range(1, 10)
+        ])
+
+    def codes(self):
+        return sorted(Achievement.objects.filter(user=self.user).values_list('code', flat=True))
+
+    def test_first_event_counts_existing_history_once(self):
+        ProgressLog.objects.create(user=self.user, date=datetime.date(2024, 2, 10), weight=79)
+        self.assertEqual(UserCounters.objects.get(user=self.user).progress_logs, 10)
+        self.assertEqual(self.codes(), ['check-ins-1', 'check-ins-10'])
+
+        ProgressLog.objects.create(user=self.user, date=datetime.date(2024, 2, 11), weight=79)
+        self.assertEqual(counters(self.user.id)['progress_logs'], 11)
+        self.assertEqual(self.codes(), ['check-ins-1', 'check-ins-10'])
+
+    def test_reading_counters_seeds_them(self):
+        self.assertEqual(counters(self.user.id)['progress_logs'], 9)
+        self.assertEqual(UserCounters.objects.get(user=self.user).progress_logs, 9)
+
+    def test_missing_row_behind_a_stale_cache_is_rebuilt(self):
+        counters(self.user.id)
+        UserCounters.objects.filter(user=self.user).delete()
+        ProgressLog.objects.create(user=self.user, date=datetime.date(2024, 2, 10), weight=79)
+        self.assertEqual(UserCounters.objects.get(user=self.user).progress_logs, 10)
+
+
+class AchievementRulesTest(TestCase):
+    """Events evaluate the rules listening to them against the counters before and after"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('lifter')
+        counters(self.user.id)
+
+    def codes(self):
+        return sorted(Achievement.objects.filter(user=self.user).values_list('code', flat=True))
+
+    def test_thresholds_crossed(self):
+        rule = Rule('prs-{n}', 'personal_records', [10, 1, 5], ['personal_record'], 'strength', '{n} PRs', 'Set {n}.', names={1: 'First PR'})
+        self.assertEqual([a['code'] for a in rule.crossed({'personal_records': 1}, {'personal_records': 10})], ['prs-5', 'prs-10'])
+        self.assertEqual([a['title'] for a in rule.crossed({}, {'personal_records': 5})], ['First PR', '5 PRs'])
+        self.assertEqual(rule.crossed({'personal_records': 5}, {'personal_records': 5}), [])
+
+    def test_rules_are_indexed_by_event(self):
+        self.assertEqual([rule.code for rule in RULES_BY_EVENT['session_completed']], ['workouts-{n}', 'streak-{n}'])
+        self.assertNotIn('progress_deleted', RULES_BY_EVENT)
+        emit(self.user.id, 'progress_deleted', add={'progress_logs': -1})
+        self.assertEqual(self.codes(), [])
+        emit(self.user.id, 'personal_record', add={'personal_records': 5})
+        self.assertEqual(self.codes(), ['prs-1', 'prs-5'])
+
+    def test_milestones_are_awarded_once(self):
+        emit(self.user.id, 'exercise_logged', add={'total_volume': 1500})
+        emit(self.user.id, 'exercise_logged', add={'total_volume': -1000})
+        after = emit(self.user.id, 'exercise_logged', add={'total_volume': 1000})
+        self.assertEqual(after['total_volume'], 1500)
+        self.assertEqual(self.codes(), ['volume-1000'])
+
+    def test_volume_follows_log_edits_and_deletes(self):
+        exercise = Exercise.objects.create(name='Squat', description='', category='strength', muscle_group='legs', instructions='')
+        workout = Workout.objects.create(
+            name='Legs', description='', difficulty='beginner', goal='strength', duration=45, estimated_calories=300,
+        )
+        session = WorkoutSession.objects.create(user=self.user, workout=workout, scheduled_date=datetime.date(2024, 5, 6))
+        log = ExerciseLog.objects.create(session=session, exercise=exercise, sets_completed=5, reps_completed=5, weight_used=100)
+        ExerciseLog.objects.create(session=session, exercise=exercise, sets_completed=1, reps_completed=10, weight_used=60)
+        self.assertEqual(counters(self.user.id)['total_volume'], 3100)
+
+        log.weight_used = 120
+        log.save()
+        self.assertEqual(counters(self.user.id)['total_volume'], 3600)
+        log.delete()
+        self.assertEqual(counters(self.user.id)['total_volume'], 600)
+
+    def test_personal_records_count_like_a_rebuild(self):
+        bench = Exercise.objects.create(name='Bench', description='', category='strength', muscle_group='chest', instructions='')
+        record = PersonalRecord.objects.create(user=self.user, exercise=bench, record_type='weight', value=100, unit='kg')
+        PersonalRecord.objects.create(user=self.user, exercise=bench, record_type='reps', value=12, unit='reps')
+        record.value = 105
+        record.save()
+        self.assertEqual(counters(self.user.id)['personal_records'], 2)
+        self.assertEqual(rebuild_user(self.user.id)['personal_records'], 2)
+
+        record.delete()
+        self.assertEqual(counters(self.user.id)['personal_records'], 1)
+        self.assertEqual(rebuild_user(self.user.id)['personal_records'], 1)
+        self.assertEqual(self.codes(), ['prs-1'])
+
+    def test_values_set_counters(self):
+        emit(self.user.id, 'session_completed', values={'workouts_completed': 1, 'longest_streak': 3})
+        self.assertEqual(self.codes(), ['streak-3', 'workouts-1'])
+        self.assertEqual(Achievement.objects.get(user=self.user, code='workouts-1').title, 'First Workout')
+
+
+class SeriesTest(TestCase):
+    """Long series are reduced with LTTB to a clamped point budget"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('weigher', password='pw')
+        self.client.force_login(self.user)
+
+    def test_lttb_keeps_ends_and_spikes(self):
+        x = np.arange(100, dtype=float)
+        y = np.zeros(100)
+        y[37], y[71] = 50, -40
+        keep = lttb(x, y, 6)
+        self.assertEqual(len(keep), 6)
+        self.assertEqual((keep[0], keep[-1]), (0, 99))
+        self.assertIn(37, keep)
+        self.assertIn(71, keep)
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_lttb_returns_short_series_whole(self):
+        self.assertEqual(lttb(np.arange(5.0), np.arange(5.0), 10).tolist(), [0, 1, 2, 3, 4])
+
+    def test_points_are_clamped(self):
+        ProgressLog.objects.bulk_create([
+            ProgressLog(user=self.user, date=datetime.date(2024, 1, 1) + datetime.timedelta(days=i), weight=80 + i % 7)
+            for i in range(50)
+        ])
+        for requested, expected in [('0', 3), ('1', 3), ('10', 10), ('99999', 50), ('x', 50)]:
+            data = self.client.get('/progress/series/', {'metric': 'weight', 'points': requested}).json()
+            self.assertEqual(len(data['metrics']['weight']['points']), expected, requested)
+        self.assertEqual(data['metrics']['weight']['total'], 50)
+
+
+class ForecastingTest(TestCase):
+    """Weight goals are judged against the smoothed trend and its recent rate"""
+
+    def series(self, user_id, offsets, weights, start=datetime.date(2024, 1, 1)):
+        days = [start.toordinal() + offset for offset in offsets]
+        return np.full(len(days), user_id, dtype=np.int64), np.array(days, dtype=np.int64), np.array(weights, dtype=float)
+
+    def fit(self, *series):
+        return fit_trends(*(np.concatenate(parts) for parts in zip(*series)))
+
+    def test_trend_follows_a_steady_loss(self):
+        days = range(90)
+        fits = self.fit(
+            self.series(1, days, [100 - 0.1 * d for d in days]),
+            self.series(2, range(0, 90, 3), [80] * 30),
+            self.series(3, [0, 1], [70, 71]),
+        )
+        self.assertEqual(fits['users'].tolist(), [1, 2, 3])
+        self.assertEqual(fits['samples'].tolist(), [90, 30, 2])
+        # The smoothed trend lags a linear series by (1 - SMOOTHING) / SMOOTHING days
+        self.assertAlmostEqual(fits['trend'][0], 100 - 8.9 + 0.9, places=2)
+        self.assertAlmostEqual(fits['weekly_rate'][0], -0.7, places=2)
+        self.assertEqual((fits['trend'][1], fits['weekly_rate'][1]), (80.0, 0.0))
+        self.assertTrue(np.isnan(fits['weekly_rate'][2]))
+
+    def test_gaps_decay_the_old_trend(self):
+        daily = self.fit(self.series(1, [0, 1], [80, 90]))
+        weekly = self.fit(self.series(1, [0, 7], [80, 90]))
+        self.assertAlmostEqual(daily['trend'][0], 81.0)
+        self.assertAlmostEqual(weekly['trend'][0], 90 - 10 * 0.9 ** 7)
+
+    def test_goal_progress_and_projection(self):
+        user = User.objects.create_user('weigher', password='pw')
+        as_of = datetime.date(2024, 3, 1).toordinal()
+        fits = {
+            'users': np.array([user.id]), 'as_of': np.array([as_of]), 'trend': np.array([95.0]),
+            'weekly_rate': np.array([-3.5]), 'first_weight': np.array([101.0]),
+        }
+
+        def goal(target, start=None):
+            return Goal(user=user, goal_type='weight_loss', title='', target_weight=target, start_weight=start)
+
+        on_track, reached, backwards, unknown = forecast_goals(
+            [goal(90, 100), goal(96, 100), goal(105, 100), goal(90)], fits,
+        )
+        self.assertEqual((on_track.progress_percentage, on_track.projected_date), (50, datetime.date(2024, 3, 11)))
+        self.assertEqual((reached.progress_percentage, reached.projected_date), (100, datetime.date(2024, 3, 1)))
+        self.assertEqual((backwards.progress_percentage, backwards.projected_date), (0, None))
+        self.assertEqual((unknown.start_weight, unknown.progress_percentage), (Decimal('101.00'), 55))
+
+    def test_weigh_ins_refresh_the_trend_and_goals(self):
+        cache.clear()
+        user = User.objects.create_user('weigher', password='pw')
+        goal = Goal.objects.create(user=user, goal_type='weight_loss', title='Cut', target_weight=80, start_weight=81)
+        today = datetime.date.today()
+        for weight, days_ago in [(81, 2), (80, 1), (79, 0)]:
+            ProgressLog.objects.create(user=user, date=today - datetime.timedelta(days=days_ago), weight=weight)
+
+        trend = WeightTrend.objects.get(user=user)
+        self.assertEqual((trend.as_of, trend.samples), (today, 3))
+        self.assertEqual(trend.trend_weight, Decimal('80.71'))
+        goal.refresh_from_db()
+        self.assertEqual(goal.progress_percentage, 29)
+
+
+class EnergyBalanceTest(TestCase):
+    """Intake against the sedentary baseline plus logged workouts, materialized per day"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('eater', password='pw')
+        profile = self.user.profile
+        profile.gender, profile.height, profile.current_weight, profile.activity_level = 'M', 180, 80, 'moderate'
+        profile.date_of_birth = datetime.date(1990, 1, 1)
+        profile.save()
+        self.bmr = bmr(80, 180, profile.age, 'M')
+        self.workout = Workout.objects.create(
+            name='Run', description='', difficulty='beginner', goal='endurance', duration=30, estimated_calories=300,
+        )
+
+    def test_bmr(self):
+        self.assertEqual(bmr(80, 180, 30, 'M'), 1780)
+        self.assertEqual(bmr(80, 180, 30, 'F'), 1614)
+        self.assertEqual(bmr(80, 180, 30, None), 1697)
+        self.assertIsNone(bmr(None, 180, 30, 'M'))
+
+    def test_profile_energy_is_cached_until_the_profile_changes(self):
+        self.assertEqual(profile_energy(self.user.id), {
+            'bmr': round(self.bmr), 'tdee': round(self.bmr * 1.55), 'baseline': round(self.bmr * 1.2),
+        })
+        with self.assertNumQueries(0):
+            profile_energy(self.user.id)
+        self.user.profile.current_weight = 90
+        self.user.profile.save()
+        self.assertEqual(profile_energy(self.user.id)['bmr'], round(self.bmr + 100))
+
+    def test_days_follow_both_sides(self):
+        day = datetime.date(2024, 5, 6)
+        tdee, baseline = round(self.bmr * 1.55), round(self.bmr * 1.2)
+        NutritionLog.objects.create(user=self.user, date=day, total_calories=tdee)
+        session = WorkoutSession.objects.create(
+            user=self.user, workout=self.workout, scheduled_date=day, status='completed', calories_burned=400,
+        )
+        row = DailyEnergyBalance.objects.get(user=self.user, date=day)
+        self.assertEqual((row.intake, row.burned, row.baseline, row.net, row.on_target), (tdee, 400, baseline, tdee - baseline - 400, True))
+        self.assertEqual(counters(self.user.id)['nutrition_days_on_target'], 1)
+
+        WorkoutSession.objects.create(user=self.user, workout=self.workout, scheduled_date=day + datetime.timedelta(days=1), status='completed', calories_burned=250)
+        week = timeline(self.user.id, period='week')
+        self.assertEqual(week, [{'date': '2024-05-06', 'intake': tdee, 'burned': 650, 'baseline': 2 * baseline, 'net': tdee - 2 * baseline - 650}])
+
+        session.delete()
+        NutritionLog.objects.filter(user=self.user, date=day).delete()
+        self.assertEqual([row['date'] for row in timeline(self.user.id)], ['2024-05-07'])
+        self.assertEqual(counters(self.user.id)['nutrition_days_on_target'], 0)
+
+    def test_profile_changes_rebuild_past_days(self):
+        day = datetime.date(2024, 5, 6)
+        NutritionLog.objects.create(user=self.user, date=day, total_calories=round(self.bmr * 1.55))
+        self.assertEqual(counters(self.user.id)['nutrition_days_on_target'], 1)
+
+        profile = self.user.profile
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.bio = 'Runner'
+            profile.save()
+        self.assertFalse(Job.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.current_weight, profile.activity_level = 90, 'very'
+            profile.save()
+        self.assertEqual(work('w1', burst=True), 1)
+        bmr_now = bmr(90, 180, profile.age, 'M')
+        row = DailyEnergyBalance.objects.get(user=self.user, date=day)
+        self.assertEqual((row.baseline, row.on_target), (round(bmr_now * 1.2), False))
+        self.assertEqual(counters(self.user.id)['nutrition_days_on_target'], 0)
+
+
+class IndexAdvisorTest(TestCase):
+    """Captured SELECTs are replayed and full table scans get an index suggestion"""
+
+    def test_suggested_column_order(self):
+        sql = (
+            'SELECT * FROM "t" INNER JOIN "u" ON ("t"."u_id" = "u"."id") '
+            'WHERE ("t"."date" >= %s AND "t"."user_id" = %s AND "u"."name" = %s) ORDER BY "t"."date" DESC, "t"."id" ASC LIMIT 5'
+        )
+        self.assertEqual(suggest_columns(sql, 't'), ('user_id', 'date', 'id'))
+        self.assertEqual(suggest_columns('SELECT * FROM "t"', 't'), ())
+
+    def test_only_table_scans_are_reported(self):
+        plan = ['SCAN core_goal', 'SCAN subquery_1', 'SEARCH core_progresslog USING INDEX x (user_id=?)', 'SCAN core_goal AS g']
+        self.assertEqual(list(full_scans(plan, {'core_goal', 'core_progresslog'})), ['core_goal', 'core_goal'])
+
+    def test_replays_captured_queries(self):
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        user = User.objects.create_user('weigher', password='pw')
+        with connection.execute_wrapper(QueryRecorder(path, 'default')):
+            for _ in range(2):
+                list(ProgressLog.objects.filter(weight__gt=80))
+            list(ProgressLog.objects.filter(user=user))
+
+        out = StringIO()
+        call_command('index_advisor', file=path, stdout=out)
+        output = out.getvalue()
+        self.assertIn('Replayed 2 distinct queries, 1 full table scans', output)
+        self.assertIn('SCAN core_progresslog (2 executions)', output)
+        self.assertIn('CREATE INDEX core_progresslog_weight_date_idx ON core_progresslog (weight, date);', output)
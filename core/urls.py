@@ -20,10 +20,20 @@ urlpatterns = [
     # Progress
     path('progress/', views.progress, name='progress'),
     path('progress/log/', views.log_progress, name='log_progress'),
+    path('progress/series/', views.progress_series, name='progress_series'),
+    
+    # Energy balance
+    path('energy/data/', views.energy_balance_data, name='energy_balance_data'),
+    
+    # Activity
+    path('activity/heatmap/', views.activity_heatmap, name='activity_heatmap'),
     
     # Achievements
     path('achievements/', views.achievements, name='achievements'),
     
+    # Database
+    path('db/replica-stats/', views.replica_stats, name='replica_stats'),
+    
     # Authentication
     path('register/', views.register, name='register'),
     path('login/', views.user_login, name='login'),
@@ -1,12 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
 from django.db.models import Count, Sum, Avg
+from django.http import JsonResponse
 from django.utils import timezone
 from datetime import timedelta, date
-from .models import UserProfile, Goal, ProgressLog, Achievement
+from .models import UserProfile, Goal, ProgressLog, Achievement, WeightTrend, TrainingStreak
+from .forecasting import refresh as refresh_forecast
+from .series import METRICS, DEFAULT_POINTS, MAX_POINTS, MIN_POINTS, series_for_user
+from .energy import profile_energy, timeline
+from .activity import heatmaps
+from .tasks import resize_profile_picture
+from jobs.queue import enqueue
+from FitTrack import routers
 from workouts.models import WorkoutSession
 from nutrition.models import NutritionLog
 
@@ -90,6 +98,7 @@ def profile(request):
     context = {
         'title': 'Profile',
         'profile': profile,
+        'energy': profile_energy(request.user.id),
         'goals': goals,
         'progress_logs': progress_logs,
         'achievements': achievements,
@@ -113,10 +122,15 @@ def edit_profile(request):
         profile.bio = request.POST.get('bio')
         
         # Handle profile picture upload
-        if 'profile_picture' in request.FILES:
+        new_picture = 'profile_picture' in request.FILES
+        if new_picture:
             profile.profile_picture = request.FILES['profile_picture']
         
         profile.save()
+        
+        # Resize the upload in the background instead of during the request
+        if new_picture:
+            enqueue(resize_profile_picture, args=[profile.id], dedupe_key=f'profile-picture:{profile.id}')
         messages.success(request, 'Profile updated successfully!')
         return redirect('profile')
     
@@ -136,6 +150,7 @@ def goals(request):
     context = {
         'title': 'My Goals',
         'goals': user_goals,
+        'weight_trend': WeightTrend.objects.filter(user=request.user).first(),
     }
     
     return render(request, 'core/goals.html', context)
@@ -145,6 +160,7 @@ def goals(request):
 def create_goal(request):
     """Create a new goal"""
     if request.method == 'POST':
+        trend = WeightTrend.objects.filter(user=request.user).first()
         goal = Goal.objects.create(
             user=request.user,
             goal_type=request.POST.get('goal_type'),
@@ -152,7 +168,10 @@ def create_goal(request):
             description=request.POST.get('description'),
             target_weight=request.POST.get('target_weight') or None,
             target_date=request.POST.get('target_date') or None,
+            start_weight=trend.trend_weight if trend else request.user.profile.current_weight,
         )
+        if goal.target_weight is not None:
+            refresh_forecast([request.user.id])
         messages.success(request, 'Goal created successfully!')
         return redirect('goals')
     
@@ -169,7 +188,9 @@ def update_goal(request, goal_id):
     goal = get_object_or_404(Goal, id=goal_id, user=request.user)
     
     if request.method == 'POST':
-        goal.progress_percentage = request.POST.get('progress_percentage')
+        # Weight goals are tracked from the weight trend (see core.forecasting)
+        if goal.target_weight is None:
+            goal.progress_percentage = request.POST.get('progress_percentage')
         goal.status = request.POST.get('status')
         
         if goal.status == 'completed':
@@ -195,6 +216,7 @@ def progress(request):
     context = {
         'title': 'My Progress',
         'logs': logs,
+        'weight_trend': WeightTrend.objects.filter(user=request.user).first(),
     }
     
     return render(request, 'core/progress.html', context)
@@ -239,6 +261,62 @@ def log_progress(request):
     return render(request, 'core/log_progress.html', context)
 
 
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+@login_required
+def progress_series(request):
+    """Downsampled measurement and nutrition series as JSON"""
+    metrics = [m for m in dict.fromkeys(request.GET.getlist('metric')) if m in METRICS] or ['weight']
+    start = _parse_date(request.GET.get('start'))
+    end = _parse_date(request.GET.get('end'))
+    
+    points = request.GET.get('points', '')
+    points = max(MIN_POINTS, min(int(points), MAX_POINTS)) if points.isdigit() else DEFAULT_POINTS
+    
+    data = series_for_user(request.user.id, metrics, start=start, end=end, points=points)
+    return JsonResponse({
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'points': points,
+        'metrics': data,
+    })
+
+
+@login_required
+def energy_balance_data(request):
+    """Daily, weekly or monthly energy balance as JSON"""
+    period = request.GET.get('period', 'day')
+    if period not in ('day', 'week', 'month'):
+        period = 'day'
+    start = _parse_date(request.GET.get('start'))
+    end = _parse_date(request.GET.get('end'))
+    
+    return JsonResponse({
+        'period': period,
+        'profile': profile_energy(request.user.id),
+        'timeline': timeline(request.user.id, period=period, start=start, end=end),
+    })
+
+
+@login_required
+def activity_heatmap(request):
+    """Training, nutrition and progress day bitmaps for several years as JSON"""
+    this_year = date.today().year
+    years = sorted({int(y) for y in request.GET.getlist('year') if y.isdigit()})[-10:]
+    if not years:
+        years = [this_year - 2, this_year - 1, this_year]
+    
+    return JsonResponse({
+        'encoding': 'base64 bitmap, bit n (LSB first) = day n + 1 of the year',
+        'years': heatmaps(request.user.id, years),
+    })
+
+
 @login_required
 def achievements(request):
     """View all achievements"""
@@ -247,11 +325,21 @@ def achievements(request):
     context = {
         'title': 'My Achievements',
         'achievements': user_achievements,
+        'streak': TrainingStreak.objects.filter(user=request.user).first(),
     }
     
     return render(request, 'core/achievements.html', context)
 
 
+@user_passes_test(lambda u: u.is_staff)
+def replica_stats(request):
+    """How many reads this process sent to the read replica vs the primary"""
+    data = routers.stats.snapshot()
+    data['replica_enabled'] = routers.replica_enabled()
+    
+    return JsonResponse(data)
+
+
 # Authentication views
 def register(request):
     """User registration"""
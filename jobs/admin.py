@@ -0,0 +1,27 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'priority', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'dedupe_key', 'last_error']
+    readonly_fields = ['created_at', 'finished_at', 'locked_by', 'locked_at', 'last_error']
+    date_hierarchy = 'created_at'
+    
+    fieldsets = (
+        ('Task', {
+            'fields': ('name', 'args', 'kwargs', 'user_id')
+        }),
+        ('Scheduling', {
+            'fields': ('priority', 'run_at', 'dedupe_key', 'max_attempts')
+        }),
+        ('Execution', {
+            'fields': ('status', 'attempts', 'locked_by', 'locked_at', 'last_error')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'finished_at'),
+            'classes': ('collapse',)
+        }),
+    )
@@ -0,0 +1,50 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.process import worker_process
+from jobs.worker import POLL_INTERVAL, work
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of background job workers'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--processes', type=int, default=2, help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+    
+    def handle(self, *args, **options):
+        processes = options['processes']
+        burst = options['burst']
+        poll_interval = options['poll_interval']
+        
+        if processes <= 1:
+            processed = work(burst=burst, poll_interval=poll_interval)
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
+            return
+        
+        # Children open their own connections after django.setup()
+        connections.close_all()
+        ctx = multiprocessing.get_context('spawn')
+        stop_event = ctx.Event()
+        
+        workers = [
+            ctx.Process(target=worker_process, args=(i, stop_event, burst, poll_interval), daemon=False)
+            for i in range(processes)
+        ]
+        for proc in workers:
+            proc.start()
+        
+        def shutdown(signum, frame):
+            self.stdout.write('Stopping workers after their current job...')
+            stop_event.set()
+        
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+        
+        self.stdout.write(self.style.SUCCESS(f'Started {processes} workers'))
+        for proc in workers:
+            proc.join()
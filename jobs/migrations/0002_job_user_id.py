@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='user_id',
+            field=models.IntegerField(blank=True, help_text='User whose shard the job runs against', null=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import models
+from django.db.models import Q
+
+
+class Job(models.Model):
+    """A unit of background work waiting for (or processed by) a worker"""
+    
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=200, help_text="Registered task name, e.g. nutrition.recompute_totals")
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    
+    # Scheduling
+    priority = models.IntegerField(default=0, help_text="Higher runs first")
+    run_at = models.DateTimeField(help_text="Earliest time the job may run")
+    dedupe_key = models.CharField(max_length=200, null=True, blank=True, help_text="Only one queued job per key")
+    user_id = models.IntegerField(null=True, blank=True, help_text="User whose shard the job runs against")
+    
+    # Execution
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+    
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        indexes = [
+            models.Index(fields=['status', 'run_at', 'priority'], name='job_claim_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=Q(status='queued'),
+                name='job_unique_queued_dedupe_key',
+            ),
+        ]
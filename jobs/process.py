@@ -0,0 +1,23 @@
+"""
+Entry point for spawned worker processes.
+
+Kept free of model imports: a freshly spawned interpreter has to run
+``django.setup()`` before ``jobs.worker`` (and the models it uses) can load.
+"""
+import os
+import signal
+import socket
+
+
+def worker_process(index, stop_event, burst, poll_interval):
+    """Set up Django in the child process and run the worker loop"""
+    import django
+    django.setup()
+    
+    from .worker import work
+    
+    # The parent process handles Ctrl+C and signals us through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    work(worker_id, stop_event=stop_event, burst=burst, poll_interval=poll_interval)
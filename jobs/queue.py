@@ -0,0 +1,64 @@
+"""
+Public API for enqueueing background work.
+
+Views and signal handlers call ``enqueue`` with a task registered through
+``jobs.registry.task``. Jobs are plain rows in the ``jobs_job`` table, so the
+enqueue takes part in the caller's transaction and no broker is needed.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from FitTrack import sharding
+from .models import Job
+from .registry import get_task
+
+
+def enqueue(task, args=None, kwargs=None, priority=None, run_at=None, delay=None,
+            dedupe_key=None, max_attempts=None):
+    """
+    Queue a task for the worker pool and return the Job row.
+    
+    ``task`` is either a decorated task function or its registered name.
+    ``delay`` (seconds or timedelta) schedules the job relative to now,
+    ``run_at`` schedules it at an absolute time. When ``dedupe_key`` is given
+    and a queued job with the same key already exists, that job is returned
+    instead of creating a duplicate. The job runs bound to the same user (and
+    therefore shard) as the code that enqueued it.
+    """
+    func = get_task(task) if isinstance(task, str) else task
+    
+    if run_at is None:
+        run_at = timezone.now()
+        if delay:
+            run_at += delay if isinstance(delay, timedelta) else timedelta(seconds=delay)
+    
+    job = Job(
+        name=func.task_name,
+        args=list(args or []),
+        kwargs=dict(kwargs or {}),
+        priority=func.priority if priority is None else priority,
+        run_at=run_at,
+        dedupe_key=dedupe_key,
+        user_id=sharding.current_user_id(),
+        max_attempts=func.max_attempts if max_attempts is None else max_attempts,
+    )
+    
+    if dedupe_key is None:
+        job.save()
+        return job
+    
+    try:
+        with transaction.atomic():
+            job.save()
+        return job
+    except IntegrityError:
+        existing = Job.objects.filter(dedupe_key=dedupe_key, status='queued').first()
+        # The queued job may have been claimed in the meantime; queue ours then
+        return existing or enqueue(func, args, kwargs, priority, run_at, None, dedupe_key, max_attempts)
+
+
+def enqueue_on_commit(task, **options):
+    """Queue a task once the surrounding transaction commits"""
+    transaction.on_commit(lambda: enqueue(task, **options))
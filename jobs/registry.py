@@ -0,0 +1,38 @@
+"""
+Task registry for the background job queue.
+
+Apps declare tasks in their own ``tasks.py`` with the ``@task`` decorator;
+``JobsConfig.ready`` imports those modules so workers can look tasks up by
+name.
+"""
+
+_tasks = {}
+
+
+class TaskNotFound(KeyError):
+    """Raised when a job references a task name nobody registered"""
+
+
+def task(name=None, max_attempts=3, priority=0):
+    """Register a function as a background task"""
+    def decorator(func):
+        task_name = name or f"{func.__module__.split('.')[0]}.{func.__name__}"
+        func.task_name = task_name
+        func.max_attempts = max_attempts
+        func.priority = priority
+        _tasks[task_name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    """Look up a registered task by name"""
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise TaskNotFound(name)
+
+
+def registered_tasks():
+    """Names of all registered tasks"""
+    return sorted(_tasks)
@@ -0,0 +1,187 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models import QuerySet
+from django.test import TestCase
+from django.utils import timezone
+
+from FitTrack.sharding import use_shard
+from .models import Job
+from .queue import enqueue, enqueue_on_commit
+from .registry import task
+from .worker import BACKOFF_BASE, STALE_AFTER, backoff_delay, claim_next, requeue_stale, run_job, work
+
+calls = []
+
+
+@task(name='jobs.tests.record', max_attempts=2)
+def record(*args, **kwargs):
+    calls.append((args, kwargs))
+
+
+@task(name='jobs.tests.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('boom')
+
+
+class QueueTest(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_uses_task_defaults(self):
+        job = enqueue('jobs.tests.record', args=[1], kwargs={'a': 2})
+        self.assertEqual((job.name, job.args, job.kwargs, job.status, job.max_attempts), ('jobs.tests.record', [1], {'a': 2}, 'queued', 2))
+        self.assertLessEqual(job.run_at, timezone.now())
+
+    def test_delay_schedules_later(self):
+        job = enqueue(record, delay=30)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=25))
+        self.assertIsNone(claim_next('w1'))
+
+    def test_jobs_run_as_the_enqueuing_user(self):
+        with use_shard(42):
+            job = enqueue(record)
+        self.assertEqual(job.user_id, 42)
+
+    def test_dedupe_returns_the_queued_job(self):
+        first = enqueue(record, args=[1], dedupe_key='k')
+        self.assertEqual(enqueue(record, args=[2], dedupe_key='k').pk, first.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+        # Once claimed, the key is free for the next write to queue again
+        claim_next('w1')
+        second = enqueue(record, args=[3], dedupe_key='k')
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertEqual(Job.objects.filter(dedupe_key='k', status='queued').get().pk, second.pk)
+
+    def test_enqueue_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            enqueue_on_commit(record, args=[1])
+            self.assertFalse(Job.objects.exists())
+        callbacks[0]()
+        self.assertEqual(Job.objects.get().args, [1])
+
+
+class WorkerTest(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_claims_by_priority_then_age(self):
+        now = timezone.now()
+        old = enqueue(record, run_at=now - timedelta(minutes=5))
+        urgent = enqueue(record, priority=5, run_at=now)
+        new = enqueue(record, run_at=now - timedelta(minutes=1))
+
+        self.assertEqual([claim_next('w1').pk for _ in range(3)], [urgent.pk, old.pk, new.pk])
+        self.assertIsNone(claim_next('w1'))
+
+        job = Job.objects.get(pk=urgent.pk)
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('running', 1, 'w1'))
+
+    def test_claim_skips_jobs_taken_by_another_worker(self):
+        taken, free = enqueue(record, priority=1), enqueue(record)
+        update = QuerySet.update
+
+        def racing_update(queryset, **values):
+            # Another worker claims the candidate between the SELECT and our UPDATE
+            if values.get('status') == 'running' and not Job.objects.filter(locked_by='w2').exists():
+                update(Job.objects.filter(pk=taken.pk), status='running', locked_by='w2')
+            return update(queryset, **values)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            self.assertEqual(claim_next('w1').pk, free.pk)
+        self.assertEqual(Job.objects.get(pk=taken.pk).locked_by, 'w2')
+
+    def test_success(self):
+        enqueue(record, args=[1], kwargs={'b': 2})
+        self.assertTrue(run_job(claim_next('w1')))
+        self.assertEqual(calls, [((1,), {'b': 2})])
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.last_error), ('done', ''))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failures_back_off_then_fail(self):
+        enqueue(fail)
+        self.assertFalse(run_job(claim_next('w1')))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.locked_by), ('queued', ''))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreaterEqual(job.run_at, timezone.now() + timedelta(seconds=BACKOFF_BASE / 2 - 1))
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertFalse(run_job(claim_next('w1')))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_retry_superseded_by_a_queued_duplicate(self):
+        running = enqueue(fail, dedupe_key='k')
+        claimed = claim_next('w1')
+        # A later write queues the same work while the first copy runs
+        queued = enqueue(fail, dedupe_key='k')
+
+        self.assertFalse(run_job(claimed))
+        running.refresh_from_db()
+        self.assertEqual((running.status, running.locked_by), ('failed', ''))
+        self.assertIn('Superseded', running.last_error)
+        self.assertIn('RuntimeError: boom', running.last_error)
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, 'queued')
+
+    def test_backoff_doubles_with_jitter(self):
+        for attempts in range(1, 6):
+            ceiling = BACKOFF_BASE * 2 ** (attempts - 1)
+            for _ in range(20):
+                self.assertTrue(ceiling / 2 <= backoff_delay(attempts) <= ceiling)
+
+    def test_burst_drains_the_queue(self):
+        for i in range(3):
+            enqueue(record, args=[i])
+        self.assertEqual(work('w1', burst=True), 3)
+        self.assertEqual(sorted(args for args, _ in calls), [(0,), (1,), (2,)])
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'done'})
+
+
+class StaleJobTest(TestCase):
+
+    def running(self, attempts, dedupe_key=None, age=STALE_AFTER + 60):
+        job = enqueue(record, dedupe_key=dedupe_key)
+        Job.objects.filter(pk=job.pk).update(
+            status='running', attempts=attempts, locked_by='dead', locked_at=timezone.now() - timedelta(seconds=age),
+        )
+        return job
+
+    def status(self, job):
+        return Job.objects.values_list('status', flat=True).get(pk=job.pk)
+
+    def test_requeues_with_backoff(self):
+        job = self.running(attempts=1)
+        self.assertEqual(requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.locked_at), ('queued', '', None))
+        self.assertGreater(job.run_at, timezone.now())
+
+    def test_fails_jobs_out_of_attempts(self):
+        job = self.running(attempts=2)
+        self.assertEqual(requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Worker stopped', job.last_error)
+
+    def test_leaves_live_jobs_alone(self):
+        job = self.running(attempts=1, age=5)
+        self.assertEqual(requeue_stale(), 0)
+        self.assertEqual(self.status(job), 'running')
+
+    def test_superseded_by_a_queued_duplicate(self):
+        stale = self.running(attempts=1, dedupe_key='k')
+        queued = enqueue(record, dedupe_key='k')
+        self.assertEqual(requeue_stale(), 0)
+        self.assertEqual((self.status(stale), self.status(queued)), ('failed', 'queued'))
+
+    def test_worker_checks_periodically(self):
+        job = self.running(attempts=1)
+        with mock.patch('jobs.worker.STALE_CHECK_INTERVAL', 0), mock.patch('jobs.worker.backoff_delay', return_value=0):
+            work('w1', burst=True)
+        self.assertEqual(self.status(job), 'done')
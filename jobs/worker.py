@@ -0,0 +1,149 @@
+"""
+Worker loop for the database-backed job queue.
+
+Each worker process polls the ``jobs_job`` table, claims the next runnable
+job with a conditional UPDATE (so two workers can never claim the same row,
+even on SQLite where SELECT ... FOR UPDATE is unavailable), runs it, and
+records the outcome. Failed jobs are retried with exponential backoff plus
+jitter until ``max_attempts`` is reached. Jobs left running by a worker that
+died are picked up the same way: every worker looks for them periodically
+and requeues them, or fails them once they are out of attempts.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from FitTrack.routers import use_primary
+from FitTrack.sharding import use_shard
+from .models import Job
+from .registry import get_task
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = getattr(settings, 'JOBS_POLL_INTERVAL', 1.0)
+BACKOFF_BASE = getattr(settings, 'JOBS_BACKOFF_BASE', 5)
+BACKOFF_MAX = getattr(settings, 'JOBS_BACKOFF_MAX', 3600)
+STALE_AFTER = getattr(settings, 'JOBS_STALE_AFTER', 600)
+STALE_CHECK_INTERVAL = getattr(settings, 'JOBS_STALE_CHECK_INTERVAL', 60)
+
+
+def backoff_delay(attempts):
+    """Seconds to wait before retry number ``attempts`` (full jitter)"""
+    ceiling = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def claim_next(worker_id):
+    """Claim the highest-priority runnable job, or return None"""
+    while True:
+        candidate = Job.objects.filter(
+            status='queued',
+            run_at__lte=timezone.now(),
+        ).order_by('-priority', 'run_at', 'id').values_list('id', flat=True).first()
+        
+        if candidate is None:
+            return None
+        
+        claimed = Job.objects.filter(id=candidate, status='queued').update(
+            status='running',
+            locked_by=worker_id,
+            locked_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(id=candidate)
+        # Another worker won the race; try the next candidate
+
+
+def run_job(job):
+    """Execute a claimed job and record success, retry or failure"""
+    try:
+        func = get_task(job.name)
+        func(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s (%s) failed on attempt %s", job.id, job.name, job.attempts)
+        
+        now = timezone.now()
+        released = {'last_error': error, 'locked_by': '', 'locked_at': None}
+        if job.attempts < job.max_attempts:
+            try:
+                with transaction.atomic():
+                    Job.objects.filter(id=job.id).update(
+                        status='queued', run_at=now + timedelta(seconds=backoff_delay(job.attempts)), **released
+                    )
+                return False
+            except IntegrityError:
+                # A job with the same dedupe key was queued while this one ran and will retry the work
+                released['last_error'] = f'Superseded by a queued job with the same dedupe key\n\n{error}'
+        Job.objects.filter(id=job.id).update(status='failed', finished_at=now, **released)
+        return False
+    
+    Job.objects.filter(id=job.id).update(status='done', finished_at=timezone.now(), last_error='')
+    return True
+
+
+def requeue_stale():
+    """
+    Return jobs whose worker died mid-run to the queue (with backoff), or
+    fail them once they have used up ``max_attempts``. Returns the number of
+    jobs requeued.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=STALE_AFTER))
+    released = {'locked_by': '', 'locked_at': None}
+    
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, last_error='Worker stopped while running the job', **released
+    )
+    
+    requeued = 0
+    for job_id, attempts in stale.values_list('id', 'attempts'):
+        try:
+            with transaction.atomic():
+                requeued += Job.objects.filter(id=job_id, status='running').update(
+                    status='queued', run_at=now + timedelta(seconds=backoff_delay(attempts)), **released
+                )
+        except IntegrityError:
+            # A queued job with the same dedupe key already covers the work
+            Job.objects.filter(id=job_id).update(
+                status='failed', finished_at=now, last_error='Superseded by a queued job with the same dedupe key', **released
+            )
+    return requeued
+
+
+def work(worker_id=None, stop_event=None, burst=False, poll_interval=POLL_INTERVAL):
+    """Process jobs until ``stop_event`` is set (or the queue drains in burst mode)"""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    processed = 0
+    next_stale_check = 0
+    
+    while not (stop_event and stop_event.is_set()):
+        close_old_connections()
+        if time.monotonic() >= next_stale_check:
+            requeue_stale()
+            next_stale_check = time.monotonic() + STALE_CHECK_INTERVAL
+        job = claim_next(worker_id)
+        
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        
+        # Jobs usually follow a write the replica may not have yet
+        with use_primary(), use_shard(job.user_id):
+            run_job(job)
+        processed += 1
+    
+    return processed
+
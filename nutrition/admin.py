@@ -1,23 +1,32 @@
 from django.contrib import admin
 from .models import (
-    Recipe, MealPlan, MealPlanDay, MealPlanRecipe,
-    NutritionLog, MealLog, FoodItem
+    Recipe, RecipeIngredient, MealPlan, MealPlanDay, MealPlanRecipe,
+    NutritionLog, MealLog, MealSuggestion, FoodItem
 )
 
 
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    extra = 0
+    fields = ['position', 'text', 'name', 'quantity', 'unit', 'food_item', 'food_servings']
+    readonly_fields = ['food_servings']
+    autocomplete_fields = ['food_item']
+
+
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ['name', 'meal_type', 'difficulty', 'calories', 'protein', 'prep_time', 'cook_time', 'is_public']
     list_filter = ['meal_type', 'difficulty', 'is_vegetarian', 'is_vegan', 'is_gluten_free', 'is_public']
     search_fields = ['name', 'description', 'ingredients', 'creator__username']
     readonly_fields = ['created_at', 'updated_at']
+    inlines = [RecipeIngredientInline]
     
     fieldsets = (
         ('Basic Info', {
             'fields': ('creator', 'name', 'description', 'meal_type', 'difficulty')
         }),
         ('Nutrition (per serving)', {
-            'fields': ('calories', 'protein', 'carbs', 'fats', 'fiber', 'servings')
+            'fields': ('nutrition_from_ingredients', 'calories', 'protein', 'carbs', 'fats', 'fiber', 'servings')
         }),
         ('Timing', {
             'fields': ('prep_time', 'cook_time')
@@ -41,16 +50,17 @@ class RecipeAdmin(admin.ModelAdmin):
 class MealPlanDayInline(admin.TabularInline):
     model = MealPlanDay
     extra = 0
-    fields = ['day_number', 'notes']
+    fields = ['day_number', 'notes', 'total_calories', 'total_protein', 'total_carbs', 'total_fats']
+    readonly_fields = ['total_calories', 'total_protein', 'total_carbs', 'total_fats']
     ordering = ['day_number']
 
 
 @admin.register(MealPlan)
 class MealPlanAdmin(admin.ModelAdmin):
-    list_display = ['name', 'creator', 'plan_type', 'duration_days', 'daily_calories', 'is_public']
+    list_display = ['name', 'creator', 'plan_type', 'duration_days', 'daily_calories', 'average_calories', 'is_public']
     list_filter = ['plan_type', 'is_public', 'created_at']
     search_fields = ['name', 'description', 'creator__username']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['total_calories', 'total_protein', 'total_carbs', 'total_fats', 'created_at', 'updated_at']
     inlines = [MealPlanDayInline]
     
     fieldsets = (
@@ -60,6 +70,10 @@ class MealPlanAdmin(admin.ModelAdmin):
         ('Daily Targets', {
             'fields': ('daily_calories', 'daily_protein', 'daily_carbs', 'daily_fats')
         }),
+        ('Planned Totals', {
+            'fields': ('total_calories', 'total_protein', 'total_carbs', 'total_fats'),
+            'classes': ('collapse',)
+        }),
         ('Media', {
             'fields': ('image',)
         }),
@@ -81,15 +95,19 @@ class MealPlanRecipeInline(admin.TabularInline):
 
 @admin.register(MealPlanDay)
 class MealPlanDayAdmin(admin.ModelAdmin):
-    list_display = ['meal_plan', 'day_number']
+    list_display = ['meal_plan', 'day_number', 'total_calories', 'total_protein', 'total_carbs', 'total_fats']
     list_filter = ['meal_plan']
     search_fields = ['meal_plan__name']
+    readonly_fields = ['total_calories', 'total_protein', 'total_carbs', 'total_fats']
     inlines = [MealPlanRecipeInline]
     
     fieldsets = (
         ('Basic Info', {
             'fields': ('meal_plan', 'day_number')
         }),
+        ('Planned Totals', {
+            'fields': ('total_calories', 'total_protein', 'total_carbs', 'total_fats')
+        }),
         ('Notes', {
             'fields': ('notes',)
         }),
@@ -150,6 +168,9 @@ class MealLogAdmin(admin.ModelAdmin):
         ('Basic Info', {
             'fields': ('nutrition_log', 'recipe', 'meal_type', 'meal_name')
         }),
+        ('Food Item', {
+            'fields': ('food_item', 'quantity', 'unit')
+        }),
         ('Nutrition', {
             'fields': ('calories', 'protein', 'carbs', 'fats', 'servings')
         }),
@@ -163,6 +184,14 @@ class MealLogAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(MealSuggestion)
+class MealSuggestionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'meal_type', 'kind', 'label', 'times_logged', 'weight', 'last_logged']
+    list_filter = ['meal_type', 'kind']
+    search_fields = ['user__username', 'label']
+    date_hierarchy = 'last_logged'
+
+
 @admin.register(FoodItem)
 class FoodItemAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'brand', 'serving_size', 'calories', 'protein']
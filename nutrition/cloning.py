@@ -0,0 +1,44 @@
+"""
+Deep copies of meal plans.
+
+A clone reads the source days and recipes in two queries and writes the new
+plan, its days and its recipes with one INSERT each (bulk_create returns the
+new day ids), so the cost doesn't grow with the plan's length. The stored
+nutrition totals are copied along with the rows rather than recomputed.
+"""
+from django.db import router, transaction
+
+from .models import MealPlan, MealPlanDay, MealPlanRecipe
+
+PLAN_FIELDS = [
+    'description', 'plan_type', 'duration_days',
+    'daily_calories', 'daily_protein', 'daily_carbs', 'daily_fats',
+    'total_calories', 'total_protein', 'total_carbs', 'total_fats',
+]
+DAY_FIELDS = ['day_number', 'notes', 'total_calories', 'total_protein', 'total_carbs', 'total_fats']
+RECIPE_FIELDS = ['recipe_id', 'meal_time', 'servings', 'notes']
+
+
+def clone_plan(meal_plan, user, name=None):
+    """Copy a plan with all its days and recipes as a private plan owned by ``user``"""
+    days = list(MealPlanDay.objects.filter(meal_plan=meal_plan).values('id', *DAY_FIELDS))
+    recipes = list(MealPlanRecipe.objects.filter(meal_plan_day__meal_plan=meal_plan).values('meal_plan_day_id', *RECIPE_FIELDS))
+
+    with transaction.atomic(using=router.db_for_write(MealPlan)):
+        clone = MealPlan.objects.create(
+            creator=user,
+            name=name or f'{meal_plan.name} (copy)',
+            image=meal_plan.image.name or None,
+            is_public=False,
+            **{field: getattr(meal_plan, field) for field in PLAN_FIELDS},
+        )
+        new_days = MealPlanDay.objects.bulk_create([
+            MealPlanDay(meal_plan=clone, **{field: day[field] for field in DAY_FIELDS})
+            for day in days
+        ])
+        day_map = {day['id']: new_day.pk for day, new_day in zip(days, new_days)}
+        MealPlanRecipe.objects.bulk_create([
+            MealPlanRecipe(meal_plan_day_id=day_map[row['meal_plan_day_id']], **{field: row[field] for field in RECIPE_FIELDS})
+            for row in recipes
+        ])
+    return clone
@@ -0,0 +1,148 @@
+"""
+Logging meals straight from the food database.
+
+FoodItem nutrition is per serving, with the serving described in text
+("100g", "1 cup", "1 medium (118g)"). To log "150 g chicken breast" each
+food's values per gram (volumes at the density of water), per item and per
+serving are derived once from its serving size and cached; editing or
+deleting the food drops its entry.
+
+A meal of several foods is written with one bulk_create and added to the
+day's NutritionLog totals with a single UPDATE.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import DecimalField, F
+
+from core.activity import mark
+from core.energy import refresh_days
+from core.series import touch
+from .ingredients import UNITS, serving_amounts
+from .models import FoodItem, MealLog, NutritionLog
+from .suggestions import record
+
+NUTRIENTS = ['calories', 'protein', 'carbs', 'fats']
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# Unit dimension -> which cached rate scales it
+RATES = {'mass': 'per_gram', 'volume': 'per_gram', 'count': 'per_item', 'serving': 'per_serving'}
+
+
+def cache_key(food_id):
+    return f'nutrition:food:{food_id}'
+
+
+def invalidate_food(food_id):
+    cache.delete(cache_key(food_id))
+
+
+def rates(food):
+    """Cacheable per-gram, per-item and per-serving values of a food row"""
+    per_serving = tuple(float(food[n]) for n in NUTRIENTS)
+    serving = serving_amounts(food['serving_size'])
+    grams = serving.get('mass') or serving.get('volume')
+    items = serving.get('count')
+    return {
+        'name': food['name'],
+        'per_serving': per_serving,
+        'per_gram': tuple(v / float(grams) for v in per_serving) if grams else None,
+        'per_item': tuple(v / float(items) for v in per_serving) if items else None,
+    }
+
+
+def food_rates(food_ids):
+    """{food_id: rates} from the cache, loading any misses in one query"""
+    keys = {cache_key(food_id): food_id for food_id in food_ids}
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+
+    missing = [food_id for food_id in keys.values() if food_id not in found]
+    if missing:
+        loaded = {
+            food['id']: rates(food)
+            for food in FoodItem.objects.filter(pk__in=missing).values('id', 'name', 'serving_size', *NUTRIENTS)
+        }
+        cache.set_many({cache_key(food_id): value for food_id, value in loaded.items()}, CACHE_TIMEOUT)
+        found.update(loaded)
+    return found
+
+
+def scale(food, quantity, unit):
+    """(calories, protein, carbs, fats) for ``quantity unit`` of a food, or None if it can't be converted"""
+    dimension, base = UNITS.get(unit, ('count', 1))
+    rate = food[RATES[dimension]]
+    if rate is None:
+        return None
+    amount = float(quantity) * float(base)
+    return tuple(amount * value for value in rate)
+
+
+def fits(field_name, value):
+    """Whether ``value`` can be stored in the MealLog field without overflowing it"""
+    field = MealLog._meta.get_field(field_name)
+    if isinstance(field, DecimalField):
+        limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+        return abs(value) < limit and abs(round(Decimal(value), field.decimal_places)) < limit
+    low, high = connections[router.db_for_write(MealLog)].ops.integer_field_range(field.get_internal_type())
+    return (low is None or round(value) >= low) and (high is None or round(value) <= high)
+
+
+def log_food_items(log, meal_type, items, time=None, notes=''):
+    """
+    Log ``items``, [(food_id, quantity, unit)], as one meal on ``log``.
+    Raises ValueError (nothing is written) if an item is unknown or its
+    amount can't be converted or stored. Returns the created MealLog rows.
+    """
+    foods = food_rates({food_id for food_id, _, _ in items})
+
+    meals = []
+    for food_id, quantity, unit in items:
+        food = foods.get(food_id)
+        unit = (unit or '').strip().lower()
+        if food is None:
+            raise ValueError('Unknown food item.')
+        if unit and unit not in UNITS:
+            raise ValueError(f'Unknown unit "{unit}".')
+        try:
+            quantity = Decimal(str(quantity))
+        except InvalidOperation:
+            raise ValueError(f'Invalid quantity for {food["name"]}.')
+        if not quantity.is_finite():
+            raise ValueError(f'Invalid quantity for {food["name"]}.')
+        nutrients = scale(food, quantity, unit) if quantity > 0 else None
+        if nutrients is None:
+            raise ValueError(f'Can\'t convert {quantity} {unit or "x"} of {food["name"]}.')
+        if not fits('quantity', quantity) or not all(fits(nutrient, value) for nutrient, value in zip(NUTRIENTS, nutrients)):
+            raise ValueError(f'Quantity too large for {food["name"]}.')
+
+        meals.append(MealLog(
+            nutrition_log=log,
+            food_item_id=food_id,
+            quantity=quantity,
+            unit=unit,
+            meal_type=meal_type,
+            meal_name=f'{food["name"]} ({quantity.normalize():f} {unit})' if unit else f'{food["name"]} (x{quantity.normalize():f})',
+            calories=round(nutrients[0]),
+            protein=round(Decimal(nutrients[1]), 1),
+            carbs=round(Decimal(nutrients[2]), 1),
+            fats=round(Decimal(nutrients[3]), 1),
+            servings=1,
+            time=time,
+            notes=notes,
+        ))
+
+    with transaction.atomic(using=router.db_for_write(MealLog)):
+        MealLog.objects.bulk_create(meals)
+        NutritionLog.objects.filter(pk=log.pk).update(**{
+            f'total_{nutrient}': F(f'total_{nutrient}') + sum(getattr(meal, nutrient) for meal in meals)
+            for nutrient in NUTRIENTS
+        })
+
+    touch(log.user_id, 'nutrition')
+    refresh_days(log.user_id, [log.date])
+    if meals:
+        mark(log.user_id, 'nutrition', log.date)
+    record(log.user_id, meals)
+    return meals
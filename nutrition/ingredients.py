@@ -0,0 +1,317 @@
+"""
+Structured recipe ingredients and nutrition derived from them.
+
+Each line of ``Recipe.ingredients`` is parsed into a quantity, unit and
+name (``parse_line``), matched against the food database by name
+(``FoodIndex``, cached until a food item changes), and converted into a number of the food's servings by
+comparing the quantity with the food's ``serving_size`` (``portion``).
+Mass and volume convert into each other at the density of water, which is
+close enough for most kitchen ingredients; counts ("2 eggs") only convert
+when the serving is a count too.
+
+Recipes with ``nutrition_from_ingredients`` get their per-serving macros
+from their linked ingredients. When food items change, the affected recipes
+are found through ``FoodItem.recipe_ingredients`` and recomputed together:
+one aggregate query for all of them, one bulk update, and one fan-out to
+the meal plans using them.
+"""
+import re
+from decimal import Decimal
+from fractions import Fraction
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db import router
+from django.db.models import F, Sum
+
+from .models import FoodItem, Recipe, RecipeIngredient
+from .plan_totals import recipes_changed
+
+# Unit alias -> (dimension, amount in grams / millilitres / items)
+UNITS = {}
+for dimension, base, aliases in [
+    ('mass', 1, ['g', 'gram', 'grams', 'gr']),
+    ('mass', 1000, ['kg', 'kilogram', 'kilograms']),
+    ('mass', Fraction(1, 1000), ['mg', 'milligram', 'milligrams']),
+    ('mass', Fraction('28.35'), ['oz', 'ounce', 'ounces']),
+    ('mass', Fraction('453.6'), ['lb', 'lbs', 'pound', 'pounds']),
+    ('volume', 1, ['ml', 'millilitre', 'millilitres', 'milliliter', 'milliliters']),
+    ('volume', 1000, ['l', 'litre', 'litres', 'liter', 'liters']),
+    ('volume', 240, ['cup', 'cups', 'c']),
+    ('volume', 15, ['tbsp', 'tablespoon', 'tablespoons', 'tbs']),
+    ('volume', 5, ['tsp', 'teaspoon', 'teaspoons']),
+    ('volume', Fraction('29.57'), ['fl oz', 'fluid ounce', 'fluid ounces']),
+    ('count', 1, ['piece', 'pieces', 'whole', 'slice', 'slices', 'clove', 'cloves', 'item', 'items']),
+    ('serving', 1, ['serving', 'servings', 'portion', 'portions']),
+]:
+    for alias in aliases:
+        UNITS[alias] = (dimension, base)
+
+# Units spelled with a space, tried before single words
+MULTI_WORD_UNITS = sorted((u for u in UNITS if ' ' in u), key=len, reverse=True)
+
+VULGAR_FRACTIONS = {
+    '½': Fraction(1, 2), '⅓': Fraction(1, 3), '⅔': Fraction(2, 3), '¼': Fraction(1, 4),
+    '¾': Fraction(3, 4), '⅛': Fraction(1, 8),
+}
+_vulgar = ''.join(VULGAR_FRACTIONS)
+
+QUANTITY_PATTERNS = [
+    # 1 1/2, 1½
+    (re.compile(r'(\d+)\s+(\d+)/(\d+)'), lambda m: int(m[1]) + Fraction(int(m[2]), int(m[3]))),
+    (re.compile(rf'(\d+)\s*([{_vulgar}])'), lambda m: int(m[1]) + VULGAR_FRACTIONS[m[2]]),
+    # 1/2, ½
+    (re.compile(r'(\d+)/(\d+)'), lambda m: Fraction(int(m[1]), int(m[2]))),
+    (re.compile(rf'([{_vulgar}])'), lambda m: VULGAR_FRACTIONS[m[1]]),
+    # 2-3 (midpoint), 1.5, 2
+    (re.compile(r'(\d+(?:\.\d+)?)\s*(?:-|–|to)\s*(\d+(?:\.\d+)?)\b'), lambda m: (Fraction(m[1]) + Fraction(m[2])) / 2),
+    (re.compile(r'(\d+(?:\.\d+)?)'), lambda m: Fraction(m[1])),
+]
+
+SERVING_WEIGHT = re.compile(r'\((\d+(?:\.\d+)?)\s*(g|ml)\)', re.IGNORECASE)
+
+NUTRIENTS = ['calories', 'protein', 'carbs', 'fats', 'fiber']
+PLAN_MACROS = ['calories', 'protein', 'carbs', 'fats']
+
+MAX_NAME_WORDS = 5
+
+INDEX_CACHE_KEY = 'nutrition:food_index'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class ParsedIngredient:
+
+    def __init__(self, text, name, quantity=None, unit=''):
+        self.text = text
+        self.name = name
+        self.quantity = quantity
+        self.unit = unit
+
+    def __repr__(self):
+        return f'<ParsedIngredient {self.quantity} {self.unit!r} {self.name!r}>'
+
+
+def parse_quantity(text):
+    """(Fraction or None, rest of the text)"""
+    for pattern, value in QUANTITY_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            try:
+                return value(match), text[match.end():].lstrip()
+            except ZeroDivisionError:
+                # "1/0 cup" has no amount; keep the line as an unparsed quantity
+                break
+    return None, text
+
+
+def parse_unit(text):
+    """(unit alias or '', rest of the text)"""
+    lowered = text.lower()
+    for unit in MULTI_WORD_UNITS:
+        if lowered.startswith(unit + ' ') or lowered.startswith(unit + '.'):
+            return unit, text[len(unit):].lstrip('. ')
+    match = re.match(r'([a-zA-Z]+)\.?(?=\s|$)', text)
+    if match and match[1].lower() in UNITS:
+        return match[1].lower(), text[match.end():].lstrip()
+    return '', text
+
+
+def parse_line(line):
+    """Parse one free-text ingredient line, or None for a blank line"""
+    text = line.strip().lstrip('-*•').strip()
+    if not text:
+        return None
+    quantity, rest = parse_quantity(text)
+    unit, rest = parse_unit(rest) if quantity is not None else ('', rest)
+    name = re.sub(r'\([^)]*\)', '', rest).split(',')[0]
+    name = re.sub(r'^of\s+', '', name.strip(), flags=re.IGNORECASE).strip()
+    return ParsedIngredient(text[:255], (name or text)[:200], quantity, unit)
+
+
+def normalize(name):
+    return ' '.join(re.findall(r'[a-z0-9]+', name.lower()))
+
+
+def singular(word):
+    if word.endswith('oes') or word.endswith('ches') or word.endswith('shes'):
+        return word[:-2]
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+class FoodIndex:
+    """Name lookup over the food database, built from (id, name, serving_size) rows"""
+
+    def __init__(self, rows):
+        self.names = {}
+        self.serving_sizes = {}
+        for food_id, name, serving_size in rows:
+            key = normalize(name)
+            self.names.setdefault(key, food_id)
+            self.names.setdefault(' '.join(singular(w) for w in key.split()), food_id)
+            self.serving_sizes[food_id] = serving_size
+
+    @classmethod
+    def load(cls):
+        """The index over the whole catalog, from the cache where possible"""
+        index = cache.get(INDEX_CACHE_KEY)
+        if index is None:
+            index = cls(FoodItem.objects.order_by('id').values_list('id', 'name', 'serving_size'))
+            cache.set(INDEX_CACHE_KEY, index, CACHE_TIMEOUT)
+        return index
+
+    @staticmethod
+    def invalidate():
+        """Forget the cached index after a food item is added, edited or deleted"""
+        cache.delete(INDEX_CACHE_KEY)
+
+    def match(self, name):
+        """Food id whose name is the longest run of words in ``name``, or None"""
+        words = normalize(name).split()
+        for size in range(min(len(words), MAX_NAME_WORDS), 0, -1):
+            for start in range(len(words) - size + 1):
+                phrase = words[start:start + size]
+                for candidate in (' '.join(phrase), ' '.join(singular(w) for w in phrase)):
+                    if candidate in self.names:
+                        return self.names[candidate]
+        return None
+
+
+@lru_cache(maxsize=4096)
+def serving_amounts(serving_size):
+    """{dimension: amount} of one food serving, e.g. '1 medium (118g)' -> {'count': 1, 'mass': 118}"""
+    amounts = {}
+    parsed = parse_line(serving_size or '')
+    if parsed and parsed.quantity:
+        dimension, base = UNITS.get(parsed.unit, ('count', 1))
+        if dimension != 'serving':
+            amounts[dimension] = parsed.quantity * base
+    weight = SERVING_WEIGHT.search(serving_size or '')
+    if weight:
+        amounts['mass' if weight[2].lower() == 'g' else 'volume'] = Fraction(weight[1])
+    return amounts
+
+
+def portion(quantity, unit, serving_size):
+    """How many servings of a food ``quantity unit`` is, or None if it can't be converted"""
+    quantity = Fraction(str(quantity)) if quantity is not None else Fraction(1)
+    dimension, base = UNITS.get(unit, ('count', 1))
+    if dimension == 'serving':
+        return quantity
+    serving = serving_amounts(serving_size)
+    amount = quantity * base
+    if dimension == 'count':
+        return amount / serving['count'] if serving.get('count') else None
+    other = 'volume' if dimension == 'mass' else 'mass'
+    for key in (dimension, other):
+        if serving.get(key):
+            return amount / serving[key]
+    return None
+
+
+def to_decimal(value, places):
+    return round(Decimal(value.numerator) / value.denominator, places) if value is not None else None
+
+
+def build_ingredients(recipe_id, text, index):
+    """Unsaved RecipeIngredient rows for a recipe's free-text ingredients"""
+    rows = []
+    for line in (text or '').splitlines():
+        parsed = parse_line(line)
+        if parsed is None:
+            continue
+        food_id = index.match(parsed.name)
+        servings = portion(parsed.quantity, parsed.unit, index.serving_sizes[food_id]) if food_id else None
+        rows.append(RecipeIngredient(
+            recipe_id=recipe_id,
+            food_item_id=food_id,
+            position=len(rows),
+            text=parsed.text,
+            name=parsed.name,
+            quantity=to_decimal(parsed.quantity, 2),
+            unit=parsed.unit,
+            food_servings=to_decimal(servings, 3),
+        ))
+    return rows
+
+
+def sync_recipes(recipes, index=None):
+    """
+    Re-parse the ingredients of ``recipes`` (replacing their structured rows)
+    and recompute the ones deriving nutrition. Returns the rows created.
+    """
+    recipes = list(recipes)
+    if not recipes:
+        return []
+    index = index or FoodIndex.load()
+    rows = [row for recipe in recipes for row in build_ingredients(recipe.pk, recipe.ingredients, index)]
+    # Signals are skipped on purpose: the recipes are recomputed once below
+    RecipeIngredient.objects.filter(recipe__in=[r.pk for r in recipes])._raw_delete(router.db_for_write(RecipeIngredient))
+    RecipeIngredient.objects.bulk_create(rows, batch_size=500)
+    recompute_recipes([r.pk for r in recipes])
+    return rows
+
+
+def recompute_recipes(recipe_ids):
+    """
+    Derive per-serving nutrition for the given recipes that use their
+    ingredients, in one aggregate query and one bulk update. Returns the
+    number of recipes whose nutrition changed.
+    """
+    recipes = list(Recipe.objects.filter(pk__in=recipe_ids, nutrition_from_ingredients=True).only('servings', *NUTRIENTS))
+    if not recipes:
+        return 0
+
+    sums = RecipeIngredient.objects.filter(
+        recipe__in=recipes, food_item__isnull=False, food_servings__isnull=False,
+    ).values('recipe_id').annotate(**{
+        nutrient: Sum(F('food_servings') * F(f'food_item__{nutrient}'))
+        for nutrient in NUTRIENTS
+    }).order_by()
+    sums = {row['recipe_id']: row for row in sums}
+
+    changed, fanout = [], {}
+    for recipe in recipes:
+        row = sums.get(recipe.pk, {})
+        servings = max(recipe.servings or 1, 1)
+        before = tuple(getattr(recipe, m) for m in PLAN_MACROS)
+        values = {
+            'calories': round(Decimal(row.get('calories') or 0) / servings),
+            'protein': round(Decimal(row.get('protein') or 0) / servings, 1),
+            'carbs': round(Decimal(row.get('carbs') or 0) / servings, 1),
+            'fats': round(Decimal(row.get('fats') or 0) / servings, 1),
+            'fiber': round(Decimal(row.get('fiber') or 0) / servings, 1),
+        }
+        if any(getattr(recipe, n) != v for n, v in values.items()):
+            for nutrient, value in values.items():
+                setattr(recipe, nutrient, value)
+            changed.append(recipe)
+            fanout[recipe.pk] = (before, tuple(values[m] for m in PLAN_MACROS))
+
+    Recipe.objects.bulk_update(changed, NUTRIENTS, batch_size=500)
+    recipes_changed(fanout)
+    return len(changed)
+
+
+def foods_changed(food_ids, resize=()):
+    """
+    Recompute every recipe using the given foods. Foods in ``resize`` had
+    their serving size changed, so their ingredients' portions are converted
+    again first.
+    """
+    if resize:
+        serving_sizes = dict(FoodItem.objects.filter(pk__in=resize).values_list('id', 'serving_size'))
+        ingredients = list(RecipeIngredient.objects.filter(food_item__in=resize).only('food_item', 'quantity', 'unit'))
+        for ingredient in ingredients:
+            ingredient.food_servings = to_decimal(
+                portion(ingredient.quantity, ingredient.unit, serving_sizes[ingredient.food_item_id]), 3
+            )
+        RecipeIngredient.objects.bulk_update(ingredients, ['food_servings'], batch_size=500)
+
+    recipe_ids = RecipeIngredient.objects.filter(
+        food_item__in=food_ids, recipe__nutrition_from_ingredients=True,
+    ).values_list('recipe_id', flat=True).distinct()
+    return recompute_recipes(list(recipe_ids))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from nutrition.ingredients import FoodIndex, recompute_recipes, sync_recipes
+from nutrition.models import Recipe, RecipeIngredient
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Re-parse recipe ingredients and link them to the food database (e.g. after importing foods)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--recipe', type=int, action='append', dest='recipes', help='Only these recipe ids')
+        parser.add_argument(
+            '--derive', action='store_true',
+            help='Switch recipes whose every ingredient converts to nutrition derived from ingredients',
+        )
+    
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('id').only('id', 'ingredients')
+        if options['recipes']:
+            recipes = recipes.filter(pk__in=options['recipes'])
+        started = time.perf_counter()
+        
+        index = FoodIndex.load()
+        linked, total = 0, 0
+        recipes = list(recipes)
+        for i in range(0, len(recipes), BATCH_SIZE):
+            rows = sync_recipes(recipes[i:i + BATCH_SIZE], index)
+            linked += sum(row.food_servings is not None for row in rows)
+            total += len(rows)
+        
+        if options['derive']:
+            unresolved = RecipeIngredient.objects.filter(food_servings__isnull=True).values('recipe_id')
+            ids = list(
+                Recipe.objects.filter(pk__in=[r.pk for r in recipes], ingredient_items__isnull=False)
+                .exclude(pk__in=unresolved).values_list('id', flat=True).distinct()
+            )
+            Recipe.objects.filter(pk__in=ids).update(nutrition_from_ingredients=True)
+            recompute_recipes(ids)
+            self.stdout.write(f'{len(ids)} recipes now derive nutrition from their ingredients')
+        
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Linked {linked} of {total} ingredient lines across {len(recipes)} recipes in {elapsed:.1f}s'
+        ))
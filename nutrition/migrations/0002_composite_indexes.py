@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(fields=['category', 'name'], name='fooditem_category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meallog',
+            index=models.Index(fields=['nutrition_log', 'meal_type'], name='meallog_log_meal_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['meal_type', 'is_public'], name='recipe_meal_type_public_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-created_at'], name='recipe_public_recent_idx'),
+        ),
+    ]
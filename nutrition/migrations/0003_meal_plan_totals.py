@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:35
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Sum
+
+MACROS = ['calories', 'protein', 'carbs', 'fats']
+
+
+def backfill_totals(apps, schema_editor):
+    """One aggregate over every planned recipe, then bulk updates"""
+    MealPlan = apps.get_model('nutrition', 'MealPlan')
+    MealPlanDay = apps.get_model('nutrition', 'MealPlanDay')
+    MealPlanRecipe = apps.get_model('nutrition', 'MealPlanRecipe')
+    db = schema_editor.connection.alias
+
+    sums = MealPlanRecipe.objects.using(db).values('meal_plan_day_id').annotate(**{
+        macro: Sum(F('servings') * F(f'recipe__{macro}'), output_field=DecimalField())
+        for macro in MACROS
+    }).order_by()
+
+    days = MealPlanDay.objects.using(db).in_bulk([row['meal_plan_day_id'] for row in sums])
+    plans = {}
+    for row in sums:
+        day = days[row['meal_plan_day_id']]
+        plan = plans.setdefault(day.meal_plan_id, MealPlan(pk=day.meal_plan_id, **{f'total_{m}': Decimal(0) for m in MACROS}))
+        for macro in MACROS:
+            value = Decimal(row[macro] or 0).quantize(Decimal('0.01'))
+            setattr(day, f'total_{macro}', value)
+            setattr(plan, f'total_{macro}', getattr(plan, f'total_{macro}') + value)
+
+    fields = [f'total_{m}' for m in MACROS]
+    MealPlanDay.objects.using(db).bulk_update(days.values(), fields, batch_size=500)
+    MealPlan.objects.using(db).bulk_update(plans.values(), fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0002_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealplan',
+            name='total_calories',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='mealplan',
+            name='total_carbs',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='mealplan',
+            name='total_fats',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='mealplan',
+            name='total_protein',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='mealplanday',
+            name='total_calories',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='mealplanday',
+            name='total_carbs',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='mealplanday',
+            name='total_fats',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='mealplanday',
+            name='total_protein',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,212 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:41
+
+import re
+from decimal import Decimal
+from fractions import Fraction
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copy of the nutrition.ingredients parser as of this migration
+
+UNITS = {}
+for dimension, base, aliases in [
+    ('mass', 1, ['g', 'gram', 'grams', 'gr']),
+    ('mass', 1000, ['kg', 'kilogram', 'kilograms']),
+    ('mass', Fraction(1, 1000), ['mg', 'milligram', 'milligrams']),
+    ('mass', Fraction('28.35'), ['oz', 'ounce', 'ounces']),
+    ('mass', Fraction('453.6'), ['lb', 'lbs', 'pound', 'pounds']),
+    ('volume', 1, ['ml', 'millilitre', 'millilitres', 'milliliter', 'milliliters']),
+    ('volume', 1000, ['l', 'litre', 'litres', 'liter', 'liters']),
+    ('volume', 240, ['cup', 'cups', 'c']),
+    ('volume', 15, ['tbsp', 'tablespoon', 'tablespoons', 'tbs']),
+    ('volume', 5, ['tsp', 'teaspoon', 'teaspoons']),
+    ('volume', Fraction('29.57'), ['fl oz', 'fluid ounce', 'fluid ounces']),
+    ('count', 1, ['piece', 'pieces', 'whole', 'slice', 'slices', 'clove', 'cloves', 'item', 'items']),
+    ('serving', 1, ['serving', 'servings', 'portion', 'portions']),
+]:
+    for alias in aliases:
+        UNITS[alias] = (dimension, base)
+
+MULTI_WORD_UNITS = sorted((u for u in UNITS if ' ' in u), key=len, reverse=True)
+
+VULGAR_FRACTIONS = {
+    '½': Fraction(1, 2), '⅓': Fraction(1, 3), '⅔': Fraction(2, 3), '¼': Fraction(1, 4),
+    '¾': Fraction(3, 4), '⅛': Fraction(1, 8),
+}
+_vulgar = ''.join(VULGAR_FRACTIONS)
+
+QUANTITY_PATTERNS = [
+    (re.compile(r'(\d+)\s+(\d+)/(\d+)'), lambda m: int(m[1]) + Fraction(int(m[2]), int(m[3]))),
+    (re.compile(rf'(\d+)\s*([{_vulgar}])'), lambda m: int(m[1]) + VULGAR_FRACTIONS[m[2]]),
+    (re.compile(r'(\d+)/(\d+)'), lambda m: Fraction(int(m[1]), int(m[2]))),
+    (re.compile(rf'([{_vulgar}])'), lambda m: VULGAR_FRACTIONS[m[1]]),
+    (re.compile(r'(\d+(?:\.\d+)?)\s*(?:-|–|to)\s*(\d+(?:\.\d+)?)\b'), lambda m: (Fraction(m[1]) + Fraction(m[2])) / 2),
+    (re.compile(r'(\d+(?:\.\d+)?)'), lambda m: Fraction(m[1])),
+]
+
+SERVING_WEIGHT = re.compile(r'\((\d+(?:\.\d+)?)\s*(g|ml)\)', re.IGNORECASE)
+
+MAX_NAME_WORDS = 5
+
+
+def parse_quantity(text):
+    for pattern, value in QUANTITY_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            try:
+                return value(match), text[match.end():].lstrip()
+            except ZeroDivisionError:
+                break
+    return None, text
+
+
+def parse_unit(text):
+    lowered = text.lower()
+    for unit in MULTI_WORD_UNITS:
+        if lowered.startswith(unit + ' ') or lowered.startswith(unit + '.'):
+            return unit, text[len(unit):].lstrip('. ')
+    match = re.match(r'([a-zA-Z]+)\.?(?=\s|$)', text)
+    if match and match[1].lower() in UNITS:
+        return match[1].lower(), text[match.end():].lstrip()
+    return '', text
+
+
+def parse_line(line):
+    """(text, name, quantity, unit) of one ingredient line, or None for a blank line"""
+    text = line.strip().lstrip('-*•').strip()
+    if not text:
+        return None
+    quantity, rest = parse_quantity(text)
+    unit, rest = parse_unit(rest) if quantity is not None else ('', rest)
+    name = re.sub(r'\([^)]*\)', '', rest).split(',')[0]
+    name = re.sub(r'^of\s+', '', name.strip(), flags=re.IGNORECASE).strip()
+    return text[:255], (name or text)[:200], quantity, unit
+
+
+def normalize(name):
+    return ' '.join(re.findall(r'[a-z0-9]+', name.lower()))
+
+
+def singular(word):
+    if word.endswith('oes') or word.endswith('ches') or word.endswith('shes'):
+        return word[:-2]
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def match_food(names, name):
+    """Food id whose name is the longest run of words in ``name``, or None"""
+    words = normalize(name).split()
+    for size in range(min(len(words), MAX_NAME_WORDS), 0, -1):
+        for start in range(len(words) - size + 1):
+            phrase = words[start:start + size]
+            for candidate in (' '.join(phrase), ' '.join(singular(w) for w in phrase)):
+                if candidate in names:
+                    return names[candidate]
+    return None
+
+
+def serving_amounts(serving_size):
+    amounts = {}
+    parsed = parse_line(serving_size or '')
+    if parsed and parsed[2]:
+        dimension, base = UNITS.get(parsed[3], ('count', 1))
+        if dimension != 'serving':
+            amounts[dimension] = parsed[2] * base
+    weight = SERVING_WEIGHT.search(serving_size or '')
+    if weight:
+        amounts['mass' if weight[2].lower() == 'g' else 'volume'] = Fraction(weight[1])
+    return amounts
+
+
+def portion(quantity, unit, serving_size):
+    quantity = Fraction(str(quantity)) if quantity is not None else Fraction(1)
+    dimension, base = UNITS.get(unit, ('count', 1))
+    if dimension == 'serving':
+        return quantity
+    serving = serving_amounts(serving_size)
+    amount = quantity * base
+    if dimension == 'count':
+        return amount / serving['count'] if serving.get('count') else None
+    other = 'volume' if dimension == 'mass' else 'mass'
+    for key in (dimension, other):
+        if serving.get(key):
+            return amount / serving[key]
+    return None
+
+
+def to_decimal(value, places):
+    return round(Decimal(value.numerator) / value.denominator, places) if value is not None else None
+
+
+def parse_ingredients(apps, schema_editor):
+    """Parse every recipe's free-text ingredients and link them to food items"""
+    FoodItem = apps.get_model('nutrition', 'FoodItem')
+    Recipe = apps.get_model('nutrition', 'Recipe')
+    RecipeIngredient = apps.get_model('nutrition', 'RecipeIngredient')
+    db = schema_editor.connection.alias
+
+    names, serving_sizes = {}, {}
+    for food_id, name, serving_size in FoodItem.objects.using(db).order_by('id').values_list('id', 'name', 'serving_size'):
+        key = normalize(name)
+        names.setdefault(key, food_id)
+        names.setdefault(' '.join(singular(w) for w in key.split()), food_id)
+        serving_sizes[food_id] = serving_size
+
+    rows = []
+    for recipe_id, text in Recipe.objects.using(db).values_list('id', 'ingredients').iterator():
+        position = 0
+        for line in (text or '').splitlines():
+            parsed = parse_line(line)
+            if parsed is None:
+                continue
+            line_text, name, quantity, unit = parsed
+            food_id = match_food(names, name)
+            servings = portion(quantity, unit, serving_sizes[food_id]) if food_id else None
+            rows.append(RecipeIngredient(
+                recipe_id=recipe_id, food_item_id=food_id, position=position,
+                text=line_text, name=name, quantity=to_decimal(quantity, 2),
+                unit=unit, food_servings=to_decimal(servings, 3),
+            ))
+            position += 1
+    RecipeIngredient.objects.using(db).bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0003_meal_plan_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='nutrition_from_ingredients',
+            field=models.BooleanField(default=False, help_text='Calculate nutrition from the ingredients linked to food items'),
+        ),
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('text', models.CharField(help_text='The line as written', max_length=255)),
+                ('name', models.CharField(max_length=200)),
+                ('quantity', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('food_servings', models.DecimalField(blank=True, decimal_places=3, max_digits=8, null=True)),
+                ('food_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recipe_ingredients', to='nutrition.fooditem')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_items', to='nutrition.recipe')),
+            ],
+            options={
+                'verbose_name': 'Recipe Ingredient',
+                'verbose_name_plural': 'Recipe Ingredients',
+                'ordering': ['recipe', 'position'],
+            },
+        ),
+        migrations.RunPython(parse_ingredients, migrations.RunPython.noop),
+    ]
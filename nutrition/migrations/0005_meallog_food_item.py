@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0004_recipe_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meallog',
+            name='food_item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='meal_logs', to='nutrition.fooditem'),
+        ),
+        migrations.AddField(
+            model_name='meallog',
+            name='quantity',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='meallog',
+            name='unit',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:46
+
+import math
+import re
+from collections import defaultdict
+from itertools import groupby
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copies of nutrition.suggestions as of this migration
+HALF_LIFE_DAYS = 14
+CAPACITY = 16
+
+AMOUNT = re.compile(r'\s*\([^)]*\)$')
+
+COPIED_FIELDS = ['servings', 'quantity', 'unit', 'calories', 'protein', 'carbs', 'fats']
+
+
+def boost(at, count=1):
+    """log2 of the forward-decayed weight of ``count`` logs at ``at``"""
+    return at.timestamp() / 86400 / HALF_LIFE_DAYS + math.log2(count)
+
+
+def combine(weight, added):
+    """log2(2^weight + 2^added) without leaving float range"""
+    high, low = max(weight, added), min(weight, added)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def entry_key(meal):
+    """(kind, key, label) a meal is filed under"""
+    if meal.recipe_id:
+        return 'recipe', str(meal.recipe_id), meal.meal_name
+    if meal.food_item_id:
+        return 'food', str(meal.food_item_id), AMOUNT.sub('', meal.meal_name)
+    return 'manual', ' '.join(re.findall(r'[a-z0-9]+', meal.meal_name.lower()))[:200], meal.meal_name
+
+
+def build_suggestions(apps, schema_editor):
+    """Replay the meal history already logged into each user's suggestions"""
+    MealLog = apps.get_model('nutrition', 'MealLog')
+    MealSuggestion = apps.get_model('nutrition', 'MealSuggestion')
+    db = schema_editor.connection.alias
+
+    meals = MealLog.objects.using(db).annotate(user_id=models.F('nutrition_log__user_id')).order_by('user_id', 'created_at', 'pk')
+    for user_id, history in groupby(meals.iterator(), key=lambda meal: meal.user_id):
+        entries = {}
+        for meal in history:
+            kind, key, label = entry_key(meal)
+            if not key:
+                continue
+            ident = (meal.meal_type, kind, key)
+            entry = entries.get(ident)
+            if entry is None:
+                entry = entries[ident] = MealSuggestion(
+                    user_id=user_id, meal_type=meal.meal_type, kind=kind, key=key, weight=-math.inf,
+                )
+            entry.label = label[:200]
+            for field in COPIED_FIELDS:
+                setattr(entry, field, getattr(meal, field))
+            entry.weight = combine(entry.weight, boost(meal.created_at))
+            entry.times_logged += 1
+            entry.last_logged = meal.created_at
+
+        ranked = defaultdict(list)
+        for entry in entries.values():
+            ranked[entry.meal_type].append(entry)
+        kept = [entry for rows in ranked.values() for entry in sorted(rows, key=lambda e: e.weight, reverse=True)[:CAPACITY]]
+        MealSuggestion.objects.using(db).bulk_create(kept)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0005_meallog_food_item'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meal_type', models.CharField(choices=[('breakfast', 'Breakfast'), ('morning_snack', 'Morning Snack'), ('lunch', 'Lunch'), ('afternoon_snack', 'Afternoon Snack'), ('dinner', 'Dinner'), ('evening_snack', 'Evening Snack')], max_length=20)),
+                ('kind', models.CharField(choices=[('recipe', 'Recipe'), ('food', 'Food Item'), ('manual', 'Manual Entry')], max_length=10)),
+                ('key', models.CharField(help_text='Recipe or food item id, or the normalised meal name', max_length=200)),
+                ('label', models.CharField(max_length=200)),
+                ('servings', models.DecimalField(decimal_places=1, default=1.0, max_digits=4)),
+                ('quantity', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('calories', models.IntegerField(default=0)),
+                ('protein', models.DecimalField(decimal_places=1, default=0, max_digits=6)),
+                ('carbs', models.DecimalField(decimal_places=1, default=0, max_digits=6)),
+                ('fats', models.DecimalField(decimal_places=1, default=0, max_digits=6)),
+                ('weight', models.FloatField(default=0, help_text='log2 of the time-decayed log count (forward decay)')),
+                ('times_logged', models.IntegerField(default=0)),
+                ('last_logged', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meal_suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Meal Suggestion',
+                'verbose_name_plural': 'Meal Suggestions',
+                'ordering': ['user', 'meal_type', '-weight'],
+                'unique_together': {('user', 'meal_type', 'kind', 'key')},
+            },
+        ),
+        migrations.RunPython(build_suggestions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0006_meal_suggestions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='nutritionlog',
+            name='water_intake',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Water intake in liters', max_digits=5),
+        ),
+    ]
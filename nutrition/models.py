@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
 
 
 class Recipe(models.Model):
@@ -51,6 +54,11 @@ class Recipe(models.Model):
     is_gluten_free = models.BooleanField(default=False)
     is_dairy_free = models.BooleanField(default=False)
     
+    # Derived nutrition
+    nutrition_from_ingredients = models.BooleanField(
+        default=False, help_text="Calculate nutrition from the ingredients linked to food items"
+    )
+    
     # Visibility
     is_public = models.BooleanField(default=True, help_text="Can other users see this recipe?")
     
@@ -69,6 +77,10 @@ class Recipe(models.Model):
         ordering = ['-created_at']
         verbose_name = "Recipe"
         verbose_name_plural = "Recipes"
+        indexes = [
+            models.Index(fields=['meal_type', 'is_public'], name='recipe_meal_type_public_idx'),
+            models.Index(fields=['-created_at'], condition=Q(is_public=True), name='recipe_public_recent_idx'),
+        ]
 
 
 class MealPlan(models.Model):
@@ -105,12 +117,23 @@ class MealPlan(models.Model):
     # Visibility
     is_public = models.BooleanField(default=True)
     
+    # Planned totals across all days (maintained by nutrition.plan_totals)
+    total_calories = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_protein = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_carbs = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_fats = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
     
+    @property
+    def average_calories(self):
+        """Planned calories per day"""
+        return round(self.total_calories / max(self.duration_days, 1))
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Meal Plan"
@@ -124,6 +147,12 @@ class MealPlanDay(models.Model):
     day_number = models.IntegerField(help_text="Day number in the plan (1-7 for weekly)")
     notes = models.TextField(blank=True, help_text="Special notes for this day")
     
+    # Planned totals for the day (maintained by nutrition.plan_totals)
+    total_calories = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    total_protein = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    total_carbs = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    total_fats = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    
     def __str__(self):
         return f"{self.meal_plan.name} - Day {self.day_number}"
     
@@ -176,7 +205,7 @@ class NutritionLog(models.Model):
     total_fiber = models.DecimalField(max_digits=5, decimal_places=1, default=0)
     
     # Water intake
-    water_intake = models.DecimalField(max_digits=4, decimal_places=1, default=0, help_text="Water intake in liters")
+    water_intake = models.DecimalField(max_digits=5, decimal_places=2, default=0, help_text="Water intake in liters")
     
     # Notes
     notes = models.TextField(blank=True)
@@ -208,6 +237,11 @@ class MealLog(models.Model):
     
     nutrition_log = models.ForeignKey(NutritionLog, on_delete=models.CASCADE, related_name='meals')
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='meal_logs', null=True, blank=True)
+    food_item = models.ForeignKey('FoodItem', on_delete=models.SET_NULL, related_name='meal_logs', null=True, blank=True)
+    
+    # Amount of the food item, e.g. 150 g (an empty unit counts items)
+    quantity = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    unit = models.CharField(max_length=20, blank=True)
     
     meal_type = models.CharField(max_length=20, choices=MEAL_TYPE_CHOICES)
     meal_name = models.CharField(max_length=200, help_text="Name of the meal")
@@ -235,6 +269,48 @@ class MealLog(models.Model):
         ordering = ['nutrition_log', 'meal_type']
         verbose_name = "Meal Log"
         verbose_name_plural = "Meal Logs"
+        indexes = [
+            models.Index(fields=['nutrition_log', 'meal_type'], name='meallog_log_meal_type_idx'),
+        ]
+
+
+class MealSuggestion(models.Model):
+    """A recently or frequently logged meal, ranked for one-tap logging (see nutrition.suggestions)"""
+    
+    KIND_CHOICES = [
+        ('recipe', 'Recipe'),
+        ('food', 'Food Item'),
+        ('manual', 'Manual Entry'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meal_suggestions')
+    meal_type = models.CharField(max_length=20, choices=MealLog.MEAL_TYPE_CHOICES)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=200, help_text="Recipe or food item id, or the normalised meal name")
+    label = models.CharField(max_length=200)
+    
+    # Last logged amount and nutrition, to log it again as it was
+    servings = models.DecimalField(max_digits=4, decimal_places=1, default=1.0)
+    quantity = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    unit = models.CharField(max_length=20, blank=True)
+    calories = models.IntegerField(default=0)
+    protein = models.DecimalField(max_digits=6, decimal_places=1, default=0)
+    carbs = models.DecimalField(max_digits=6, decimal_places=1, default=0)
+    fats = models.DecimalField(max_digits=6, decimal_places=1, default=0)
+    
+    # Ranking
+    weight = models.FloatField(default=0, help_text="log2 of the time-decayed log count (forward decay)")
+    times_logged = models.IntegerField(default=0)
+    last_logged = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.meal_type}: {self.label}"
+    
+    class Meta:
+        ordering = ['user', 'meal_type', '-weight']
+        unique_together = ['user', 'meal_type', 'kind', 'key']
+        verbose_name = "Meal Suggestion"
+        verbose_name_plural = "Meal Suggestions"
 
 
 class FoodItem(models.Model):
@@ -275,4 +351,164 @@ class FoodItem(models.Model):
     class Meta:
         ordering = ['name']
         verbose_name = "Food Item"
-        verbose_name_plural = "Food Items"
\ No newline at end of file
+        verbose_name_plural = "Food Items"
+        indexes = [
+            models.Index(fields=['category', 'name'], name='fooditem_category_name_idx'),
+        ]
+
+
+class RecipeIngredient(models.Model):
+    """A parsed line of a recipe's ingredients, linked to a food item when matched"""
+    
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='ingredient_items')
+    food_item = models.ForeignKey(FoodItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='recipe_ingredients')
+    position = models.PositiveIntegerField(default=0)
+    
+    text = models.CharField(max_length=255, help_text="The line as written")
+    name = models.CharField(max_length=200)
+    quantity = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    unit = models.CharField(max_length=20, blank=True)
+    
+    # Quantity expressed in servings of the food item (null if it can't be converted)
+    food_servings = models.DecimalField(max_digits=8, decimal_places=3, null=True, blank=True)
+    
+    def __str__(self):
+        return self.text
+    
+    class Meta:
+        ordering = ['recipe', 'position']
+        verbose_name = "Recipe Ingredient"
+        verbose_name_plural = "Recipe Ingredients"
+
+
+@receiver(post_save, sender=NutritionLog)
+@receiver(post_delete, sender=NutritionLog)
+def nutrition_log_changed(sender, instance, signal, **kwargs):
+    """Refresh the user's cached series, the day's energy balance and activity bitmap"""
+    from core.activity import sync_day
+    from core.energy import refresh_days
+    from core.series import touch
+    touch(instance.user_id, 'nutrition')
+    refresh_days(instance.user_id, [instance.date])
+    if signal is post_delete:
+        sync_day(instance.user_id, 'nutrition', instance.date)
+
+
+@receiver(post_save, sender=MealLog)
+@receiver(post_delete, sender=MealLog)
+def meal_activity(sender, instance, signal, **kwargs):
+    """Mark the day active in the nutrition heatmap once it has a meal"""
+    from core.activity import mark, sync_day
+    log = NutritionLog.objects.filter(pk=instance.nutrition_log_id).values_list('user_id', 'date').first()
+    if log is None:
+        # Deleted with its NutritionLog, whose own signal clears the day
+        return
+    if signal is post_delete:
+        sync_day(log[0], 'nutrition', log[1])
+    elif kwargs.get('created'):
+        mark(log[0], 'nutrition', log[1])
+
+
+@receiver(post_save, sender=MealLog)
+def meal_logged(sender, instance, created, **kwargs):
+    """Count the meal towards the user's recent and frequent suggestions"""
+    from .suggestions import record
+    if created:
+        record(instance.nutrition_log.user_id, [instance])
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_macros(sender, instance, **kwargs):
+    """Keep the stored macros so plan totals can be adjusted by the difference"""
+    instance._previous_macros = instance._previous_ingredients = None
+    if instance.pk:
+        previous = Recipe.objects.filter(pk=instance.pk).values_list(
+            'calories', 'protein', 'carbs', 'fats', 'ingredients', 'nutrition_from_ingredients'
+        ).first()
+        if previous:
+            instance._previous_macros = previous[:4]
+            instance._previous_ingredients = previous[4:]
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_macros_changed(sender, instance, **kwargs):
+    """Fan macro edits out to the meal plans using the recipe"""
+    from .plan_totals import recipe_changed
+    previous = getattr(instance, '_previous_macros', None)
+    if previous:
+        recipe_changed(instance.pk, previous, (instance.calories, instance.protein, instance.carbs, instance.fats))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_ingredients_changed(sender, instance, created, **kwargs):
+    """Re-parse edited ingredients; derive nutrition when switched to ingredients"""
+    from .ingredients import recompute_recipes, sync_recipes
+    previous = getattr(instance, '_previous_ingredients', None)
+    if created or (previous and previous[0] != instance.ingredients):
+        sync_recipes([instance])
+    elif previous and instance.nutrition_from_ingredients and not previous[1]:
+        recompute_recipes([instance.pk])
+
+
+@receiver(pre_save, sender=MealPlanRecipe)
+@receiver(pre_delete, sender=MealPlanRecipe)
+def remember_plan_entry(sender, instance, **kwargs):
+    """Keep the entry's current contribution to its day and plan totals"""
+    from .plan_totals import entry
+    instance._previous_entry = entry(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=MealPlanRecipe)
+@receiver(post_delete, sender=MealPlanRecipe)
+def plan_entry_changed(sender, instance, signal, **kwargs):
+    """Move the entry's contribution on its day and plan totals"""
+    from .plan_totals import entry, entry_changed
+    current = None if signal is post_delete else entry(instance.pk)
+    entry_changed(getattr(instance, '_previous_entry', None), current)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def resolve_ingredient_portion(sender, instance, **kwargs):
+    """Convert the quantity into servings of the linked food item"""
+    from .ingredients import portion, to_decimal
+    serving_size = FoodItem.objects.filter(pk=instance.food_item_id).values_list('serving_size', flat=True).first()
+    instance.food_servings = to_decimal(portion(instance.quantity, instance.unit, serving_size), 3) if serving_size is not None else None
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    """Recompute the recipe's derived nutrition"""
+    from .ingredients import recompute_recipes
+    recompute_recipes([instance.recipe_id])
+
+
+@receiver(pre_save, sender=FoodItem)
+@receiver(pre_delete, sender=FoodItem)
+def remember_food_item(sender, instance, signal, **kwargs):
+    """Keep the stored nutrition, or the recipes using a food about to be deleted"""
+    instance._previous_food = None
+    if signal is pre_delete:
+        instance._previous_recipes = list(instance.recipe_ingredients.values_list('recipe_id', flat=True).distinct())
+    elif instance.pk:
+        instance._previous_food = FoodItem.objects.filter(pk=instance.pk).values_list(
+            'serving_size', 'calories', 'protein', 'carbs', 'fats', 'fiber'
+        ).first()
+
+
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def food_item_changed(sender, instance, signal, **kwargs):
+    """Drop the cached per-gram values and name index, and recompute the recipes using the food"""
+    from .foods import invalidate_food
+    from .ingredients import FoodIndex, foods_changed, recompute_recipes
+    invalidate_food(instance.pk)
+    FoodIndex.invalidate()
+    if signal is post_delete:
+        recompute_recipes(getattr(instance, '_previous_recipes', []))
+        return
+    previous = getattr(instance, '_previous_food', None)
+    current = (instance.serving_size, instance.calories, instance.protein, instance.carbs, instance.fats, instance.fiber)
+    if previous and [str(v) for v in previous] != [str(v) for v in current]:
+        resized = previous[0] != instance.serving_size
+        foods_changed([instance.pk], resize=[instance.pk] if resized else ())
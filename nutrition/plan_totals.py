@@ -0,0 +1,127 @@
+"""
+Stored nutrition totals for meal plans.
+
+MealPlanDay and MealPlan carry the calories and macros of their recipes
+(recipe macros x servings), so pages can show and sort by them without
+walking every recipe. Changes are applied as deltas:
+
+- saving or deleting a MealPlanRecipe adds the difference between its old
+  and new contribution to its day and plan
+- editing a Recipe's macros fans out through ``meal_plan_recipes`` (the
+  index of plan days using the recipe), one UPDATE for the affected days
+  and one for their plans
+
+Writers that bypass signals (bulk_create, raw deletes) call recompute()
+for the plans they touched.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+
+from .models import MealPlan, MealPlanDay, MealPlanRecipe
+
+MACROS = ['calories', 'protein', 'carbs', 'fats']
+TOTAL_FIELDS = [f'total_{macro}' for macro in MACROS]
+
+ZERO = (Decimal(0),) * len(MACROS)
+
+
+def entry(pk):
+    """(day_id, plan_id, contribution) of a saved MealPlanRecipe, or None"""
+    row = MealPlanRecipe.objects.filter(pk=pk).values_list(
+        'meal_plan_day_id', 'meal_plan_day__meal_plan_id', 'servings',
+        *[f'recipe__{macro}' for macro in MACROS],
+    ).first()
+    if row is None:
+        return None
+    day_id, plan_id, servings, *macros = row
+    return day_id, plan_id, tuple(Decimal(m) * servings for m in macros)
+
+
+def add(model, deltas):
+    """Add {pk: (calories, protein, carbs, fats)} to the model's totals in one UPDATE"""
+    deltas = {pk: delta for pk, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    model.objects.filter(pk__in=deltas).update(**{
+        field: F(field) + Case(
+            *[When(pk=pk, then=Value(delta[i])) for pk, delta in deltas.items()],
+            default=Value(Decimal(0)),
+            output_field=DecimalField(),
+        )
+        for i, field in enumerate(TOTAL_FIELDS)
+    })
+
+
+def apply(changes):
+    """Apply [(day_id, plan_id, delta)] to days and plans"""
+    days, plans = defaultdict(lambda: ZERO), defaultdict(lambda: ZERO)
+    for day_id, plan_id, delta in changes:
+        days[day_id] = tuple(a + b for a, b in zip(days[day_id], delta))
+        plans[plan_id] = tuple(a + b for a, b in zip(plans[plan_id], delta))
+    add(MealPlanDay, days)
+    add(MealPlan, plans)
+
+
+def entry_changed(previous, current):
+    """Move a MealPlanRecipe's contribution from its previous to its current state"""
+    changes = []
+    if previous:
+        changes.append((previous[0], previous[1], tuple(-v for v in previous[2])))
+    if current:
+        changes.append(current)
+    apply(changes)
+
+
+def recipes_changed(changes):
+    """
+    Fan per-serving macro changes, {recipe_id: (before, after)}, out to every
+    plan day using those recipes with one grouped read
+    """
+    per_serving = {
+        recipe_id: tuple(Decimal(a) - Decimal(b) for a, b in zip(after, before))
+        for recipe_id, (before, after) in changes.items()
+    }
+    per_serving = {recipe_id: delta for recipe_id, delta in per_serving.items() if any(delta)}
+    if not per_serving:
+        return
+    uses = MealPlanRecipe.objects.filter(recipe_id__in=per_serving).values(
+        'recipe_id', 'meal_plan_day_id', 'meal_plan_day__meal_plan_id',
+    ).annotate(servings=Sum('servings')).order_by()
+    apply(
+        (
+            use['meal_plan_day_id'],
+            use['meal_plan_day__meal_plan_id'],
+            tuple(d * use['servings'] for d in per_serving[use['recipe_id']]),
+        )
+        for use in uses
+    )
+
+
+def recipe_changed(recipe_id, before, after):
+    """Fan a recipe's per-serving macro change out to every plan day using it"""
+    recipes_changed({recipe_id: (before, after)})
+
+
+def recompute(plan_ids):
+    """Recalculate the stored totals of whole plans from their recipes"""
+    sums = MealPlanRecipe.objects.filter(meal_plan_day__meal_plan_id__in=plan_ids).values(
+        'meal_plan_day_id',
+    ).annotate(**{
+        field: Sum(F('servings') * F(f'recipe__{macro}'), output_field=DecimalField())
+        for field, macro in zip(TOTAL_FIELDS, MACROS)
+    }).order_by()
+    sums = {row['meal_plan_day_id']: row for row in sums}
+
+    days = list(MealPlanDay.objects.filter(meal_plan_id__in=plan_ids))
+    plans = {plan_id: dict.fromkeys(TOTAL_FIELDS, Decimal(0)) for plan_id in plan_ids}
+    for day in days:
+        row = sums.get(day.pk, {})
+        for field in TOTAL_FIELDS:
+            value = Decimal(row.get(field) or 0).quantize(Decimal('0.01'))
+            setattr(day, field, value)
+            plans[day.meal_plan_id][field] += value
+
+    MealPlanDay.objects.bulk_update(days, TOTAL_FIELDS, batch_size=500)
+    MealPlan.objects.bulk_update([MealPlan(pk=pk, **totals) for pk, totals in plans.items()], TOTAL_FIELDS)
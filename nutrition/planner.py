@@ -0,0 +1,179 @@
+"""
+Macro-targeted meal plan generation.
+
+The recipes a user can see (after dietary filters) are loaded once into a
+[recipe, macro] matrix of calories, protein, carbs and fats per serving,
+with an index pool per meal time. Each day is then planned in three
+vectorized steps:
+
+1. score a few thousand random combinations (one recipe per meal time)
+2. improve the best one slot at a time, trying every candidate for the slot
+3. pick servings for the chosen recipes from a small grid
+
+The score is the weighted squared relative error against the plan's daily
+targets; recipes used in the previous few days are penalised so the plan
+doesn't repeat itself. A day is within tolerance when every macro is within
+TOLERANCE of its target.
+"""
+import itertools
+from collections import deque
+from decimal import Decimal
+
+import numpy as np
+from django.db import router, transaction
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast
+
+from .models import Recipe, MealPlanDay, MealPlanRecipe
+from .plan_totals import recompute
+
+# Recipe meal types that can fill each meal time
+MEAL_TIME_SOURCES = {
+    'breakfast': ['breakfast'],
+    'morning_snack': ['snack', 'pre_workout'],
+    'lunch': ['lunch'],
+    'afternoon_snack': ['snack', 'pre_workout', 'post_workout'],
+    'dinner': ['dinner'],
+    'evening_snack': ['snack', 'post_workout'],
+}
+DEFAULT_MEAL_TIMES = ['breakfast', 'lunch', 'afternoon_snack', 'dinner']
+
+DIETS = ['vegetarian', 'vegan', 'gluten_free', 'dairy_free']
+
+MACROS = ['calories', 'protein', 'carbs', 'fats']
+MACRO_WEIGHTS = np.array([2.0, 1.5, 1.0, 1.0])
+TOLERANCE = 0.1
+
+SAMPLES = 2048
+PASSES = 2
+SERVING_STEPS = [0.5, 1.0, 1.5, 2.0]
+
+REPEAT_WINDOW = 3
+REPEAT_PENALTY = 0.5
+
+
+class Catalog:
+    """Per-serving macros of the candidate recipes, with a pool per meal time"""
+
+    def __init__(self, ids, meal_types, macros):
+        self.ids = ids
+        self.macros = macros
+        self.pools = {
+            meal_time: np.flatnonzero(np.isin(meal_types, sources))
+            for meal_time, sources in MEAL_TIME_SOURCES.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, user, diet=()):
+        """One query for the public and user's own recipes matching every diet flag"""
+        recipes = Recipe.objects.filter(Q(is_public=True) | Q(creator=user))
+        for flag in diet:
+            recipes = recipes.filter(**{f'is_{flag}': True})
+        rows = list(recipes.values_list('id', 'meal_type', *[Cast(m, FloatField()) for m in MACROS]))
+
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        meal_types = np.array([row[1] for row in rows], dtype=object)
+        macros = np.array([row[2:] for row in rows], dtype=float).reshape(len(rows), len(MACROS))
+        return cls(ids, meal_types, macros)
+
+
+def score(totals, target):
+    """Weighted squared relative error of [..., macro] totals"""
+    relative = (totals - target) / target
+    return (relative ** 2 * MACRO_WEIGHTS).sum(axis=-1)
+
+
+def plan_day(catalog, pools, target, rng, used):
+    """
+    Choose one recipe per pool and its servings. Returns (recipe indices,
+    servings, totals).
+    """
+    macros = catalog.macros
+    penalty = used * REPEAT_PENALTY
+
+    # 1. Random combinations
+    combos = np.stack([pool[rng.integers(len(pool), size=SAMPLES)] for pool in pools], axis=1)
+    errors = score(macros[combos].sum(axis=1), target) + penalty[combos].sum(axis=1)
+    picks = combos[np.argmin(errors)].copy()
+
+    # 2. Slot-wise improvement over every candidate
+    for _ in range(PASSES):
+        for slot, pool in enumerate(pools):
+            rest = macros[picks].sum(axis=0) - macros[picks[slot]]
+            errors = score(rest + macros[pool], target) + penalty[pool]
+            picks[slot] = pool[np.argmin(errors)]
+
+    # 3. Servings grid for the chosen recipes
+    grid = np.array(list(itertools.product(SERVING_STEPS, repeat=len(pools))))
+    totals = grid @ macros[picks]
+    best = np.argmin(score(totals, target))
+    return picks, grid[best], totals[best]
+
+
+def generate_plan(meal_plan, user, diet=(), meal_times=None, seed=None):
+    """
+    Fill every day of ``meal_plan`` (replacing its recipes) from the recipes
+    ``user`` can see. Returns a per-day report of totals and whether the day
+    is within tolerance; empty if no meal time has candidates.
+    """
+    catalog = Catalog.load(user, diet)
+    slots = [
+        (meal_time, catalog.pools[meal_time])
+        for meal_time in (meal_times or DEFAULT_MEAL_TIMES)
+        if len(catalog.pools.get(meal_time, ()))
+    ]
+    if not slots:
+        return []
+
+    target = np.maximum([
+        float(meal_plan.daily_calories),
+        float(meal_plan.daily_protein),
+        float(meal_plan.daily_carbs),
+        float(meal_plan.daily_fats),
+    ], 1.0)
+    rng = np.random.default_rng(seed)
+    pools = [pool for _, pool in slots]
+    recent = deque(maxlen=REPEAT_WINDOW)
+
+    days = {day.day_number: day for day in MealPlanDay.objects.filter(meal_plan=meal_plan)}
+    missing = [
+        MealPlanDay(meal_plan=meal_plan, day_number=n)
+        for n in range(1, int(meal_plan.duration_days) + 1) if n not in days
+    ]
+
+    rows, report = [], []
+    with transaction.atomic():
+        if missing:
+            for day in MealPlanDay.objects.bulk_create(missing):
+                days[day.day_number] = day
+        # Totals are recomputed once below rather than per deleted row
+        MealPlanRecipe.objects.filter(meal_plan_day__meal_plan=meal_plan)._raw_delete(router.db_for_write(MealPlanRecipe))
+
+        for number in sorted(days):
+            used = np.zeros(len(catalog))
+            for picks in recent:
+                used[picks] = 1
+            picks, servings, totals = plan_day(catalog, pools, target, rng, used)
+            recent.append(picks)
+
+            rows.extend(
+                MealPlanRecipe(
+                    meal_plan_day=days[number],
+                    recipe_id=int(catalog.ids[index]),
+                    meal_time=meal_time,
+                    servings=Decimal(str(amount)),
+                )
+                for (meal_time, _), index, amount in zip(slots, picks, servings)
+            )
+            report.append({
+                'day_number': number,
+                **{macro: round(float(value), 1) for macro, value in zip(MACROS, totals)},
+                'within_tolerance': bool(np.all(np.abs(totals - target) <= TOLERANCE * target)),
+            })
+
+        MealPlanRecipe.objects.bulk_create(rows, batch_size=500)
+        recompute([meal_plan.pk])
+    return report
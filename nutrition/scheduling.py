@@ -0,0 +1,162 @@
+"""
+Projecting a meal plan, or meals already logged, onto a user's nutrition
+calendar.
+
+Day ``n`` of the plan lands on ``start + n - 1`` (longer ranges repeat the
+plan). Everything is written in one transaction with a fixed number of
+statements regardless of plan length: the plan is read once, missing
+NutritionLog days are bulk-created, the MealLog rows are bulk-created, and
+each day's totals are aggregated once and written with a bulk update.
+
+Copying logged meals to other days works the same way, except that the
+copied meals' macros are already known: each target day's totals are
+moved by the sum of its copies in a single UPDATE.
+
+bulk_create skips the NutritionLog signals, so the series cache, energy
+balance and activity bitmap are refreshed once for the whole range after
+the transaction commits.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import router, transaction
+from django.db.models import Sum
+
+from core.activity import mark_days
+from core.energy import refresh_days
+from core.series import touch
+from .models import MealLog, MealPlanRecipe, NutritionLog
+from .plan_totals import add
+from .suggestions import record
+
+TOTAL_FIELDS = ['total_calories', 'total_protein', 'total_carbs', 'total_fats']
+
+COPIED_FIELDS = [
+    'recipe_id', 'food_item_id', 'quantity', 'unit', 'meal_type', 'meal_name',
+    'calories', 'protein', 'carbs', 'fats', 'servings', 'time', 'notes',
+]
+
+
+def plan_entries(meal_plan):
+    """{day_number: [entry]} of the plan's recipes with per-serving macros, in one query"""
+    rows = MealPlanRecipe.objects.filter(meal_plan_day__meal_plan=meal_plan).order_by(
+        'meal_plan_day__day_number', 'meal_time',
+    ).values_list(
+        'meal_plan_day__day_number', 'meal_time', 'servings', 'notes',
+        'recipe_id', 'recipe__name', 'recipe__calories', 'recipe__protein', 'recipe__carbs', 'recipe__fats',
+    )
+    entries = defaultdict(list)
+    for day_number, *entry in rows:
+        entries[day_number].append(entry)
+    return entries
+
+
+def apply_plan(meal_plan, user, start, days=None, replace=False):
+    """
+    Log the plan's meals for ``user`` from ``start`` for ``days`` days
+    (default: the plan's duration). With ``replace``, meals already logged on
+    those days are removed first. Returns the number of meals logged.
+    """
+    days = days or int(meal_plan.duration_days)
+    duration = max(int(meal_plan.duration_days), 1)
+    entries = plan_entries(meal_plan)
+    dates = [start + datetime.timedelta(days=offset) for offset in range(days)]
+
+    with transaction.atomic(using=router.db_for_write(NutritionLog)):
+        logs = NutritionLog.objects.filter(user=user, date__in=dates)
+        existing = set(logs.values_list('date', flat=True))
+        created = [day for day in dates if day not in existing]
+        NutritionLog.objects.bulk_create([NutritionLog(user=user, date=day) for day in created])
+        log_ids = dict(logs.values_list('date', 'id'))
+
+        if replace:
+            MealLog.objects.filter(nutrition_log_id__in=log_ids.values())._raw_delete(router.db_for_write(MealLog))
+
+        meals = [
+            MealLog(
+                nutrition_log_id=log_ids[day],
+                recipe_id=recipe_id,
+                meal_type=meal_time,
+                meal_name=name,
+                calories=int(calories * servings),
+                protein=protein * servings,
+                carbs=carbs * servings,
+                fats=fats * servings,
+                servings=servings,
+                notes=notes,
+            )
+            for offset, day in enumerate(dates)
+            for meal_time, servings, notes, recipe_id, name, calories, protein, carbs, fats in entries.get(offset % duration + 1, ())
+        ]
+        MealLog.objects.bulk_create(meals, batch_size=500)
+
+        totals = MealLog.objects.filter(nutrition_log_id__in=log_ids.values()).values('nutrition_log_id').annotate(
+            total_calories=Sum('calories'),
+            total_protein=Sum('protein'),
+            total_carbs=Sum('carbs'),
+            total_fats=Sum('fats'),
+        ).order_by()
+        totals = {row['nutrition_log_id']: row for row in totals}
+        NutritionLog.objects.bulk_update(
+            [
+                NutritionLog(pk=log_id, **{field: totals.get(log_id, {}).get(field) or 0 for field in TOTAL_FIELDS})
+                for log_id in log_ids.values()
+            ],
+            TOTAL_FIELDS,
+            batch_size=500,
+        )
+
+        transaction.on_commit(lambda: refresh_calendar(user.pk, dates), using=router.db_for_write(NutritionLog))
+    return len(meals)
+
+
+def copy_meals(user, source, target, days=1, meal_type=None):
+    """
+    Log the meals of ``days`` days from ``source`` again on the same days
+    from ``target`` (optionally only one ``meal_type`` slot). Photos are not
+    copied. Returns the number of meals logged.
+    """
+    shift = target - source
+    sources = [source + datetime.timedelta(days=offset) for offset in range(days)]
+
+    with transaction.atomic(using=router.db_for_write(NutritionLog)):
+        rows = MealLog.objects.filter(nutrition_log__user=user, nutrition_log__date__in=sources)
+        if meal_type:
+            rows = rows.filter(meal_type=meal_type)
+        rows = list(rows.order_by('nutrition_log__date', 'pk').values('nutrition_log__date', *COPIED_FIELDS))
+        if not rows:
+            return 0
+
+        dates = sorted({row['nutrition_log__date'] + shift for row in rows})
+        logs = NutritionLog.objects.filter(user=user, date__in=dates)
+        existing = set(logs.values_list('date', flat=True))
+        created = [day for day in dates if day not in existing]
+        NutritionLog.objects.bulk_create([NutritionLog(user=user, date=day) for day in created])
+        log_ids = dict(logs.values_list('date', 'id'))
+
+        meals = [
+            MealLog(nutrition_log_id=log_ids[row.pop('nutrition_log__date') + shift], **row)
+            for row in rows
+        ]
+        MealLog.objects.bulk_create(meals, batch_size=500)
+
+        deltas = defaultdict(lambda: (0,) * len(TOTAL_FIELDS))
+        for meal in meals:
+            values = (meal.calories, meal.protein, meal.carbs, meal.fats)
+            deltas[meal.nutrition_log_id] = tuple(a + b for a, b in zip(deltas[meal.nutrition_log_id], values))
+        add(NutritionLog, deltas)
+
+        transaction.on_commit(lambda: refresh_calendar(user.pk, dates), using=router.db_for_write(NutritionLog))
+    record(user.pk, meals)
+    return len(meals)
+
+
+def refresh_calendar(user_id, dates):
+    """The NutritionLog and MealLog signal work, once for a whole range"""
+    touch(user_id, 'nutrition')
+    refresh_days(user_id, dates)
+    logged = set(MealLog.objects.filter(nutrition_log__user_id=user_id, nutrition_log__date__in=dates).values_list(
+        'nutrition_log__date', flat=True
+    ).distinct())
+    mark_days(user_id, 'nutrition', logged)
+    mark_days(user_id, 'nutrition', set(dates) - logged, active=False)
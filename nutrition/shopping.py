@@ -0,0 +1,120 @@
+"""
+Shopping lists for meal plans and logged meals.
+
+Ingredient quantities are written for a whole recipe, so each line is scaled
+by the servings planned (or logged) over the recipe's yield. Rows are
+aggregated in the database first (one row per recipe ingredient with the
+total servings using it), then reduced in memory: every quantity is
+converted to a base unit per dimension (grams, millilitres, items) using
+the unit table in nutrition.ingredients and the cached serving-size
+conversions, summed per food item, and grouped by FoodItem category.
+Ingredients that aren't linked to a food item are summed by name under
+'other'; lines without a quantity are listed without an amount.
+"""
+from collections import defaultdict
+
+from django.db.models import Sum
+
+from .ingredients import UNITS, normalize, serving_amounts
+from .models import FoodItem, MealLog, RecipeIngredient
+
+INGREDIENT_FIELDS = [
+    'recipe_id', 'name', 'quantity', 'unit', 'food_item_id',
+    'food_item__name', 'food_item__category', 'food_item__serving_size', 'recipe__servings',
+]
+
+# Dimension -> [(threshold, unit, divisor)], largest first
+DISPLAY_UNITS = {
+    'mass': [(1000, 'kg', 1000), (0, 'g', 1)],
+    'volume': [(1000, 'l', 1000), (0, 'ml', 1)],
+    'count': [(0, '', 1)],
+    'serving': [(0, 'servings', 1)],
+}
+
+CATEGORY_LABELS = dict(FoodItem.CATEGORY_CHOICES)
+
+
+def plan_rows(meal_plan):
+    """One aggregate query: each ingredient of the plan's recipes with the servings planned"""
+    return RecipeIngredient.objects.filter(
+        recipe__meal_plan_recipes__meal_plan_day__meal_plan=meal_plan,
+    ).values(*INGREDIENT_FIELDS).annotate(portions=Sum('recipe__meal_plan_recipes__servings')).order_by()
+
+
+def logged_rows(user, start, end):
+    """
+    Ingredients of the recipes logged between two dates. Meal logs may live
+    on a user shard, so the servings per recipe are summed there and the
+    ingredients read from the global tables.
+    """
+    portions = dict(
+        MealLog.objects.filter(
+            nutrition_log__user=user, nutrition_log__date__range=(start, end), recipe__isnull=False,
+        ).values('recipe_id').annotate(portions=Sum('servings')).order_by().values_list('recipe_id', 'portions')
+    )
+    rows = RecipeIngredient.objects.filter(recipe_id__in=portions).values(*INGREDIENT_FIELDS)
+    return [{**row, 'portions': portions[row['recipe_id']]} for row in rows]
+
+
+def base_amount(quantity, unit, serving_size):
+    """(dimension, amount in the dimension's base unit); food servings become mass/volume/count when known"""
+    dimension, base = UNITS.get(unit, ('count', 1))
+    amount = float(quantity) * float(base)
+    if dimension == 'serving' and serving_size:
+        serving = serving_amounts(serving_size)
+        for key in ('mass', 'volume', 'count'):
+            if serving.get(key):
+                return key, amount * float(serving[key])
+    return dimension, amount
+
+
+def display(amount, dimension):
+    for threshold, unit, divisor in DISPLAY_UNITS[dimension]:
+        if amount >= threshold:
+            return round(amount / divisor, 2), unit
+
+
+def reduce_rows(rows):
+    """Sum scaled ingredient rows into [{'category', 'label', 'items': [...]}]"""
+    totals = defaultdict(float)
+    names, categories = {}, {}
+    for row in rows:
+        scale = float(row['portions'] or 0) / max(row['recipe__servings'] or 1, 1)
+        if row['quantity'] is None:
+            # "salt to taste": listed once, without an amount
+            dimension, amount = None, 0.0
+        else:
+            dimension, amount = base_amount(row['quantity'], row['unit'], row['food_item__serving_size'])
+
+        food = row['food_item_id'] or normalize(row['name'])
+        key = (food, dimension)
+        totals[key] += amount * scale
+        names.setdefault(key, row['food_item__name'] or row['name'])
+        categories.setdefault(key, row['food_item__category'] or 'other')
+
+    groups = defaultdict(list)
+    for key, amount in totals.items():
+        quantity, unit = display(amount, key[1]) if key[1] else (None, '')
+        groups[categories[key]].append({
+            'food_item': key[0] if isinstance(key[0], int) else None,
+            'name': names[key],
+            'quantity': quantity,
+            'unit': unit,
+        })
+
+    return [
+        {
+            'category': category,
+            'label': label,
+            'items': sorted(groups[category], key=lambda item: item['name'].lower()),
+        }
+        for category, label in CATEGORY_LABELS.items() if category in groups
+    ]
+
+
+def plan_shopping_list(meal_plan):
+    return reduce_rows(plan_rows(meal_plan))
+
+
+def logged_shopping_list(user, start, end):
+    return reduce_rows(logged_rows(user, start, end))
@@ -0,0 +1,165 @@
+"""
+Recent and frequent meals for one-tap logging.
+
+Every logged meal is filed under its meal type as a recipe, a food item or
+a manual entry (keyed by normalised name) in MealSuggestion, together with
+the amount and nutrition it was last logged with so it can be repeated as
+is.
+
+Entries are ranked by a time-decayed count with a half-life of
+HALF_LIFE_DAYS, kept with forward decay: a log at time t adds 2^(t / H)
+instead of decaying every other entry, so recording a meal touches only its
+own row and ranks stay comparable. Weights are stored as log2 of the sum to
+stay in float range. Each user keeps at most CAPACITY entries per meal
+type (the slack lets new meals climb past TOP_K before being dropped).
+
+The ranked lists are cached per user and dropped whenever a meal is
+recorded; ``rebuild`` replays a user's MealLog history.
+"""
+import math
+import re
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import router, transaction
+from django.utils import timezone
+
+from .ingredients import normalize
+from .models import MealLog, MealSuggestion
+
+HALF_LIFE_DAYS = 14
+TOP_K = 8
+CAPACITY = TOP_K * 2
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+AMOUNT = re.compile(r'\s*\([^)]*\)$')
+
+COPIED_FIELDS = ['servings', 'quantity', 'unit', 'calories', 'protein', 'carbs', 'fats']
+SERVED_FIELDS = ['kind', 'key', 'label', *COPIED_FIELDS]
+
+
+def cache_key(user_id):
+    return f'nutrition:suggestions:{user_id}'
+
+
+def invalidate(user_id):
+    cache.delete(cache_key(user_id))
+
+
+def boost(at, count=1):
+    """log2 of the forward-decayed weight of ``count`` logs at ``at``"""
+    return at.timestamp() / 86400 / HALF_LIFE_DAYS + math.log2(count)
+
+
+def combine(weight, added):
+    """log2(2^weight + 2^added) without leaving float range"""
+    high, low = max(weight, added), min(weight, added)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def entry_key(meal):
+    """(kind, key, label) a meal is filed under"""
+    if meal.recipe_id:
+        return 'recipe', str(meal.recipe_id), meal.meal_name
+    if meal.food_item_id:
+        return 'food', str(meal.food_item_id), AMOUNT.sub('', meal.meal_name)
+    return 'manual', normalize(meal.meal_name)[:200], meal.meal_name
+
+
+def apply_meals(entries, user_id, meals, at, model=MealSuggestion):
+    """
+    Fold ``meals`` logged at ``at`` into ``entries``, {(meal_type, kind, key):
+    MealSuggestion}. Returns the keys that changed.
+    """
+    logged = defaultdict(list)
+    for meal in meals:
+        kind, key, label = entry_key(meal)
+        if key:
+            logged[(meal.meal_type, kind, key)].append((label, meal))
+
+    for ident, repeats in logged.items():
+        label, meal = repeats[-1]
+        entry = entries.get(ident)
+        if entry is None:
+            entry = entries[ident] = model(
+                user_id=user_id, meal_type=ident[0], kind=ident[1], key=ident[2], weight=-math.inf,
+            )
+        entry.label = label[:200]
+        for field in COPIED_FIELDS:
+            setattr(entry, field, getattr(meal, field))
+        entry.weight = combine(entry.weight, boost(at, len(repeats)))
+        entry.times_logged += len(repeats)
+        entry.last_logged = at
+    return set(logged)
+
+
+def overflow(entries, meal_types):
+    """Entries ranked past CAPACITY in the given meal types"""
+    ranked = defaultdict(list)
+    for ident, entry in entries.items():
+        if ident[0] in meal_types:
+            ranked[ident[0]].append(entry)
+    return [
+        entry
+        for rows in ranked.values()
+        for entry in sorted(rows, key=lambda e: e.weight, reverse=True)[CAPACITY:]
+    ]
+
+
+def record(user_id, meals, at=None):
+    """Count freshly logged ``meals`` towards the user's suggestions"""
+    meals = [meal for meal in meals if meal.meal_type]
+    if not meals:
+        return
+    at = at or timezone.now()
+    meal_types = {meal.meal_type for meal in meals}
+
+    using = router.db_for_write(MealSuggestion)
+    with transaction.atomic(using=using):
+        entries = {
+            (entry.meal_type, entry.kind, entry.key): entry
+            for entry in MealSuggestion.objects.filter(user_id=user_id, meal_type__in=meal_types)
+        }
+        changed = apply_meals(entries, user_id, meals, at)
+        dropped = overflow(entries, meal_types)
+
+        rows = [entries[ident] for ident in changed if entries[ident] not in dropped]
+        MealSuggestion.objects.bulk_create([entry for entry in rows if entry.pk is None])
+        MealSuggestion.objects.bulk_update(
+            [entry for entry in rows if entry.pk is not None],
+            ['label', *COPIED_FIELDS, 'weight', 'times_logged', 'last_logged'],
+        )
+        stale = [entry.pk for entry in dropped if entry.pk is not None]
+        if stale:
+            MealSuggestion.objects.filter(pk__in=stale).delete()
+
+        transaction.on_commit(lambda: invalidate(user_id), using=using)
+
+
+def rebuild(user_id):
+    """Recompute a user's suggestions from their whole meal history"""
+    entries = {}
+    meals = MealLog.objects.filter(nutrition_log__user_id=user_id).order_by('created_at', 'pk')
+    for meal in meals.iterator():
+        apply_meals(entries, user_id, [meal], meal.created_at)
+    dropped = overflow(entries, {ident[0] for ident in entries})
+
+    with transaction.atomic(using=router.db_for_write(MealSuggestion)):
+        MealSuggestion.objects.filter(user_id=user_id).delete()
+        MealSuggestion.objects.bulk_create([entry for entry in entries.values() if entry not in dropped])
+    invalidate(user_id)
+
+
+def suggestions(user_id):
+    """{meal_type: [suggestion dicts, best first]} with at most TOP_K per meal type, cached"""
+    key = cache_key(user_id)
+    ranked = cache.get(key)
+    if ranked is None:
+        ranked = defaultdict(list)
+        for row in MealSuggestion.objects.filter(user_id=user_id).order_by('meal_type', '-weight').values('meal_type', *SERVED_FIELDS):
+            if len(ranked[row['meal_type']]) < TOP_K:
+                ranked[row.pop('meal_type')].append(row)
+        ranked = dict(ranked)
+        cache.set(key, ranked, CACHE_TIMEOUT)
+    return ranked
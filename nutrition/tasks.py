@@ -0,0 +1,29 @@
+from django.db.models import Sum
+
+from core.energy import refresh_days
+from core.series import touch
+from jobs.registry import task
+from .models import NutritionLog, MealLog
+
+
+@task(name='nutrition.recompute_totals')
+def recompute_totals(log_id):
+    """Recalculate a nutrition log's daily totals from its meals"""
+    totals = MealLog.objects.filter(nutrition_log_id=log_id).aggregate(
+        total_calories=Sum('calories'),
+        total_protein=Sum('protein'),
+        total_carbs=Sum('carbs'),
+        total_fats=Sum('fats'),
+    )
+    
+    NutritionLog.objects.filter(id=log_id).update(
+        total_calories=totals['total_calories'] or 0,
+        total_protein=totals['total_protein'] or 0,
+        total_carbs=totals['total_carbs'] or 0,
+        total_fats=totals['total_fats'] or 0,
+    )
+    
+    log = NutritionLog.objects.filter(id=log_id).values_list('user_id', 'date').first()
+    if log:
+        touch(log[0], 'nutrition')
+        refresh_days(log[0], [log[1]])
@@ -1,3 +1,676 @@
+import datetime
+import importlib
+from decimal import Decimal
+from fractions import Fraction
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
 from django.test import TestCase
+from django.utils import timezone
+
+from FitTrack.sharding import shard_for_user
+from FitTrack.testing import ShardedTestCase
+from core.activity import heatmaps
+from core.models import DailyEnergyBalance
+from .cloning import clone_plan
+from .foods import log_food_items
+from .ingredients import FoodIndex, parse_line, portion
+from .models import FoodItem, MealLog, MealPlan, MealPlanDay, MealPlanRecipe, MealSuggestion, NutritionLog, Recipe, RecipeIngredient
+from .plan_totals import TOTAL_FIELDS, recompute
+from .planner import Catalog, generate_plan, plan_day
+from .scheduling import apply_plan, copy_meals
+from .shopping import plan_shopping_list
+from .suggestions import CAPACITY, TOP_K, rebuild, record, suggestions
+from .water import add as add_water
+
+
+def make_food(name='Oats', serving_size='100g', calories=380, protein=13, carbs=68, fats=7, category='grain'):
+    return FoodItem.objects.create(
+        name=name, category=category, serving_size=serving_size, calories=calories, protein=protein, carbs=carbs, fats=fats,
+    )
+
+
+def make_recipe(ingredients, servings=1, **fields):
+    return Recipe.objects.create(**{
+        'name': 'Porridge', 'description': '', 'meal_type': 'breakfast', 'calories': 0, 'protein': 0, 'carbs': 0, 'fats': 0,
+        'servings': servings, 'prep_time': 5, 'cook_time': 10, 'ingredients': ingredients, 'instructions': '', **fields,
+    })
+
+
+class IngredientParserTest(TestCase):
+    """Free-text ingredient lines become quantities, units and food items"""
+
+    def setUp(self):
+        cache.clear()
+
+    def parsed(self, line):
+        parsed = parse_line(line)
+        return parsed.quantity, parsed.unit, parsed.name
+
+    def test_quantities(self):
+        self.assertEqual(self.parsed('2 eggs'), (2, '', 'eggs'))
+        self.assertEqual(self.parsed('1 1/2 cups milk'), (Fraction(3, 2), 'cups', 'milk'))
+        self.assertEqual(self.parsed('1½ cups milk'), (Fraction(3, 2), 'cups', 'milk'))
+        self.assertEqual(self.parsed('½ tsp salt'), (Fraction(1, 2), 'tsp', 'salt'))
+        self.assertEqual(self.parsed('2-3 cloves garlic'), (Fraction(5, 2), 'cloves', 'garlic'))
+        self.assertEqual(self.parsed('0.5 kg chicken breast'), (Fraction(1, 2), 'kg', 'chicken breast'))
+        self.assertEqual(self.parsed('1/0 cup milk'), (None, '', '1/0 cup milk'))
+
+    def test_units_and_names(self):
+        self.assertEqual(self.parsed('- 2 fl oz. of cream'), (2, 'fl oz', 'cream'))
+        self.assertEqual(self.parsed('100g oats (rolled), to taste'), (100, 'g', 'oats'))
+        self.assertEqual(self.parsed('3 large carrots'), (3, '', 'large carrots'))
+        self.assertEqual(self.parsed('Salt and pepper'), (None, '', 'Salt and pepper'))
+        self.assertIsNone(parse_line('   '))
+
+    def test_food_matching_prefers_longer_names(self):
+        index = FoodIndex([(1, 'Chicken', '100g'), (2, 'Chicken Breast', '100g'), (3, 'Tomato', '1 medium (123g)')])
+        self.assertEqual(index.match('boneless chicken breasts'), 2)
+        self.assertEqual(index.match('chicken thighs'), 1)
+        self.assertEqual(index.match('ripe tomatoes'), 3)
+        self.assertIsNone(index.match('saffron'))
+
+    def test_food_index_is_cached_until_a_food_changes(self):
+        oats = make_food()
+        FoodIndex.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(FoodIndex.load().match('oats'), oats.pk)
+        milk = make_food(name='Milk', serving_size='1 cup')
+        self.assertEqual(FoodIndex.load().match('milk'), milk.pk)
+        milk.delete()
+        self.assertIsNone(FoodIndex.load().match('milk'))
+
+    def test_portions(self):
+        self.assertEqual(portion(Fraction(250), 'g', '100g'), Fraction(5, 2))
+        self.assertEqual(portion(Fraction(1), 'cup', '100ml'), Fraction(12, 5))
+        self.assertEqual(portion(Fraction(2), '', '1 medium (123g)'), 2)
+        self.assertEqual(portion(Fraction(246), 'g', '1 medium (123g)'), 2)
+        self.assertEqual(portion(Fraction(3), 'servings', 'whatever'), 3)
+        self.assertIsNone(portion(Fraction(2), '', '100g'))
+
+    def test_recipe_nutrition_from_ingredients(self):
+        make_food()
+        make_food(name='Milk', serving_size='1 cup', calories=120, protein=8, carbs=12, fats=5)
+        recipe = make_recipe('100g oats\n1 cup milk\nHoney to taste', servings=2, nutrition_from_ingredients=True)
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.calories, recipe.protein, recipe.carbs, recipe.fats), (250, Decimal('10.5'), Decimal('40.0'), Decimal('6.0')))
+        self.assertEqual(RecipeIngredient.objects.filter(recipe=recipe, food_item__isnull=True).get().name, 'Honey to taste')
+
+    def test_migration_matches_sync(self):
+        make_food()
+        make_food(name='Egg', serving_size='1 large (50g)', calories=70, protein=6, carbs=0, fats=5)
+        make_recipe('1/2 cup rolled oats\n2 eggs\n150 g egg whites\n- a pinch of salt\n1/0 cup milk')
+        fields = ['recipe_id', 'food_item_id', 'position', 'text', 'name', 'quantity', 'unit', 'food_servings']
+        expected = list(RecipeIngredient.objects.order_by('position').values(*fields))
+        RecipeIngredient.objects.all().delete()
+
+        migration = importlib.import_module('nutrition.migrations.0004_recipe_ingredients')
+        migration.parse_ingredients(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(list(RecipeIngredient.objects.order_by('position').values(*fields)), expected)
+        self.assertEqual([row['food_servings'] for row in expected], [Decimal('1.200'), Decimal('2.000'), Decimal('3.000'), None, None])
+
+
+class FoodItemLoggingTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('eater', password='pw')
+        self.log = NutritionLog.objects.create(user=self.user, date=datetime.date(2024, 4, 2))
+        self.oats = make_food()
+
+    def test_logs_scaled_nutrition(self):
+        meal, = log_food_items(self.log, 'breakfast', [(self.oats.pk, '50', 'g')])
+        self.assertEqual((meal.meal_name, meal.calories, meal.protein), ('Oats (50 g)', 190, Decimal('6.5')))
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.total_calories, 190)
+
+    def test_rejects_non_finite_quantities(self):
+        for quantity in ['NaN', 'sNaN', 'Infinity', '-Infinity', 'abc', '0', '-5']:
+            with self.assertRaises(ValueError, msg=quantity):
+                log_food_items(self.log, 'breakfast', [(self.oats.pk, quantity, 'g')])
+        self.assertFalse(MealLog.objects.exists())
+
+    def test_rejects_quantities_the_fields_cannot_hold(self):
+        for quantity, unit in [('1000000', 'g'), ('200000', 'g'), ('1e30', 'mg')]:
+            with self.assertRaises(ValueError, msg=quantity):
+                log_food_items(self.log, 'breakfast', [(self.oats.pk, quantity, unit)])
+        self.assertFalse(MealLog.objects.exists())
+        # 200 kg fits the quantity field but not its carbs; 10 kg fits both
+        log_food_items(self.log, 'breakfast', [(self.oats.pk, '10', 'kg')])
+
+    def test_view_reports_bad_quantities(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/nutrition/log/add-meal/', {
+            'date': '2024-04-02', 'meal_type': 'breakfast', 'food_item': [str(self.oats.pk)], 'quantity': ['NaN'], 'unit': ['g'],
+        })
+        self.assertRedirects(response, '/nutrition/log/add-meal/', fetch_redirect_response=False)
+        self.assertFalse(MealLog.objects.exists())
+
+    def test_view_rejects_items_without_a_quantity(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/nutrition/log/add-meal/', {
+            'date': '2024-04-02', 'meal_type': 'breakfast', 'food_item': [str(self.oats.pk)] * 2, 'quantity': ['50'], 'unit': ['g', 'g'],
+        })
+        self.assertRedirects(response, '/nutrition/log/add-meal/', fetch_redirect_response=False)
+        self.assertFalse(MealLog.objects.exists())
+
+
+class NutritionActivityTest(TestCase):
+    """A day counts as logged in the heatmap only once it has a meal"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('eater')
+        self.day = datetime.date(2024, 4, 2)
+
+    def logged_days(self):
+        return heatmaps(self.user.id, [self.day.year])[str(self.day.year)].get('nutrition', {}).get('days', 0)
+
+    def test_empty_log_is_not_activity(self):
+        NutritionLog.objects.create(user=self.user, date=self.day, water_intake=1)
+        self.assertEqual(self.logged_days(), 0)
+
+    def test_meal_marks_and_clears_the_day(self):
+        log = NutritionLog.objects.create(user=self.user, date=self.day)
+        meal = MealLog.objects.create(
+            nutrition_log=log, meal_type='breakfast', meal_name='Eggs', calories=200, protein=14, carbs=1, fats=15,
+        )
+        self.assertEqual(self.logged_days(), 1)
+
+        meal.delete()
+        self.assertEqual(self.logged_days(), 0)
+
+    def test_logged_food_items_mark_the_day(self):
+        log = NutritionLog.objects.create(user=self.user, date=self.day)
+        log_food_items(log, 'breakfast', [(make_food().pk, 50, 'g')])
+        self.assertEqual(self.logged_days(), 1)
+
+    def test_copied_meals_mark_their_days(self):
+        log = NutritionLog.objects.create(user=self.user, date=self.day)
+        MealLog.objects.create(
+            nutrition_log=log, meal_type='lunch', meal_name='Rice', calories=400, protein=8, carbs=80, fats=2,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            copy_meals(self.user, self.day, self.day + datetime.timedelta(days=1))
+        self.assertEqual(self.logged_days(), 2)
+
+    def test_deleting_the_log_clears_the_day(self):
+        log = NutritionLog.objects.create(user=self.user, date=self.day)
+        MealLog.objects.create(
+            nutrition_log=log, meal_type='lunch', meal_name='Rice', calories=400, protein=8, carbs=80, fats=2,
+        )
+        log.delete()
+        self.assertEqual(self.logged_days(), 0)
+
+
+class MealSuggestionsTest(TestCase):
+    """Recent and frequent meals are ranked by time-decayed count"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('eater')
+        self.log = NutritionLog.objects.create(user=self.user, date=datetime.date(2024, 4, 2))
+        self.now = timezone.now()
+
+    def meal(self, name, meal_type='breakfast', calories=300):
+        return MealLog(
+            nutrition_log=self.log, meal_type=meal_type, meal_name=name, calories=calories, protein=10, carbs=40, fats=8,
+        )
+
+    def labels(self, meal_type='breakfast'):
+        return [row['label'] for row in suggestions(self.user.id).get(meal_type, [])]
+
+    def test_frequent_meals_rank_first(self):
+        record(self.user.id, [self.meal('Eggs')], at=self.now)
+        for _ in range(3):
+            record(self.user.id, [self.meal('Oats')], at=self.now)
+        self.assertEqual(self.labels(), ['Oats', 'Eggs'])
+
+    def test_old_meals_decay(self):
+        two_months_ago = self.now - datetime.timedelta(days=60)
+        record(self.user.id, [self.meal('Toast'), self.meal('Toast')], at=two_months_ago)
+        record(self.user.id, [self.meal('Yogurt')], at=self.now)
+        self.assertEqual(self.labels(), ['Yogurt', 'Toast'])
+        self.assertEqual(MealSuggestion.objects.get(label='Toast').times_logged, 2)
+
+    def test_manual_names_are_normalised(self):
+        record(self.user.id, [self.meal('Greek Yogurt!')], at=self.now)
+        record(self.user.id, [self.meal('greek  yogurt', calories=150)], at=self.now)
+        entry = MealSuggestion.objects.get()
+        self.assertEqual((entry.key, entry.label, entry.times_logged, entry.calories), ('greek yogurt', 'greek  yogurt', 2, 150))
+
+    def test_entries_are_capped_per_meal_type(self):
+        for i in range(CAPACITY + 4):
+            record(self.user.id, [self.meal(f'Meal {i}')], at=self.now + datetime.timedelta(hours=i))
+        self.assertEqual(MealSuggestion.objects.filter(meal_type='breakfast').count(), CAPACITY)
+        self.assertEqual(self.labels(), [f'Meal {i}' for i in range(CAPACITY + 3, CAPACITY + 3 - TOP_K, -1)])
+
+    def test_logging_a_meal_refreshes_the_cached_list(self):
+        self.assertEqual(self.labels(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            MealLog.objects.create(
+                nutrition_log=self.log, meal_type='breakfast', meal_name='Porridge', calories=250, protein=8, carbs=45, fats=5,
+            )
+        self.assertEqual(self.labels(), ['Porridge'])
+
+    def test_migration_matches_rebuild(self):
+        for days_ago, name in [(40, 'Toast'), (30, 'Toast'), (2, 'Oats'), (1, 'Eggs'), (1, 'Toast')]:
+            meal = self.meal(name)
+            meal.save()
+            MealLog.objects.filter(pk=meal.pk).update(created_at=self.now - datetime.timedelta(days=days_ago))
+        fields = ['meal_type', 'kind', 'key', 'label', 'calories', 'weight', 'times_logged', 'last_logged']
+
+        rebuild(self.user.id)
+        expected = list(MealSuggestion.objects.order_by('key').values(*fields))
+        MealSuggestion.objects.all().delete()
+
+        migration = importlib.import_module('nutrition.migrations.0006_meal_suggestions')
+        migration.build_suggestions(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(list(MealSuggestion.objects.order_by('key').values(*fields)), expected)
+        self.assertEqual([row['times_logged'] for row in expected], [1, 1, 3])
+
+
+class MealPlannerTest(TestCase):
+    """Plans are filled with visible recipes whose macros add up to the daily targets"""
+
+    BREAKFAST, LUNCH, DINNER = (500, 30, 60, 15), (700, 50, 70, 25), (800, 70, 70, 27)
+    TARGET = np.array([2000.0, 150.0, 200.0, 67.0])
+
+    def catalog(self, *recipes):
+        meal_types = np.array([meal_type for meal_type, _ in recipes], dtype=object)
+        macros = np.array([macros for _, macros in recipes], dtype=float)
+        return Catalog(np.arange(len(recipes)), meal_types, macros)
+
+    def recipe(self, name, meal_type, macros, **fields):
+        calories, protein, carbs, fats = macros
+        return make_recipe('', name=name, meal_type=meal_type, calories=calories, protein=protein, carbs=carbs, fats=fats, **fields)
+
+    def test_plan_day_hits_an_exact_combination(self):
+        catalog = self.catalog(
+            ('breakfast', self.BREAKFAST), ('breakfast', (300, 10, 50, 8)),
+            ('lunch', self.LUNCH), ('lunch', (900, 20, 120, 35)),
+            ('dinner', self.DINNER),
+        )
+        pools = [catalog.pools[meal_time] for meal_time in ['breakfast', 'lunch', 'dinner']]
+        picks, servings, totals = plan_day(catalog, pools, self.TARGET, np.random.default_rng(0), np.zeros(len(catalog)))
+        self.assertEqual(picks.tolist(), [0, 2, 4])
+        self.assertEqual(servings.tolist(), [1.0, 1.0, 1.0])
+        self.assertEqual(totals.tolist(), self.TARGET.tolist())
+
+    def test_recent_recipes_are_penalised(self):
+        catalog = self.catalog(('breakfast', self.BREAKFAST), ('lunch', self.LUNCH), ('lunch', (700, 45, 75, 25)), ('dinner', self.DINNER))
+        pools = [catalog.pools[meal_time] for meal_time in ['breakfast', 'lunch', 'dinner']]
+        used = np.array([0, 1, 0, 0])
+        picks, _, _ = plan_day(catalog, pools, self.TARGET, np.random.default_rng(0), used)
+        self.assertEqual(picks.tolist(), [0, 2, 3])
+
+    def test_generate_plan_uses_visible_recipes_matching_the_diet(self):
+        user = User.objects.create_user('planner', password='pw')
+        other = User.objects.create_user('other', password='pw')
+        oats = self.recipe('Oats', 'breakfast', self.BREAKFAST, is_vegan=True)
+        self.recipe('Eggs', 'breakfast', self.BREAKFAST)
+        lentils = self.recipe('Lentils', 'lunch', self.LUNCH, is_vegan=True)
+        tofu = self.recipe('Tofu', 'dinner', self.DINNER, is_vegan=True, creator=user, is_public=False)
+        self.recipe('Tempeh', 'dinner', self.DINNER, is_vegan=True, creator=other, is_public=False)
+        plan = MealPlan.objects.create(
+            creator=user, name='Vegan', description='', plan_type='balanced', duration_days=3,
+            daily_calories=2000, daily_protein=150, daily_carbs=200, daily_fats=67,
+        )
+
+        for _ in range(2):
+            report = generate_plan(plan, user, diet=['vegan'], seed=1)
+
+        self.assertEqual([day['day_number'] for day in report], [1, 2, 3])
+        self.assertTrue(all(day['within_tolerance'] for day in report))
+        self.assertEqual(report[0]['calories'], 2000.0)
+        entries = MealPlanRecipe.objects.filter(meal_plan_day__meal_plan=plan)
+        self.assertEqual(entries.count(), 9)
+        self.assertEqual(set(entries.values_list('recipe_id', flat=True)), {oats.pk, lentils.pk, tofu.pk})
+        plan.refresh_from_db()
+        self.assertEqual(plan.total_calories, 6000)
+
+    def test_nothing_to_plan(self):
+        user = User.objects.create_user('planner', password='pw')
+        plan = MealPlan.objects.create(
+            creator=user, name='Empty', description='', plan_type='balanced',
+            daily_calories=2000, daily_protein=150, daily_carbs=200, daily_fats=67,
+        )
+        self.assertEqual(generate_plan(plan, user), [])
+        self.assertFalse(plan.days.exists())
+
+
+class MealPlanTotalsTest(TestCase):
+    """Stored day and plan totals follow entry and recipe edits by deltas"""
+
+    def setUp(self):
+        self.oats = make_recipe('', name='Oats', calories=400, protein=15, carbs=60, fats=8)
+        self.rice = make_recipe('', name='Rice', meal_type='dinner', calories=600, protein=20, carbs=100, fats=10)
+        self.plan = MealPlan.objects.create(
+            name='Plan', description='', plan_type='balanced', duration_days=2,
+            daily_calories=2000, daily_protein=150, daily_carbs=200, daily_fats=67,
+        )
+        self.day1 = MealPlanDay.objects.create(meal_plan=self.plan, day_number=1)
+        self.day2 = MealPlanDay.objects.create(meal_plan=self.plan, day_number=2)
+
+    def totals(self, obj):
+        obj.refresh_from_db()
+        return tuple(getattr(obj, field) for field in TOTAL_FIELDS)
+
+    def assertMatchesRecompute(self):
+        stored = [self.totals(obj) for obj in (self.plan, self.day1, self.day2)]
+        recompute([self.plan.pk])
+        self.assertEqual([self.totals(obj) for obj in (self.plan, self.day1, self.day2)], stored)
+
+    def test_entries_move_their_contribution(self):
+        breakfast = MealPlanRecipe.objects.create(meal_plan_day=self.day1, recipe=self.oats, meal_time='breakfast')
+        MealPlanRecipe.objects.create(meal_plan_day=self.day1, recipe=self.rice, meal_time='dinner', servings=Decimal('1.5'))
+        self.assertEqual(self.totals(self.day1), (1300, 45, 210, 23))
+
+        breakfast.servings, breakfast.meal_plan_day = 2, self.day2
+        breakfast.save()
+        self.assertEqual((self.totals(self.day1)[0], self.totals(self.day2)[0], self.totals(self.plan)[0]), (900, 800, 1700))
+
+        breakfast.delete()
+        self.assertEqual(self.totals(self.plan), (900, 30, 150, 15))
+        self.assertMatchesRecompute()
+
+    def test_recipe_edits_fan_out(self):
+        for day in (self.day1, self.day2):
+            MealPlanRecipe.objects.create(meal_plan_day=day, recipe=self.oats, meal_time='breakfast', servings=2)
+        self.oats.calories, self.oats.protein = 450, Decimal('20.5')
+        self.oats.save()
+        self.assertEqual(self.totals(self.day1)[:2], (900, 41))
+        self.assertEqual(self.totals(self.plan)[:2], (1800, 82))
+        self.assertEqual(self.plan.average_calories, 900)
+        self.assertMatchesRecompute()
+
+
+class ApplyMealPlanTest(TestCase):
+    """A plan's days are logged onto the calendar in a fixed number of statements"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('eater')
+        self.start = datetime.date(2024, 4, 1)
+        oats = make_recipe('', name='Oats', calories=400, protein=15, carbs=60, fats=8)
+        rice = make_recipe('', name='Rice', meal_type='dinner', calories=600, protein=20, carbs=100, fats=10)
+        self.plan = MealPlan.objects.create(
+            name='Plan', description='', plan_type='balanced', duration_days=2,
+            daily_calories=2000, daily_protein=150, daily_carbs=200, daily_fats=67,
+        )
+        day1 = MealPlanDay.objects.create(meal_plan=self.plan, day_number=1)
+        day2 = MealPlanDay.objects.create(meal_plan=self.plan, day_number=2)
+        MealPlanRecipe.objects.create(meal_plan_day=day1, recipe=oats, meal_time='breakfast', servings=2)
+        MealPlanRecipe.objects.create(meal_plan_day=day2, recipe=rice, meal_time='dinner', notes='with greens')
+
+    def apply(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return apply_plan(self.plan, self.user, self.start, **kwargs)
+
+    def day_totals(self):
+        return list(NutritionLog.objects.filter(user=self.user).order_by('date').values_list('date', 'total_calories'))
+
+    def test_days_repeat_the_plan(self):
+        self.assertEqual(self.apply(days=3), 3)
+        self.assertEqual(self.day_totals(), [
+            (self.start, 800), (self.start + datetime.timedelta(days=1), 600), (self.start + datetime.timedelta(days=2), 800),
+        ])
+        meal = MealLog.objects.get(meal_type='dinner')
+        self.assertEqual((meal.meal_name, meal.protein, meal.notes), ('Rice', 20, 'with greens'))
+        self.assertEqual(DailyEnergyBalance.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(heatmaps(self.user.id, [2024])['2024']['nutrition']['days'], 3)
+
+    def test_existing_meals_are_kept_unless_replaced(self):
+        log = NutritionLog.objects.create(user=self.user, date=self.start)
+        MealLog.objects.create(nutrition_log=log, meal_type='lunch', meal_name='Soup', calories=300, protein=10, carbs=30, fats=5)
+
+        self.apply()
+        self.assertEqual(self.day_totals()[0], (self.start, 1100))
+        self.apply(replace=True)
+        self.assertEqual(self.day_totals()[0], (self.start, 800))
+        self.assertEqual(MealLog.objects.count(), 2)
+
+    def test_statements_do_not_grow_with_the_range(self):
+        counts = []
+        for start in (self.start, self.start + datetime.timedelta(days=30)):
+            with CaptureQueriesContext(connection) as queries:
+                apply_plan(self.plan, self.user, start, days=2 if not counts else 28)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class CloneMealPlanTest(TestCase):
+    """Clones copy every day and recipe with their totals in a fixed number of statements"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.user = User.objects.create_user('copier', password='pw')
+        self.oats = make_recipe('', name='Oats', calories=400, protein=15, carbs=60, fats=8)
+
+    def make_plan(self, days, is_public=True):
+        plan = MealPlan.objects.create(
+            creator=self.owner, name='Bulk', description='', plan_type='muscle_gain', duration_days=days, is_public=is_public,
+            daily_calories=3000, daily_protein=180, daily_carbs=350, daily_fats=90,
+        )
+        for number in range(1, days + 1):
+            day = MealPlanDay.objects.create(meal_plan=plan, day_number=number, notes=f'day {number}')
+            MealPlanRecipe.objects.create(meal_plan_day=day, recipe=self.oats, meal_time='breakfast', servings=number)
+        plan.refresh_from_db()
+        return plan
+
+    def test_clone_is_a_private_deep_copy(self):
+        plan = self.make_plan(3)
+        clone = clone_plan(plan, self.user)
+
+        self.assertEqual((clone.name, clone.creator, clone.is_public), ('Bulk (copy)', self.user, False))
+        self.assertEqual(clone.total_calories, plan.total_calories)
+        self.assertEqual(
+            list(clone.days.order_by('day_number').values_list('day_number', 'notes', 'total_calories', 'recipes__servings')),
+            list(plan.days.order_by('day_number').values_list('day_number', 'notes', 'total_calories', 'recipes__servings')),
+        )
+        self.assertEqual(MealPlanRecipe.objects.filter(meal_plan_day__meal_plan=plan).count(), 3)
+
+    def test_statements_do_not_grow_with_the_plan(self):
+        counts = []
+        for days in (2, 14):
+            plan = self.make_plan(days)
+            with CaptureQueriesContext(connection) as queries:
+                clone_plan(plan, self.user)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_only_visible_plans_can_be_cloned(self):
+        self.client.force_login(self.user)
+        private = self.make_plan(1, is_public=False)
+        self.assertEqual(self.client.post(f'/nutrition/plans/{private.pk}/clone/').status_code, 404)
+
+        public = self.make_plan(1)
+        response = self.client.post(f'/nutrition/plans/{public.pk}/clone/', {'name': 'Mine'})
+        clone = MealPlan.objects.get(creator=self.user)
+        self.assertEqual(clone.name, 'Mine')
+        self.assertRedirects(response, f'/nutrition/plans/{clone.pk}/edit/', fetch_redirect_response=False)
+
+
+class ShoppingListTest(TestCase):
+    """Ingredients scaled by servings over yield, summed per food in base units and grouped by category"""
+
+    def setUp(self):
+        make_food()
+        make_food(name='Milk', serving_size='1 cup', calories=120, protein=8, carbs=12, fats=5, category='dairy')
+        make_food(name='Egg', serving_size='1 large (50g)', calories=70, protein=6, carbs=0, fats=5, category='protein')
+        self.porridge = make_recipe('200g oats\n2 cups milk\nSalt to taste', servings=2)
+        self.omelette = make_recipe('3 eggs\n0.7 kg oats\n2 tbsp honey', name='Omelette')
+
+    def items(self, categories):
+        return {
+            group['category']: [(item['name'], item['quantity'], item['unit']) for item in group['items']]
+            for group in categories
+        }
+
+    def test_plan_list(self):
+        plan = MealPlan.objects.create(
+            name='Plan', description='', plan_type='balanced', duration_days=2,
+            daily_calories=2000, daily_protein=150, daily_carbs=200, daily_fats=67,
+        )
+        day1 = MealPlanDay.objects.create(meal_plan=plan, day_number=1)
+        day2 = MealPlanDay.objects.create(meal_plan=plan, day_number=2)
+        MealPlanRecipe.objects.create(meal_plan_day=day1, recipe=self.porridge, meal_time='breakfast')
+        MealPlanRecipe.objects.create(meal_plan_day=day1, recipe=self.omelette, meal_time='lunch')
+        MealPlanRecipe.objects.create(meal_plan_day=day2, recipe=self.porridge, meal_time='breakfast', servings=3)
+
+        with self.assertNumQueries(1):
+            categories = plan_shopping_list(plan)
+        self.assertEqual([group['category'] for group in categories], ['protein', 'grain', 'dairy', 'other'])
+        self.assertEqual(self.items(categories), {
+            'protein': [('Egg', 3.0, '')],
+            'grain': [('Oats', 1.1, 'kg')],
+            'dairy': [('Milk', 960.0, 'ml')],
+            'other': [('honey', 30.0, 'ml'), ('Salt to taste', None, '')],
+        })
+
+    def test_logged_list(self):
+        user = User.objects.create_user('eater', password='pw')
+        log = NutritionLog.objects.create(user=user, date=datetime.date(2024, 4, 2))
+        MealLog.objects.create(
+            nutrition_log=log, recipe=self.omelette, meal_type='lunch', meal_name='Omelette', servings=2,
+            calories=0, protein=0, carbs=0, fats=0,
+        )
+        self.client.force_login(user)
+
+        data = self.client.get('/nutrition/log/shopping-list/', {'start': '2024-04-01', 'end': '2024-04-07'}).json()
+        self.assertEqual(self.items(data['categories']), {
+            'protein': [('Egg', 6.0, '')],
+            'grain': [('Oats', 1.4, 'kg')],
+            'other': [('honey', 60.0, 'ml')],
+        })
+        empty = self.client.get('/nutrition/log/shopping-list/', {'start': '2024-04-03', 'end': '2024-04-07'}).json()
+        self.assertEqual(empty['categories'], [])
+
+
+class CopyMealsTest(TestCase):
+    """Meals of past days or slots are logged again with the target days' totals moved by the copies"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('eater')
+        self.monday = datetime.date(2024, 4, 1)
+        for offset, meals in enumerate([[('breakfast', 'Eggs', 200), ('dinner', 'Rice', 600)], [('breakfast', 'Oats', 350)]]):
+            log = NutritionLog.objects.create(user=self.user, date=self.monday + datetime.timedelta(days=offset))
+            for meal_type, name, calories in meals:
+                MealLog.objects.create(
+                    nutrition_log=log, meal_type=meal_type, meal_name=name, calories=calories, protein=10, carbs=20, fats=5, notes='x',
+                )
+
+    def copy(self, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return copy_meals(self.user, *args, **kwargs)
+
+    def day(self, offset):
+        return NutritionLog.objects.get(user=self.user, date=self.monday + datetime.timedelta(days=offset))
+
+    def test_days_are_copied_with_their_totals(self):
+        existing = NutritionLog.objects.create(user=self.user, date=self.monday + datetime.timedelta(days=7), total_calories=100)
+        self.assertEqual(self.copy(self.monday, self.monday + datetime.timedelta(days=7), days=2), 3)
+
+        existing.refresh_from_db()
+        self.assertEqual((existing.total_calories, existing.total_protein), (900, 20))
+        self.assertEqual(self.day(8).total_calories, 350)
+        self.assertEqual(list(self.day(8).meals.values_list('meal_name', 'notes')), [('Oats', 'x')])
+        self.assertTrue(DailyEnergyBalance.objects.filter(user=self.user, date=existing.date).exists())
+
+    def test_one_slot(self):
+        self.assertEqual(self.copy(self.monday, self.monday + datetime.timedelta(days=2), meal_type='dinner'), 1)
+        self.assertEqual(list(self.day(2).meals.values_list('meal_name', flat=True)), ['Rice'])
+        self.assertEqual(self.day(2).total_calories, 600)
+
+    def test_nothing_to_copy(self):
+        self.assertEqual(self.copy(self.monday + datetime.timedelta(days=5), self.monday + datetime.timedelta(days=6)), 0)
+        self.assertFalse(NutritionLog.objects.filter(date=self.monday + datetime.timedelta(days=6)).exists())
+
+    def test_copied_meals_feed_suggestions(self):
+        self.copy(self.monday, self.monday + datetime.timedelta(days=7), meal_type='breakfast')
+        ranked = [row['label'] for row in suggestions(self.user.id)['breakfast']]
+        # Eggs is copied once, so it now ranks above Oats
+        self.assertEqual(ranked, ['Eggs', 'Oats'])
+
+
+class WaterIntakeTest(TestCase):
+    """Each water tap is written as it is acknowledged"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('drinker', password='pw')
+        self.client.force_login(self.user)
+
+    def water(self, day='2024-04-02'):
+        return NutritionLog.objects.get(user=self.user, date=day).water_intake
+
+    def tap(self, **data):
+        return self.client.post('/nutrition/log/water/', {'date': '2024-04-02', **data})
+
+    def test_taps_add_up_immediately(self):
+        self.assertEqual(self.tap().json(), {'date': '2024-04-02', 'water_intake': 0.25})
+        self.assertEqual(self.water(), Decimal('0.25'))
+        self.assertEqual(self.tap(amount='0.5').json()['water_intake'], 0.75)
+        self.assertEqual(self.water(), Decimal('0.75'))
+        self.assertEqual(NutritionLog.objects.filter(user=self.user).count(), 1)
+
+    def test_taps_keep_the_rest_of_the_log(self):
+        NutritionLog.objects.create(user=self.user, date=datetime.date(2024, 4, 2), total_calories=1800, water_intake=1, notes='gym')
+        self.tap()
+        log = NutritionLog.objects.get(user=self.user)
+        self.assertEqual((log.total_calories, log.water_intake, log.notes), (1800, Decimal('1.25'), 'gym'))
+
+    def test_corrections_stop_at_zero(self):
+        self.assertEqual(add_water(self.user.id, datetime.date(2024, 4, 2), Decimal('-1')), Decimal('0.00'))
+        add_water(self.user.id, datetime.date(2024, 4, 2), Decimal('0.5'))
+        self.assertEqual(add_water(self.user.id, datetime.date(2024, 4, 2), Decimal('-2')), Decimal('0.00'))
+        self.assertEqual(self.water(), 0)
+
+    def test_a_tap_on_an_existing_day_is_one_increment(self):
+        day = datetime.date(2024, 4, 2)
+        add_water(self.user.id, day, Decimal('0.1'))
+        with CaptureQueriesContext(connection) as queries:
+            add_water(self.user.id, day, Decimal('0.1'))
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 1)
+        self.assertEqual(add_water(self.user.id, day, Decimal('0.1')), Decimal('0.30'))
+
+    def test_first_taps_racing_for_the_day_both_count(self):
+        day = datetime.date(2024, 4, 2)
+        update = QuerySet.update
+
+        def racing_update(queryset, **values):
+            # Another request creates the day between our UPDATE and INSERT
+            if not NutritionLog.objects.exists():
+                NutritionLog.objects.create(user=self.user, date=day, water_intake=Decimal('0.25'))
+                return 0
+            return update(queryset, **values)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            self.assertEqual(add_water(self.user.id, day, Decimal('0.25')), Decimal('0.50'))
+        self.assertEqual(self.water(), Decimal('0.50'))
+
+    def test_rejects_bad_amounts(self):
+        for amount in ['lots', 'NaN', 'Infinity', '5.01', '-6']:
+            self.assertEqual(self.tap(amount=amount).status_code, 400, amount)
+        self.assertFalse(NutritionLog.objects.exists())
+
+
+class ShardedWaterIntakeTest(ShardedTestCase):
+
+    def test_taps_land_on_the_users_shard(self):
+        user = User.objects.create_user('drinker', password='pw')
+        self.client.force_login(user)
+        self.client.post('/nutrition/log/water/', {'date': '2024-04-02'})
+        self.client.post('/nutrition/log/water/', {'date': '2024-04-02'})
 
-# Create your tests here.
+        log = NutritionLog.objects.using(shard_for_user(user.id)).get(user=user)
+        self.assertEqual(log.water_intake, Decimal('0.50'))
+        self.assertFalse(NutritionLog.objects.using('default').exists())
@@ -12,12 +12,19 @@ urlpatterns = [
     path('plans/<int:plan_id>/', views.meal_plan_detail, name='meal_plan_detail'),
     path('plans/create/', views.create_meal_plan, name='create_meal_plan'),
     path('plans/<int:plan_id>/edit/', views.edit_meal_plan, name='edit_meal_plan'),
+    path('plans/<int:plan_id>/clone/', views.clone_meal_plan, name='clone_meal_plan'),
+    path('plans/<int:plan_id>/generate/', views.generate_meal_plan, name='generate_meal_plan'),
+    path('plans/<int:plan_id>/apply/', views.apply_meal_plan, name='apply_meal_plan'),
+    path('plans/<int:plan_id>/shopping-list/', views.meal_plan_shopping_list, name='meal_plan_shopping_list'),
     
     # Nutrition Logging
     path('log/', views.nutrition_log, name='nutrition_log'),
     path('log/add-meal/', views.add_meal_log, name='add_meal_log'),
+    path('log/copy/', views.copy_meal_log, name='copy_meal_log'),
     path('log/update-water/', views.update_water_intake, name='update_water_intake'),
+    path('log/water/', views.tap_water_intake, name='tap_water_intake'),
     path('log/meal/<int:meal_log_id>/delete/', views.delete_meal_log, name='delete_meal_log'),
+    path('log/shopping-list/', views.shopping_list, name='shopping_list'),
     
     # Statistics
     path('stats/', views.nutrition_stats, name='nutrition_stats'),
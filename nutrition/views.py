@@ -1,12 +1,31 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
+from django.http import JsonResponse
+from django.urls import reverse
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, Greatest
 from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
 from .models import (
     Recipe, MealPlan, MealPlanDay, MealPlanRecipe,
     NutritionLog, MealLog, FoodItem
 )
+from .cloning import clone_plan
+from .foods import log_food_items
+from .plan_totals import MACROS as PLAN_MACROS
+from .planner import DIETS, MEAL_TIME_SOURCES, TOLERANCE, generate_plan
+from .scheduling import apply_plan, copy_meals
+from .shopping import logged_shopping_list, plan_shopping_list
+from .suggestions import suggestions
+from .tasks import recompute_totals
+from .water import add as add_water
+from jobs.queue import enqueue
+
+MAX_APPLY_DAYS = 366
+
+GLASS = Decimal('0.25')
+MAX_WATER_TAP = Decimal('5')
 
 
 @login_required
@@ -42,8 +61,9 @@ def meal_detail(request, meal_id):
     """View recipe/meal details"""
     recipe = get_object_or_404(Recipe, id=meal_id)
     
-    # Parse ingredients into a list
-    ingredients_list = recipe.ingredients.split('\n')
+    # Parsed ingredient lines, falling back to the free text
+    ingredient_items = list(recipe.ingredient_items.select_related('food_item'))
+    ingredients_list = [item.text for item in ingredient_items] or recipe.ingredients.split('\n')
     
     # Parse instructions into steps
     instructions_list = recipe.instructions.split('\n')
@@ -52,6 +72,7 @@ def meal_detail(request, meal_id):
         'title': recipe.name,
         'meal': recipe,
         'ingredients_list': ingredients_list,
+        'ingredient_items': ingredient_items,
         'instructions_list': instructions_list,
     }
     
@@ -82,6 +103,7 @@ def create_recipe(request):
             is_vegan=request.POST.get('is_vegan') == 'on',
             is_gluten_free=request.POST.get('is_gluten_free') == 'on',
             is_dairy_free=request.POST.get('is_dairy_free') == 'on',
+            nutrition_from_ingredients=request.POST.get('nutrition_from_ingredients') == 'on',
             is_public=request.POST.get('is_public') == 'on',
         )
         
@@ -112,9 +134,30 @@ def meal_plans(request):
     if plan_type:
         all_plans = all_plans.filter(plan_type=plan_type)
     
+    # Filter and sort by the planned daily average of each macro
+    all_plans = all_plans.annotate(**{
+        f'daily_{macro}_planned': ExpressionWrapper(
+            Cast(f'total_{macro}', FloatField()) / Greatest(F('duration_days'), 1), output_field=FloatField()
+        )
+        for macro in PLAN_MACROS
+    })
+    for macro in PLAN_MACROS:
+        minimum = request.GET.get(f'min_{macro}')
+        maximum = request.GET.get(f'max_{macro}')
+        if minimum:
+            all_plans = all_plans.filter(**{f'daily_{macro}_planned__gte': minimum})
+        if maximum:
+            all_plans = all_plans.filter(**{f'daily_{macro}_planned__lte': maximum})
+    
+    sort = request.GET.get('sort', '')
+    if sort.lstrip('-') in PLAN_MACROS:
+        descending = '-' if sort.startswith('-') else ''
+        all_plans = all_plans.order_by(f'{descending}daily_{sort.lstrip("-")}_planned')
+    
     context = {
         'title': 'Meal Plans',
         'meal_plans': all_plans,
+        'sort': sort,
     }
     
     return render(request, 'nutrition/meal_plans.html', context)
@@ -162,11 +205,10 @@ def create_meal_plan(request):
             meal_plan.save()
         
         # Create days for this meal plan
-        for day_num in range(1, int(meal_plan.duration_days) + 1):
-            MealPlanDay.objects.create(
-                meal_plan=meal_plan,
-                day_number=day_num
-            )
+        MealPlanDay.objects.bulk_create([
+            MealPlanDay(meal_plan=meal_plan, day_number=day_num)
+            for day_num in range(1, int(meal_plan.duration_days) + 1)
+        ])
         
         messages.success(request, 'Meal plan created! Now add meals to each day.')
         return redirect('edit_meal_plan', plan_id=meal_plan.id)
@@ -195,6 +237,91 @@ def edit_meal_plan(request, plan_id):
     return render(request, 'nutrition/edit_meal_plan.html', context)
 
 
+@login_required
+def clone_meal_plan(request, plan_id):
+    """Copy a visible meal plan into the user's own plans to customize"""
+    meal_plan = get_object_or_404(MealPlan.objects.filter(Q(is_public=True) | Q(creator=request.user)), id=plan_id)
+    
+    if request.method == 'POST':
+        clone = clone_plan(meal_plan, request.user, name=request.POST.get('name') or None)
+        messages.success(request, 'Meal plan copied! You can now customize it.')
+        return redirect('edit_meal_plan', plan_id=clone.id)
+    
+    return redirect('meal_plan_detail', plan_id=meal_plan.id)
+
+
+@login_required
+def generate_meal_plan(request, plan_id):
+    """Fill a meal plan's days from the recipe catalog to match its macro targets"""
+    meal_plan = get_object_or_404(MealPlan, id=plan_id, creator=request.user)
+    
+    if request.method == 'POST':
+        diet = [d for d in request.POST.getlist('diet') if d in DIETS]
+        meal_times = [m for m in request.POST.getlist('meal_times') if m in MEAL_TIME_SOURCES]
+        report = generate_plan(meal_plan, request.user, diet=diet, meal_times=meal_times or None)
+        
+        if not report:
+            messages.error(request, 'No recipes match the selected filters.')
+            return redirect('edit_meal_plan', plan_id=meal_plan.id)
+        
+        on_target = sum(day['within_tolerance'] for day in report)
+        messages.success(request, f'Meal plan generated! {on_target} of {len(report)} days are within {TOLERANCE:.0%} of your targets.')
+        return redirect('meal_plan_detail', plan_id=meal_plan.id)
+    
+    return redirect('edit_meal_plan', plan_id=meal_plan.id)
+
+
+@login_required
+def apply_meal_plan(request, plan_id):
+    """Log every meal of a plan onto the user's calendar from a start date"""
+    meal_plan = get_object_or_404(MealPlan.objects.filter(Q(is_public=True) | Q(creator=request.user)), id=plan_id)
+    
+    if request.method == 'POST':
+        try:
+            start = date.fromisoformat(request.POST.get('start_date', ''))
+        except ValueError:
+            start = date.today()
+        days = request.POST.get('days', '')
+        days = min(int(days), MAX_APPLY_DAYS) if days.isdigit() and int(days) > 0 else None
+        
+        logged = apply_plan(meal_plan, request.user, start, days=days, replace=request.POST.get('replace') == 'on')
+        messages.success(request, f'Meal plan applied! {logged} meals added to your log.')
+        return redirect(f"{reverse('nutrition_log')}?date={start.isoformat()}")
+    
+    return redirect('meal_plan_detail', plan_id=meal_plan.id)
+
+
+@login_required
+def meal_plan_shopping_list(request, plan_id):
+    """Ingredients for a whole meal plan, grouped by food category, as JSON"""
+    meal_plan = get_object_or_404(MealPlan.objects.filter(Q(is_public=True) | Q(creator=request.user)), id=plan_id)
+    
+    return JsonResponse({
+        'meal_plan': meal_plan.id,
+        'categories': plan_shopping_list(meal_plan),
+    })
+
+
+@login_required
+def shopping_list(request):
+    """Ingredients for the recipes logged over a date range (default: the next 7 days), as JSON"""
+    try:
+        start = date.fromisoformat(request.GET.get('start', ''))
+    except ValueError:
+        start = date.today()
+    try:
+        end = date.fromisoformat(request.GET.get('end', ''))
+    except ValueError:
+        end = start + timedelta(days=6)
+    end = min(max(end, start), start + timedelta(days=MAX_APPLY_DAYS))
+    
+    return JsonResponse({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'categories': logged_shopping_list(request.user, start, end),
+    })
+
+
 @login_required
 def nutrition_log(request):
     """View nutrition log"""
@@ -256,6 +383,30 @@ def add_meal_log(request):
             date=log_date
         )
         
+        # One or more items from the food database, e.g. "150 g chicken breast"
+        food_ids = request.POST.getlist('food_item')
+        quantities = request.POST.getlist('quantity')
+        units = request.POST.getlist('unit') or [''] * len(food_ids)
+        if not len(food_ids) == len(quantities) == len(units):
+            messages.error(request, 'Each food item needs a quantity and a unit.')
+            return redirect('add_meal_log')
+        food_items = [
+            (int(food_id), quantity, unit)
+            for food_id, quantity, unit in zip(food_ids, quantities, units)
+            if food_id.isdigit() and quantity
+        ]
+        if food_items:
+            try:
+                log_food_items(
+                    log, request.POST.get('meal_type'), food_items,
+                    time=request.POST.get('time') or None, notes=request.POST.get('notes', ''),
+                )
+            except ValueError as exc:
+                messages.error(request, str(exc))
+                return redirect('add_meal_log')
+            messages.success(request, 'Meal logged successfully!')
+            return redirect('nutrition_log')
+        
         # Get recipe if provided
         recipe_id = request.POST.get('recipe_id')
         recipe = None
@@ -300,21 +451,61 @@ def add_meal_log(request):
             meal_log.photo = request.FILES['photo']
             meal_log.save()
         
+        enqueue(recompute_totals, args=[log.id], dedupe_key=f'nutrition-totals:{log.id}')
+        
         messages.success(request, 'Meal logged successfully!')
         return redirect('nutrition_log')
     
     # Get available recipes for the form
     recipes = Recipe.objects.filter(is_public=True) | Recipe.objects.filter(creator=request.user)
     
+    # Recent and frequent meals per meal type, for one-tap logging
+    recent = suggestions(request.user.id)
+    
     context = {
         'title': 'Add Meal',
         'recipes': recipes,
+        'suggestions': [
+            (meal_type, label, recent[meal_type])
+            for meal_type, label in MealLog.MEAL_TYPE_CHOICES if meal_type in recent
+        ],
         'today': date.today(),
     }
     
     return render(request, 'nutrition/add_meal_log.html', context)
 
 
+@login_required
+def copy_meal_log(request):
+    """Log the meals of a previous day (or week, or one meal slot) again on another date"""
+    if request.method == 'POST':
+        try:
+            target = date.fromisoformat(request.POST.get('target_date', ''))
+        except ValueError:
+            target = date.today()
+        try:
+            source = date.fromisoformat(request.POST.get('source_date', ''))
+        except ValueError:
+            source = target - timedelta(days=1)
+        days = request.POST.get('days', '')
+        days = min(int(days), MAX_APPLY_DAYS) if days.isdigit() and int(days) > 0 else 1
+        meal_type = request.POST.get('meal_type') or None
+        if meal_type not in dict(MealLog.MEAL_TYPE_CHOICES):
+            meal_type = None
+        
+        if source == target:
+            messages.error(request, 'Choose a different date to copy meals to.')
+        else:
+            copied = copy_meals(request.user, source, target, days=days, meal_type=meal_type)
+            if copied:
+                messages.success(request, f'{copied} meals copied!')
+            else:
+                messages.error(request, 'No meals to copy.')
+        return redirect(f"{reverse('nutrition_log')}?date={target.isoformat()}")
+    
+    return redirect('nutrition_log')
+
+
 @login_required
 def update_water_intake(request):
     """Update water intake for today"""
@@ -335,11 +526,37 @@ def update_water_intake(request):
     return redirect('nutrition_log')
 
 
+@login_required
+def tap_water_intake(request):
+    """Add a glass of water (or a signed ``amount`` in liters) to a day, as JSON"""
+    if request.method == 'POST':
+        try:
+            log_date = date.fromisoformat(request.POST.get('date', ''))
+        except ValueError:
+            log_date = date.today()
+        try:
+            amount = Decimal(request.POST.get('amount') or GLASS)
+        except InvalidOperation:
+            amount = None
+        if amount is None or not amount.is_finite() or abs(amount) > MAX_WATER_TAP:
+            return JsonResponse({'error': f'amount must be a number of liters up to {MAX_WATER_TAP}'}, status=400)
+        
+        total = add_water(request.user.id, log_date, amount.quantize(Decimal('0.01')))
+        return JsonResponse({
+            'date': log_date.isoformat(),
+            'water_intake': float(total),
+        })
+    
+    return redirect('nutrition_log')
+
+
 @login_required
 def delete_meal_log(request, meal_log_id):
     """Delete a meal log entry"""
     meal_log = get_object_or_404(MealLog, id=meal_log_id, nutrition_log__user=request.user)
+    log_id = meal_log.nutrition_log_id
     meal_log.delete()
+    enqueue(recompute_totals, args=[log_id], dedupe_key=f'nutrition-totals:{log_id}')
     messages.success(request, 'Meal deleted!')
     return redirect('nutrition_log')
 
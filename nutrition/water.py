@@ -0,0 +1,52 @@
+"""
+Glass-by-glass water intake.
+
+Phones and watches send one request per glass (or per correction), often
+several within a second. Each tap is a single F() increment of the day's
+NutritionLog,
+
+    UPDATE ... SET water_intake = MAX(water_intake + delta, 0)
+
+so concurrent taps add to each other instead of overwriting, and a tap is
+committed before it is acknowledged. The first tap of a day creates the log
+instead, falling back to the increment if another request created it first.
+
+Taps are deliberately not coalesced. A tap is one single-row UPDATE on the
+(user, date) unique index, which is no more work than the INSERT a durable
+pending row would cost, while an in-memory or cache-side buffer (the cache
+is per-process LocMem) would acknowledge taps that a restart can lose and
+that other processes can't see.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core.series import touch
+from .models import NutritionLog
+
+
+def add(user_id, day, amount):
+    """Add ``amount`` litres (negative to take some back) to a user's day, never going below zero; returns the day's total"""
+    using = router.db_for_write(NutritionLog)
+    field = NutritionLog._meta.get_field('water_intake')
+    logs = NutritionLog.objects.using(using).filter(user_id=user_id, date=day)
+    increment = {
+        # The field adapts the amount to its own max_digits and decimal_places
+        'water_intake': Greatest(F('water_intake') + Value(amount, output_field=field), Value(Decimal(0), output_field=field)),
+        'updated_at': timezone.now(),
+    }
+
+    with transaction.atomic(using=using):
+        if not logs.update(**increment):
+            try:
+                with transaction.atomic(using=using):
+                    NutritionLog.objects.using(using).create(user_id=user_id, date=day, water_intake=max(amount, Decimal(0)))
+            except IntegrityError:
+                logs.update(**increment)
+        total = logs.values_list('water_intake', flat=True).get()
+
+    touch(user_id, 'nutrition')
+    return total.quantize(Decimal('0.01'))
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     Exercise, Workout, WorkoutExercise, WorkoutSession,
-    ExerciseLog, PersonalRecord
+    ExerciseLog, PersonalRecord, WeeklyTrainingSummary, ExerciseHistory, SessionTarget
 )
 
 
@@ -139,4 +139,28 @@ class PersonalRecordAdmin(admin.ModelAdmin):
         ('Details', {
             'fields': ('notes', 'achieved_at')
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(WeeklyTrainingSummary)
+class WeeklyTrainingSummaryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'week_start', 'muscle_group', 'sets', 'reps', 'volume', 'sessions', 'minutes']
+    list_filter = ['muscle_group', 'user']
+    search_fields = ['user__username']
+    readonly_fields = ['updated_at']
+    date_hierarchy = 'week_start'
+
+
+@admin.register(ExerciseHistory)
+class ExerciseHistoryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'exercise', 'last_date', 'last_sets', 'last_reps', 'last_weight', 'last_difficulty', 'times_logged']
+    list_filter = ['exercise__muscle_group']
+    search_fields = ['user__username', 'exercise__name']
+    readonly_fields = ['updated_at']
+    date_hierarchy = 'last_date'
+
+
+@admin.register(SessionTarget)
+class SessionTargetAdmin(admin.ModelAdmin):
+    list_display = ['session', 'exercise', 'target_sets', 'target_reps', 'target_weight', 'rationale']
+    search_fields = ['session__user__username', 'exercise__name']
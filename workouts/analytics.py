@@ -0,0 +1,232 @@
+"""
+Training-volume analytics over a user's ExerciseLog history.
+
+All of a user's logs are fetched in one query, and their exercises' muscle
+groups and categories in a second (exercises live on the default database,
+logs possibly on a user shard), into NumPy arrays; weekly and monthly volume,
+per-muscle-group frequency and acute:chronic workload ratios are then
+computed with ``bincount``/``cumsum`` rather than per-row Python loops, so
+a decade of logs is still a few milliseconds of array work.
+
+Volume is sets x reps x weight (kg). Logs without reps or weight count as
+training for frequency but add no volume.
+"""
+import datetime
+
+import numpy as np
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast, Coalesce
+
+from FitTrack.sharding import GLOBAL
+from .models import Exercise, ExerciseLog, WeeklyTrainingSummary
+
+MUSCLE_GROUPS = [key for key, _ in Exercise.MUSCLE_GROUP_CHOICES]
+CATEGORIES = [key for key, _ in Exercise.CATEGORY_CHOICES]
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+
+
+class TrainingLog:
+    """A user's exercise logs as parallel NumPy arrays"""
+    
+    def __init__(self, days, session_ids, exercise_ids, muscle_groups, categories, sets, reps, weights, minutes=None):
+        self.days = days                    # proleptic ordinal of the session date
+        self.session_ids = session_ids
+        self.exercise_ids = exercise_ids
+        self.muscle_groups = muscle_groups  # index into MUSCLE_GROUPS
+        self.categories = categories        # index into CATEGORIES
+        self.sets = sets
+        self.reps = reps
+        self.weights = weights
+        self.minutes = minutes if minutes is not None else np.zeros(len(days))  # session duration, per row
+        self.volume = sets * reps * weights
+    
+    def __len__(self):
+        return len(self.days)
+    
+    @classmethod
+    def for_user(cls, user, since=None, weeks=None):
+        """
+        Load every log for ``user`` in one query, optionally only from
+        ``since`` onwards or only within the weeks starting on ``weeks``.
+        """
+        logs = ExerciseLog.objects.filter(session__user=user)
+        if since:
+            logs = logs.filter(session__scheduled_date__gte=since)
+        if weeks is not None:
+            in_weeks = Q()
+            for week_start in weeks:
+                in_weeks |= Q(session__scheduled_date__range=(week_start, week_start + datetime.timedelta(days=6)))
+            logs = logs.filter(in_weeks) if in_weeks else logs.none()
+        
+        rows = list(logs.order_by().values_list(
+            'session__scheduled_date',
+            'session_id',
+            'exercise_id',
+            'sets_completed',
+            Coalesce('reps_completed', 0),
+            Coalesce(Cast('weight_used', FloatField()), 0.0),
+            Coalesce('session__duration_minutes', 0),
+        ))
+        # Exercises are global: look them up on default rather than joining on the user's shard
+        exercises = {
+            pk: (group, category)
+            for pk, group, category in Exercise.objects.using(GLOBAL).filter(
+                pk__in={row[2] for row in rows}
+            ).values_list('id', 'muscle_group', 'category')
+        }
+        return cls.from_rows([(*row[:3], *exercises[row[2]], *row[3:]) for row in rows])
+    
+    @classmethod
+    def from_rows(cls, rows):
+        n = len(rows)
+        if not n:
+            empty_int, empty_float = np.zeros(0, dtype=np.int64), np.zeros(0)
+            return cls(empty_int, empty_int, empty_int, empty_int, empty_int, empty_float, empty_float, empty_float, empty_float)
+        
+        dates, session_ids, exercise_ids, groups, categories, sets, reps, weights, minutes = zip(*rows)
+        group_index = {key: i for i, key in enumerate(MUSCLE_GROUPS)}
+        category_index = {key: i for i, key in enumerate(CATEGORIES)}
+        
+        return cls(
+            days=np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=n),
+            session_ids=np.array(session_ids, dtype=np.int64),
+            exercise_ids=np.array(exercise_ids, dtype=np.int64),
+            muscle_groups=np.fromiter((group_index[g] for g in groups), dtype=np.int64, count=n),
+            categories=np.fromiter((category_index[c] for c in categories), dtype=np.int64, count=n),
+            sets=np.array(sets, dtype=np.float64),
+            reps=np.array(reps, dtype=np.float64),
+            weights=np.array(weights, dtype=np.float64),
+            minutes=np.array(minutes, dtype=np.float64),
+        )
+
+
+def week_starts(days):
+    """Ordinal of the Monday starting each day's ISO week"""
+    # date.fromordinal(1) is a Monday, so weekday == (ordinal - 1) % 7
+    return days - (days - 1) % 7
+
+
+def _month_keys(days):
+    """year * 12 + (month - 1) for each day ordinal"""
+    # Ordinal 719163 is 1970-01-01, the datetime64 epoch
+    months = (days - 719163).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    return months + 1970 * 12
+
+
+def grouped_sums(period_keys, groups, n_groups, values):
+    """Sum ``values`` per (period, group); returns (periods, matrix[period, group])"""
+    periods, period_index = np.unique(period_keys, return_inverse=True)
+    flat = period_index * n_groups + groups
+    sums = np.bincount(flat, weights=values, minlength=len(periods) * n_groups)
+    return periods, sums.reshape(len(periods), n_groups)
+
+
+def grouped_frequency(period_keys, groups, n_groups, session_ids):
+    """Distinct sessions per (period, group)"""
+    # One row per (session, group) pair; a session falls in exactly one period
+    _, first = np.unique(session_ids * n_groups + groups, return_index=True)
+    return grouped_sums(period_keys[first], groups[first], n_groups, np.ones(len(first)))
+
+
+def volume_by_period(log, period='week', by='muscle_group'):
+    """Volume and session frequency per period, split by muscle group or category"""
+    labels = MUSCLE_GROUPS if by == 'muscle_group' else CATEGORIES
+    groups = log.muscle_groups if by == 'muscle_group' else log.categories
+    
+    if not len(log):
+        return {'periods': [], 'groups': labels, 'volume': [], 'frequency': []}
+    
+    if period == 'month':
+        keys = _month_keys(log.days)
+    else:
+        keys = week_starts(log.days)
+    
+    periods, volume = grouped_sums(keys, groups, len(labels), log.volume)
+    _, frequency = grouped_frequency(keys, groups, len(labels), log.session_ids)
+    
+    if period == 'month':
+        period_labels = [f'{k // 12}-{k % 12 + 1:02d}' for k in periods.tolist()]
+    else:
+        period_labels = [datetime.date.fromordinal(k).isoformat() for k in periods.tolist()]
+    
+    return {
+        'periods': period_labels,
+        'groups': labels,
+        'volume': np.round(volume, 1).tolist(),
+        'frequency': frequency.astype(np.int64).tolist(),
+    }
+
+
+def workload_ratios(log, until=None, weeks=12):
+    """
+    Acute:chronic workload ratio for the last ``weeks`` weeks, sampled at the
+    end of each week: 7-day load divided by the 28-day average weekly load.
+    """
+    until = (until or datetime.date.today()).toordinal()
+    start = until - weeks * 7 - CHRONIC_DAYS + 1
+    
+    mask = (log.days >= start) & (log.days <= until)
+    daily = np.bincount(log.days[mask] - start, weights=log.volume[mask], minlength=until - start + 1)
+    cumulative = np.concatenate([[0.0], np.cumsum(daily)])
+    
+    ends = np.arange(until - (weeks - 1) * 7, until + 1, 7) - start + 1
+    acute = cumulative[ends] - cumulative[ends - ACUTE_DAYS]
+    chronic = (cumulative[ends] - cumulative[ends - CHRONIC_DAYS]) / (CHRONIC_DAYS / ACUTE_DAYS)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(chronic > 0, acute / chronic, np.nan)
+    
+    return {
+        'dates': [datetime.date.fromordinal(int(e) + start - 1).isoformat() for e in ends],
+        'acute': np.round(acute, 1).tolist(),
+        'chronic': np.round(chronic, 1).tolist(),
+        'ratio': [None if np.isnan(r) else round(float(r), 2) for r in ratio],
+    }
+
+
+def materialized_weekly_volume(user):
+    """Weekly volume and frequency per muscle group from WeeklyTrainingSummary"""
+    rows = list(WeeklyTrainingSummary.objects.filter(user=user).order_by().values_list(
+        'week_start', 'muscle_group', 'volume', 'sessions'
+    ))
+    if not rows:
+        return {'periods': [], 'groups': MUSCLE_GROUPS, 'volume': [], 'frequency': []}
+    
+    group_index = {key: i for i, key in enumerate(MUSCLE_GROUPS)}
+    weeks, groups, volume, sessions = zip(*rows)
+    days = np.fromiter((w.toordinal() for w in weeks), dtype=np.int64, count=len(rows))
+    groups = np.fromiter((group_index[g] for g in groups), dtype=np.int64, count=len(rows))
+    
+    periods, volume = grouped_sums(days, groups, len(MUSCLE_GROUPS), np.array(volume, dtype=np.float64))
+    _, frequency = grouped_sums(days, groups, len(MUSCLE_GROUPS), np.array(sessions, dtype=np.float64))
+    
+    return {
+        'periods': [datetime.date.fromordinal(k).isoformat() for k in periods.tolist()],
+        'groups': MUSCLE_GROUPS,
+        'volume': np.round(volume, 1).tolist(),
+        'frequency': frequency.astype(np.int64).tolist(),
+    }
+
+
+def training_summary(user, period='week', by='muscle_group', weeks=12):
+    """Everything the training-volume page and JSON endpoint serve"""
+    if period == 'week' and by == 'muscle_group':
+        # The default view is served from the materialized weekly table,
+        # after catching up on weeks whose refresh job hasn't run yet
+        from .summaries import refresh_dirty
+        refresh_dirty(user.id)
+        volume = materialized_weekly_volume(user)
+    else:
+        volume = volume_by_period(TrainingLog.for_user(user), period=period, by=by)
+    
+    # Workload ratios only need the last few months of daily detail
+    since = datetime.date.today() - datetime.timedelta(days=weeks * 7 + CHRONIC_DAYS)
+    recent = TrainingLog.for_user(user, since=since)
+    
+    return {
+        'total_volume': round(float(np.sum(volume['volume'])), 1),
+        'volume': volume,
+        'workload': workload_ratios(recent, weeks=weeks),
+    }
@@ -0,0 +1,28 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from FitTrack.parallel import map_in_processes
+
+
+class Command(BaseCommand):
+    help = 'Recompute WeeklyTrainingSummary rows from ExerciseLog history, in parallel across users'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--processes', type=int, default=None, help='Worker processes (default: one per CPU)')
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only rebuild these user ids')
+    
+    def handle(self, *args, **options):
+        user_ids = options['users'] or list(User.objects.values_list('id', flat=True))
+        started = time.perf_counter()
+        
+        total = 0
+        results = map_in_processes('workouts.summaries.rebuild_user', user_ids, processes=options['processes'])
+        for user_id, rows in results:
+            total += rows
+            if options['verbosity'] > 1:
+                self.stdout.write(f'User {user_id}: {rows} rows')
+        
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} summary rows for {len(user_ids)} users in {elapsed:.1f}s'))
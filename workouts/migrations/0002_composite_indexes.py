@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['category', 'name'], name='exercise_category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['muscle_group', 'name'], name='exercise_muscle_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciselog',
+            index=models.Index(fields=['exercise', 'session'], name='exlog_exercise_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-created_at'], name='workout_public_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutsession',
+            index=models.Index(fields=['user', 'scheduled_date', 'status'], name='session_user_date_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutsession',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['user', 'scheduled_date'], name='session_user_completed_idx'),
+        ),
+    ]
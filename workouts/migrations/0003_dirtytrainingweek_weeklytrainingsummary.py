@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:18
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    """Summarise existing logs per (user, ISO week, muscle group)"""
+    Exercise = apps.get_model('workouts', 'Exercise')
+    ExerciseLog = apps.get_model('workouts', 'ExerciseLog')
+    WeeklyTrainingSummary = apps.get_model('workouts', 'WeeklyTrainingSummary')
+    db = schema_editor.connection.alias
+
+    # Exercises stay on default when the logs live on a user shard
+    muscle_groups = dict(Exercise.objects.using('default').values_list('id', 'muscle_group'))
+
+    rows = ExerciseLog.objects.using(db).order_by().values_list(
+        'session__user_id', 'session_id', 'session__scheduled_date', 'session__duration_minutes',
+        'exercise_id', 'sets_completed', 'reps_completed', 'weight_used',
+    )
+    totals = {}
+    for user_id, session_id, day, minutes, exercise_id, sets, reps, weight in rows.iterator():
+        group = muscle_groups.get(exercise_id)
+        if group is None:
+            continue
+        week_start = day - datetime.timedelta(days=day.weekday())
+        summary = totals.setdefault((user_id, week_start, group), {
+            'sets': 0, 'reps': 0, 'volume': 0.0, 'sessions': set(), 'minutes': 0,
+        })
+        summary['sets'] += sets
+        summary['reps'] += sets * (reps or 0)
+        summary['volume'] += sets * (reps or 0) * float(weight or 0)
+        # Sessions and minutes count once per (session, muscle group)
+        if session_id not in summary['sessions']:
+            summary['sessions'].add(session_id)
+            summary['minutes'] += minutes or 0
+
+    WeeklyTrainingSummary.objects.using(db).bulk_create([
+        WeeklyTrainingSummary(
+            user_id=user_id, week_start=week_start, muscle_group=group,
+            sets=summary['sets'], reps=summary['reps'], volume=round(summary['volume'], 2),
+            sessions=len(summary['sessions']), minutes=summary['minutes'],
+        )
+        for (user_id, week_start, group), summary in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0002_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyTrainingWeek',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('marked_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dirty_training_weeks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Dirty Training Week',
+                'verbose_name_plural': 'Dirty Training Weeks',
+                'unique_together': {('user', 'week_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='WeeklyTrainingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField(help_text='Monday of the ISO week')),
+                ('muscle_group', models.CharField(choices=[('chest', 'Chest'), ('back', 'Back'), ('shoulders', 'Shoulders'), ('arms', 'Arms'), ('legs', 'Legs'), ('core', 'Core'), ('full_body', 'Full Body')], max_length=20)),
+                ('sets', models.IntegerField(default=0)),
+                ('reps', models.IntegerField(default=0, help_text='Total reps across all sets')),
+                ('volume', models.FloatField(default=0, help_text='Sets × reps × weight in kg')),
+                ('sessions', models.IntegerField(default=0, help_text='Sessions that trained this muscle group')),
+                ('minutes', models.IntegerField(default=0, help_text='Duration of those sessions')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_training_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Weekly Training Summary',
+                'verbose_name_plural': 'Weekly Training Summaries',
+                'ordering': ['-week_start', 'muscle_group'],
+                'unique_together': {('user', 'week_start', 'muscle_group')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_histories(apps, schema_editor):
+    """One pass over existing logs, newest first per (user, exercise)"""
+    ExerciseLog = apps.get_model('workouts', 'ExerciseLog')
+    ExerciseHistory = apps.get_model('workouts', 'ExerciseHistory')
+    db = schema_editor.connection.alias
+
+    rows = ExerciseLog.objects.using(db).order_by(
+        'session__user_id', 'exercise_id', '-session__scheduled_date', '-created_at'
+    ).values_list(
+        'session__user_id', 'exercise_id', 'session_id', 'session__scheduled_date',
+        'session__difficulty_rating', 'sets_completed', 'reps_completed', 'weight_used',
+    )
+
+    histories = {}
+    for user_id, exercise_id, session_id, day, rating, sets, reps, weight in rows.iterator():
+        history = histories.get((user_id, exercise_id))
+        if history is None:
+            histories[(user_id, exercise_id)] = ExerciseHistory(
+                user_id=user_id, exercise_id=exercise_id, last_session_id=session_id,
+                last_date=day, last_sets=sets, last_reps=reps, last_weight=weight,
+                last_difficulty=rating, times_logged=1,
+            )
+        else:
+            history.times_logged += 1
+    ExerciseHistory.objects.using(db).bulk_create(histories.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0003_dirtytrainingweek_weeklytrainingsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_date', models.DateField()),
+                ('last_sets', models.IntegerField(default=0)),
+                ('last_reps', models.IntegerField(blank=True, null=True)),
+                ('last_weight', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('last_difficulty', models.IntegerField(blank=True, help_text='Session difficulty rating (1-5)', null=True)),
+                ('times_logged', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='histories', to='workouts.exercise')),
+                ('last_session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='workouts.workoutsession')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exercise_histories', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Exercise History',
+                'verbose_name_plural': 'Exercise Histories',
+                'unique_together': {('user', 'exercise')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SessionTarget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_sets', models.IntegerField()),
+                ('target_reps', models.IntegerField(blank=True, null=True)),
+                ('target_weight', models.DecimalField(blank=True, decimal_places=2, help_text='Weight in kg', max_digits=6, null=True)),
+                ('rationale', models.CharField(blank=True, max_length=200)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='session_targets', to='workouts.exercise')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='targets', to='workouts.workoutsession')),
+            ],
+            options={
+                'verbose_name': 'Session Target',
+                'verbose_name_plural': 'Session Targets',
+                'unique_together': {('session', 'exercise')},
+            },
+        ),
+        migrations.RunPython(backfill_histories, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
 
 
 class Exercise(models.Model):
@@ -59,6 +62,10 @@ class Exercise(models.Model):
         ordering = ['name']
         verbose_name = "Exercise"
         verbose_name_plural = "Exercises"
+        indexes = [
+            models.Index(fields=['category', 'name'], name='exercise_category_name_idx'),
+            models.Index(fields=['muscle_group', 'name'], name='exercise_muscle_name_idx'),
+        ]
 
 
 class Workout(models.Model):
@@ -105,6 +112,9 @@ class Workout(models.Model):
         ordering = ['-created_at']
         verbose_name = "Workout"
         verbose_name_plural = "Workouts"
+        indexes = [
+            models.Index(fields=['-created_at'], condition=Q(is_public=True), name='workout_public_recent_idx'),
+        ]
 
 
 class WorkoutExercise(models.Model):
@@ -170,6 +180,10 @@ class WorkoutSession(models.Model):
         ordering = ['-scheduled_date']
         verbose_name = "Workout Session"
         verbose_name_plural = "Workout Sessions"
+        indexes = [
+            models.Index(fields=['user', 'scheduled_date', 'status'], name='session_user_date_status_idx'),
+            models.Index(fields=['user', 'scheduled_date'], condition=Q(status='completed'), name='session_user_completed_idx'),
+        ]
 
 
 class ExerciseLog(models.Model):
@@ -193,10 +207,18 @@ class ExerciseLog(models.Model):
     def __str__(self):
         return f"{self.session.user.username} - {self.exercise.name}"
     
+    @property
+    def volume(self):
+        """Sets x reps x weight in kg (0 for unweighted or timed work)"""
+        return float(self.sets_completed or 0) * float(self.reps_completed or 0) * float(self.weight_used or 0)
+    
     class Meta:
         ordering = ['session', 'created_at']
         verbose_name = "Exercise Log"
         verbose_name_plural = "Exercise Logs"
+        indexes = [
+            models.Index(fields=['exercise', 'session'], name='exlog_exercise_session_idx'),
+        ]
 
 
 class PersonalRecord(models.Model):
@@ -226,4 +248,204 @@ class PersonalRecord(models.Model):
         ordering = ['-achieved_at']
         verbose_name = "Personal Record"
         verbose_name_plural = "Personal Records"
-        unique_together = ['user', 'exercise', 'record_type']
\ No newline at end of file
+        unique_together = ['user', 'exercise', 'record_type']
+
+
+class WeeklyTrainingSummary(models.Model):
+    """Materialized per-week training totals for one muscle group"""
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='weekly_training_summaries')
+    week_start = models.DateField(help_text="Monday of the ISO week")
+    muscle_group = models.CharField(max_length=20, choices=Exercise.MUSCLE_GROUP_CHOICES)
+    
+    # Totals
+    sets = models.IntegerField(default=0)
+    reps = models.IntegerField(default=0, help_text="Total reps across all sets")
+    volume = models.FloatField(default=0, help_text="Sets × reps × weight in kg")
+    sessions = models.IntegerField(default=0, help_text="Sessions that trained this muscle group")
+    minutes = models.IntegerField(default=0, help_text="Duration of those sessions")
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.muscle_group} week of {self.week_start}"
+    
+    @property
+    def iso_week(self):
+        """(ISO year, ISO week number)"""
+        year, week, _ = self.week_start.isocalendar()
+        return year, week
+    
+    class Meta:
+        ordering = ['-week_start', 'muscle_group']
+        unique_together = ['user', 'week_start', 'muscle_group']
+        verbose_name = "Weekly Training Summary"
+        verbose_name_plural = "Weekly Training Summaries"
+
+
+class DirtyTrainingWeek(models.Model):
+    """Queue of weeks whose WeeklyTrainingSummary rows need recomputing"""
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='dirty_training_weeks')
+    week_start = models.DateField()
+    
+    marked_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - week of {self.week_start}"
+    
+    class Meta:
+        unique_together = ['user', 'week_start']
+        verbose_name = "Dirty Training Week"
+        verbose_name_plural = "Dirty Training Weeks"
+
+
+class ExerciseHistory(models.Model):
+    """A user's latest performance of an exercise, kept current on every log"""
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exercise_histories')
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, related_name='histories')
+    last_session = models.ForeignKey(WorkoutSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    
+    # Last performance
+    last_date = models.DateField()
+    last_sets = models.IntegerField(default=0)
+    last_reps = models.IntegerField(null=True, blank=True)
+    last_weight = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    last_difficulty = models.IntegerField(null=True, blank=True, help_text="Session difficulty rating (1-5)")
+    
+    times_logged = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.exercise.name} ({self.last_date})"
+    
+    class Meta:
+        unique_together = ['user', 'exercise']
+        verbose_name = "Exercise History"
+        verbose_name_plural = "Exercise Histories"
+
+
+class SessionTarget(models.Model):
+    """Prescribed load for one exercise in a workout session"""
+    
+    session = models.ForeignKey(WorkoutSession, on_delete=models.CASCADE, related_name='targets')
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, related_name='session_targets')
+    
+    target_sets = models.IntegerField()
+    target_reps = models.IntegerField(null=True, blank=True)
+    target_weight = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True, help_text="Weight in kg")
+    
+    rationale = models.CharField(max_length=200, blank=True)
+    
+    def __str__(self):
+        return f"{self.session} - {self.exercise.name}"
+    
+    class Meta:
+        unique_together = ['session', 'exercise']
+        verbose_name = "Session Target"
+        verbose_name_plural = "Session Targets"
+
+
+@receiver(pre_save, sender=WorkoutSession)
+def remember_session_week(sender, instance, **kwargs):
+    """Keep the previous date and status so receivers can tell what changed"""
+    if instance.pk:
+        previous = WorkoutSession.objects.filter(pk=instance.pk).values_list('scheduled_date', 'status').first()
+        instance._previous_scheduled_date, instance._previous_status = previous or (None, None)
+
+
+@receiver(post_save, sender=WorkoutSession)
+@receiver(post_delete, sender=WorkoutSession)
+def session_changed(sender, instance, **kwargs):
+    """Mark the session's week(s) for a training summary refresh and update the energy balance"""
+    from core.energy import refresh_days
+    from .summaries import mark_dirty
+    dates = [d for d in {instance.scheduled_date, getattr(instance, '_previous_scheduled_date', None)} if d]
+    mark_dirty(instance.user_id, dates)
+    refresh_days(instance.user_id, dates)
+
+
+@receiver(post_save, sender=WorkoutSession)
+@receiver(post_delete, sender=WorkoutSession)
+def session_activity(sender, instance, signal, **kwargs):
+    """Keep the training-day bitmap in step with completed sessions"""
+    from core.activity import mark, sync_day
+    previous = getattr(instance, '_previous_scheduled_date', None)
+    if previous and str(previous) != str(instance.scheduled_date):
+        sync_day(instance.user_id, 'workout', previous)
+    if signal is post_save and instance.status == 'completed':
+        mark(instance.user_id, 'workout', instance.scheduled_date)
+    elif not kwargs.get('created'):
+        sync_day(instance.user_id, 'workout', instance.scheduled_date)
+
+
+@receiver(post_save, sender=WorkoutSession)
+@receiver(post_delete, sender=WorkoutSession)
+def session_streak(sender, instance, signal, **kwargs):
+    """Advance the user's training streak when a session is completed"""
+    from core.streaks import rebuild_user, record_completion
+    was_completed = getattr(instance, '_previous_status', None) == 'completed'
+    moved = str(getattr(instance, '_previous_scheduled_date', None)) != str(instance.scheduled_date)
+    
+    if signal is post_delete:
+        if instance.status == 'completed':
+            rebuild_user(instance.user_id)
+    elif instance.status == 'completed' and not was_completed:
+        record_completion(instance.user_id, instance.scheduled_date)
+    elif was_completed and (instance.status != 'completed' or moved):
+        rebuild_user(instance.user_id)
+
+
+@receiver(post_save, sender=WorkoutSession)
+def session_rated(sender, instance, **kwargs):
+    """Feed the session's difficulty rating into the exercise histories"""
+    if instance.status == 'completed' and instance.difficulty_rating:
+        ExerciseHistory.objects.filter(user_id=instance.user_id, last_session=instance).update(
+            last_difficulty=instance.difficulty_rating
+        )
+
+
+@receiver(pre_save, sender=ExerciseLog)
+def remember_log_volume(sender, instance, **kwargs):
+    """Keep the previous volume so the change can be counted"""
+    previous = None
+    if instance.pk:
+        previous = ExerciseLog.objects.filter(pk=instance.pk).values_list('sets_completed', 'reps_completed', 'weight_used').first()
+    instance._previous_volume = ExerciseLog(sets_completed=previous[0], reps_completed=previous[1], weight_used=previous[2]).volume if previous else 0
+
+
+@receiver(post_save, sender=ExerciseLog)
+@receiver(post_delete, sender=ExerciseLog)
+def exercise_log_changed(sender, instance, signal, **kwargs):
+    """Refresh derived per-exercise state (summaries, strength curve, history) and lifted volume"""
+    from core.achievements import emit
+    from .prescription import update_history
+    from .progression import invalidate
+    from .summaries import mark_dirty
+    if ExerciseLog.session.is_cached(instance):
+        session = (instance.session.user_id, instance.session.scheduled_date)
+    else:
+        session = WorkoutSession.objects.filter(pk=instance.session_id).values_list('user_id', 'scheduled_date').first()
+    if session:
+        mark_dirty(session[0], [session[1]])
+        invalidate(session[0], instance.exercise_id)
+        update_history(session[0], instance.exercise_id)
+        
+        if signal is post_delete:
+            change = -instance.volume
+        else:
+            change = instance.volume - getattr(instance, '_previous_volume', 0)
+        emit(session[0], 'exercise_logged', add={'total_volume': change})
+
+
+@receiver(post_save, sender=PersonalRecord)
+@receiver(post_delete, sender=PersonalRecord)
+def personal_record_set(sender, instance, signal, created=False, **kwargs):
+    """Count records held (one per exercise and record type); improving one doesn't add another"""
+    from core.achievements import emit
+    if signal is post_delete:
+        emit(instance.user_id, 'personal_record_deleted', add={'personal_records': -1})
+    elif created:
+        emit(instance.user_id, 'personal_record', add={'personal_records': 1})
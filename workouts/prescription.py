@@ -0,0 +1,124 @@
+"""
+Progressive-overload prescriptions.
+
+Each user keeps one ExerciseHistory row per exercise holding their latest
+performance; it is rewritten whenever a log for that exercise changes, so
+starting a session never has to scan the log table. Targets follow a double
+progression scheme:
+
+- hit every set and rep at a comfortable rating: add weight, reset reps
+- hit the reps but rated the session hard: keep the weight, add a rep
+- fell short by a rep or two: repeat the same load
+- missed badly or rated it maximal: deload
+
+Prescribing for a whole workout is three queries regardless of its length:
+the workout's exercises, the matching histories and one bulk insert.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from .models import ExerciseHistory, ExerciseLog, SessionTarget, WorkoutExercise
+
+INCREMENTS = {
+    'legs': Decimal('5'),
+    'full_body': Decimal('5'),
+}
+DEFAULT_INCREMENT = Decimal('2.5')
+WEIGHT_STEP = Decimal('0.5')
+
+DELOAD = Decimal('0.9')
+MAX_EXTRA_REPS = 2
+MISS_TOLERANCE = 2
+
+HARD_RATING = 4
+MAX_RATING = 5
+
+
+def round_weight(weight):
+    """Round to the nearest loadable step"""
+    return (weight / WEIGHT_STEP).quantize(Decimal('1'), rounding=ROUND_HALF_UP) * WEIGHT_STEP
+
+
+def update_history(user_id, exercise_id):
+    """Rewrite the history row from the user's latest log of the exercise"""
+    logs = ExerciseLog.objects.filter(session__user_id=user_id, exercise_id=exercise_id)
+    latest = logs.order_by('-session__scheduled_date', '-created_at').values(
+        'session_id', 'session__scheduled_date', 'session__difficulty_rating',
+        'sets_completed', 'reps_completed', 'weight_used',
+    ).first()
+    if latest is None:
+        ExerciseHistory.objects.filter(user_id=user_id, exercise_id=exercise_id).delete()
+        return
+
+    ExerciseHistory.objects.update_or_create(
+        user_id=user_id,
+        exercise_id=exercise_id,
+        defaults={
+            'last_session_id': latest['session_id'],
+            'last_date': latest['session__scheduled_date'],
+            'last_sets': latest['sets_completed'],
+            'last_reps': latest['reps_completed'],
+            'last_weight': latest['weight_used'],
+            'last_difficulty': latest['session__difficulty_rating'],
+            'times_logged': logs.count(),
+        },
+    )
+
+
+def prescribe(workout_exercise, history):
+    """
+    Return (sets, reps, weight, rationale) for one exercise of a workout.
+    Timed exercises and exercises never done with weight keep the template.
+    """
+    sets, reps = workout_exercise.sets, workout_exercise.reps
+    if not reps or history is None or not history.last_reps:
+        return sets, reps, None, 'Following the workout plan'
+
+    weight = history.last_weight
+    if not weight:
+        return sets, reps, None, 'Following the workout plan'
+
+    increment = INCREMENTS.get(workout_exercise.exercise.muscle_group, DEFAULT_INCREMENT)
+    rating = history.last_difficulty
+    completed = history.last_sets >= sets and history.last_reps >= reps
+
+    if rating == MAX_RATING or history.last_reps < reps - MISS_TOLERANCE:
+        return sets, reps, round_weight(weight * DELOAD), 'Deload after a tough session'
+    if completed and (rating or 0) < HARD_RATING:
+        return sets, reps, weight + increment, f'Add {increment:g} kg'
+    if completed:
+        target_reps = min(history.last_reps + 1, reps + MAX_EXTRA_REPS)
+        if target_reps == history.last_reps:
+            return sets, reps, weight + increment, f'Add {increment:g} kg'
+        return sets, target_reps, weight, 'Same weight, one more rep'
+    return sets, reps, weight, 'Repeat last load'
+
+
+def create_targets(session):
+    """Prescribe every exercise of the session's workout in one pass"""
+    workout_exercises = list(
+        WorkoutExercise.objects.filter(workout_id=session.workout_id).select_related('exercise')
+    )
+    histories = {
+        h.exercise_id: h
+        for h in ExerciseHistory.objects.filter(
+            user_id=session.user_id,
+            exercise_id__in=[we.exercise_id for we in workout_exercises],
+        )
+    }
+
+    targets = {}
+    for we in workout_exercises:
+        if we.exercise_id in targets:
+            continue
+        sets, reps, weight, rationale = prescribe(we, histories.get(we.exercise_id))
+        targets[we.exercise_id] = SessionTarget(
+            session=session,
+            exercise_id=we.exercise_id,
+            target_sets=sets,
+            target_reps=reps,
+            target_weight=weight,
+            rationale=rationale,
+        )
+
+    SessionTarget.objects.bulk_create(targets.values())
+    return targets
@@ -0,0 +1,177 @@
+"""
+Strength progression curves and plateau detection.
+
+For every exercise a user has logged with weight and reps, the best
+estimated one-rep max (Epley) per training day forms a trend. A Theil-Sen
+line (median of pairwise slopes, robust to the odd bad day) is fitted over
+the sessions in the rolling window, and its slope classifies the exercise as
+progressing, plateaued or regressing and projects it forward.
+
+All exercises are fitted together: the per-exercise windows are padded into
+one [exercise, point] matrix and the pairwise slopes are taken as a single
+[exercise, point, point] array. Results are cached per (user, exercise) and
+dropped when a log for that exercise is written.
+"""
+import datetime
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .models import ExerciseLog
+
+WINDOW_DAYS = 84
+MAX_POINTS = 24
+MIN_POINTS = 4
+MIN_SPAN_DAYS = 21
+
+# Change in e1RM over four weeks, relative to the current level
+PLATEAU_BAND = 0.01
+REGRESSION_THRESHOLD = -0.025
+
+PROJECTION_WEEKS = (4, 8, 12)
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def estimated_1rm(weight, reps):
+    """Epley estimate; a single rep is the weight itself"""
+    return np.where(reps <= 1, weight, weight * (1 + reps / 30.0))
+
+
+def cache_key(user_id, exercise_id):
+    return f'progression:{user_id}:{exercise_id}'
+
+
+def invalidate(user_id, exercise_id):
+    """Forget the cached curve after a log for this exercise changes"""
+    cache.delete(cache_key(user_id, exercise_id))
+
+
+def load_daily_bests(user_id, exercise_ids=None):
+    """
+    One query for the user's weighted sets; returns (exercise_ids, days, e1rm)
+    arrays holding the best e1RM per exercise per day, sorted by exercise then day.
+    """
+    logs = ExerciseLog.objects.filter(
+        session__user_id=user_id,
+        weight_used__gt=0,
+        reps_completed__gt=0,
+    )
+    if exercise_ids is not None:
+        logs = logs.filter(exercise_id__in=exercise_ids)
+    
+    rows = list(logs.order_by().values_list(
+        'exercise_id', 'session__scheduled_date', Cast('weight_used', FloatField()), 'reps_completed'
+    ))
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    
+    exercises, dates, weights, reps = zip(*rows)
+    exercises = np.array(exercises, dtype=np.int64)
+    days = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(rows))
+    e1rm = estimated_1rm(np.array(weights), np.array(reps, dtype=np.float64))
+    
+    # Sort by exercise, day, then e1RM descending and keep the first of each (exercise, day)
+    order = np.lexsort((-e1rm, days, exercises))
+    exercises, days, e1rm = exercises[order], days[order], e1rm[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = (exercises[1:] != exercises[:-1]) | (days[1:] != days[:-1])
+    return exercises[keep], days[keep], e1rm[keep]
+
+
+def fit_trends(exercises, days, e1rm, today=None):
+    """Theil-Sen fit of every exercise's window in one vectorized pass"""
+    today = (today or datetime.date.today()).toordinal()
+    unique, starts, counts = np.unique(exercises, return_index=True, return_counts=True)
+    if not len(unique):
+        return {}
+    
+    # Last MAX_POINTS days within the window for each exercise, right-aligned
+    in_window = days >= today - WINDOW_DAYS
+    n = len(unique)
+    x = np.full((n, MAX_POINTS), np.nan)
+    y = np.full((n, MAX_POINTS), np.nan)
+    group = np.repeat(np.arange(n), counts)
+    rank_from_end = (starts + counts)[group] - 1 - np.arange(len(exercises))
+    use = in_window & (rank_from_end < MAX_POINTS)
+    col = MAX_POINTS - 1 - rank_from_end[use]
+    x[group[use], col] = days[use] - today
+    y[group[use], col] = e1rm[use]
+    
+    # Pairwise slopes for j > i, NaN elsewhere
+    dx = x[:, None, :] - x[:, :, None]
+    dy = y[:, None, :] - y[:, :, None]
+    upper = np.triu(np.ones((MAX_POINTS, MAX_POINTS), dtype=bool), k=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.where(upper & (dx > 0), dy / dx, np.nan).reshape(n, -1)
+        points = np.sum(~np.isnan(x), axis=1)
+        has_fit = points >= 2
+        slope = np.full(n, np.nan)
+        slope[has_fit] = np.nanmedian(slopes[has_fit], axis=1)
+        # Rows without a fit are all NaN; leave them out of the reductions
+        intercept = np.full(n, np.nan)
+        intercept[has_fit] = np.nanmedian((y - slope[:, None] * x)[has_fit], axis=1)
+        span = np.zeros(n)
+        span[has_fit] = np.nanmax(x[has_fit], axis=1) - np.nanmin(x[has_fit], axis=1)
+    
+    results = {}
+    for i, exercise_id in enumerate(unique.tolist()):
+        history = slice(starts[i], starts[i] + counts[i])
+        result = {
+            'exercise_id': exercise_id,
+            'dates': [datetime.date.fromordinal(d).isoformat() for d in days[history].tolist()],
+            'e1rm': np.round(e1rm[history], 1).tolist(),
+            'points_in_window': int(points[i]),
+            'status': 'insufficient_data',
+            'slope_per_week': None,
+            'current': None,
+            'projections': {},
+        }
+        
+        if points[i] >= MIN_POINTS and span[i] >= MIN_SPAN_DAYS and not np.isnan(slope[i]):
+            level = float(intercept[i])
+            change_4w = slope[i] * 28 / level if level > 0 else 0.0
+            if change_4w <= REGRESSION_THRESHOLD:
+                status = 'regressing'
+            elif abs(change_4w) < PLATEAU_BAND:
+                status = 'plateau'
+            elif change_4w > 0:
+                status = 'progressing'
+            else:
+                status = 'plateau'
+            
+            result.update({
+                'status': status,
+                'slope_per_week': round(float(slope[i] * 7), 2),
+                'current': round(level, 1),
+                'projections': {
+                    f'{weeks}w': round(max(0.0, level + float(slope[i]) * weeks * 7), 1)
+                    for weeks in PROJECTION_WEEKS
+                },
+            })
+        results[exercise_id] = result
+    return results
+
+
+def progression_for_user(user_id, exercise_ids=None):
+    """
+    Progression results keyed by exercise id, from cache where possible. Only
+    exercises without a cached curve are loaded and fitted, in one batch.
+    """
+    if exercise_ids is None:
+        exercise_ids = list(
+            ExerciseLog.objects.filter(session__user_id=user_id, weight_used__gt=0)
+            .order_by().values_list('exercise_id', flat=True).distinct()
+        )
+    
+    keys = {cache_key(user_id, e): e for e in exercise_ids}
+    cached = cache.get_many(keys)
+    results = {keys[k]: v for k, v in cached.items()}
+    
+    missing = [e for e in exercise_ids if e not in results]
+    if missing:
+        fresh = fit_trends(*load_daily_bests(user_id, missing))
+        cache.set_many({cache_key(user_id, e): r for e, r in fresh.items()}, CACHE_TIMEOUT)
+        results.update(fresh)
+    return results
@@ -0,0 +1,108 @@
+"""
+Maintenance of the materialized WeeklyTrainingSummary table.
+
+Writes to ExerciseLog/WorkoutSession mark their week in DirtyTrainingWeek
+and queue a (deduplicated, slightly delayed) refresh job for the user, so a
+burst of logs during one workout costs a single recomputation. A refresh
+only recomputes the dirty weeks, from one query over those weeks' logs.
+"""
+import datetime
+
+import numpy as np
+from django.db import router, transaction
+
+from FitTrack.sharding import use_shard
+from jobs.queue import enqueue
+from .analytics import MUSCLE_GROUPS, TrainingLog, grouped_sums, week_starts
+from .models import DirtyTrainingWeek, WeeklyTrainingSummary
+
+# Coalesce the logs of one workout into a single refresh
+REFRESH_DELAY = 30
+
+
+def week_start(day):
+    """Monday of the ISO week containing ``day``"""
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def mark_dirty(user_id, dates):
+    """Queue the weeks containing ``dates`` for a refresh"""
+    weeks = {week_start(d if isinstance(d, datetime.date) else datetime.date.fromisoformat(str(d))) for d in dates}
+    if not weeks:
+        return
+    
+    DirtyTrainingWeek.objects.bulk_create(
+        [DirtyTrainingWeek(user_id=user_id, week_start=w) for w in weeks],
+        ignore_conflicts=True,
+    )
+    enqueue(
+        'workouts.refresh_training_summaries',
+        args=[user_id],
+        delay=REFRESH_DELAY,
+        dedupe_key=f'training-summary:{user_id}',
+    )
+
+
+def summarize(log):
+    """Per (week, muscle group) totals for a TrainingLog; yields row dicts"""
+    if not len(log):
+        return
+    
+    n_groups = len(MUSCLE_GROUPS)
+    keys = week_starts(log.days)
+    groups = log.muscle_groups
+    
+    weeks, sets = grouped_sums(keys, groups, n_groups, log.sets)
+    _, reps = grouped_sums(keys, groups, n_groups, log.sets * log.reps)
+    _, volume = grouped_sums(keys, groups, n_groups, log.volume)
+    
+    # Sessions and minutes count once per (session, muscle group)
+    _, first = np.unique(log.session_ids * n_groups + groups, return_index=True)
+    _, sessions = grouped_sums(keys[first], groups[first], n_groups, np.ones(len(first)))
+    _, minutes = grouped_sums(keys[first], groups[first], n_groups, log.minutes[first])
+    
+    for w, g in zip(*np.nonzero(sessions)):
+        yield {
+            'week_start': datetime.date.fromordinal(int(weeks[w])),
+            'muscle_group': MUSCLE_GROUPS[g],
+            'sets': int(sets[w, g]),
+            'reps': int(reps[w, g]),
+            'volume': round(float(volume[w, g]), 2),
+            'sessions': int(sessions[w, g]),
+            'minutes': int(minutes[w, g]),
+        }
+
+
+def refresh_weeks(user_id, weeks):
+    """Recompute the summary rows of ``user_id`` for the given week starts"""
+    weeks = sorted(set(weeks))
+    log = TrainingLog.for_user(user_id, weeks=weeks)
+    rows = [WeeklyTrainingSummary(user_id=user_id, **row) for row in summarize(log)]
+    
+    with transaction.atomic(using=router.db_for_write(WeeklyTrainingSummary)):
+        WeeklyTrainingSummary.objects.filter(user_id=user_id, week_start__in=weeks).delete()
+        WeeklyTrainingSummary.objects.bulk_create(rows)
+    return len(rows)
+
+
+def refresh_dirty(user_id):
+    """Drain the user's dirty-week queue and refresh those weeks"""
+    with transaction.atomic(using=router.db_for_write(DirtyTrainingWeek)):
+        dirty = list(DirtyTrainingWeek.objects.filter(user_id=user_id).values_list('id', 'week_start'))
+        if not dirty:
+            return 0
+        DirtyTrainingWeek.objects.filter(id__in=[pk for pk, _ in dirty]).delete()
+        return refresh_weeks(user_id, [w for _, w in dirty])
+
+
+def rebuild_user(user_id):
+    """Recompute every summary row of one user from scratch"""
+    with use_shard(user_id):
+        log = TrainingLog.for_user(user_id)
+        rows = [WeeklyTrainingSummary(user_id=user_id, **row) for row in summarize(log)]
+        
+        with transaction.atomic(using=router.db_for_write(WeeklyTrainingSummary)):
+            DirtyTrainingWeek.objects.filter(user_id=user_id).delete()
+            WeeklyTrainingSummary.objects.filter(user_id=user_id).delete()
+            WeeklyTrainingSummary.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
@@ -0,0 +1,35 @@
+from jobs.registry import task
+from .models import WorkoutSession, ExerciseLog, PersonalRecord
+from .summaries import refresh_dirty
+
+
+@task(name='workouts.check_personal_records')
+def check_personal_records(session_id):
+    """Record rep and duration PRs for every exercise logged in a session"""
+    session = WorkoutSession.objects.get(id=session_id)
+    logs = ExerciseLog.objects.filter(session=session)
+    
+    for log in logs:
+        candidates = [
+            ('reps', log.reps_completed, 'reps'),
+            ('duration', log.duration_seconds, 'seconds'),
+        ]
+        for record_type, value, unit in candidates:
+            if not value:
+                continue
+            
+            pr, created = PersonalRecord.objects.get_or_create(
+                user_id=session.user_id,
+                exercise_id=log.exercise_id,
+                record_type=record_type,
+                defaults={'value': value, 'unit': unit},
+            )
+            if not created and value > pr.value:
+                pr.value = value
+                pr.save()
+
+
+@task(name='workouts.refresh_training_summaries')
+def refresh_training_summaries(user_id):
+    """Refresh the weekly training summaries a user's recent writes touched"""
+    refresh_dirty(user_id)
@@ -1,3 +1,325 @@
+import datetime
+import importlib
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
 from django.test import TestCase
 
-# Create your tests here.
+from FitTrack.sharding import shard_for_user, use_shard
+from FitTrack.testing import SHARDS, ShardedTestCase, user_on
+from core.management.commands.rebalance_shards import move_user
+from .analytics import CATEGORIES, MUSCLE_GROUPS, TrainingLog, volume_by_period, workload_ratios
+from .models import (
+    DirtyTrainingWeek, Exercise, ExerciseHistory, ExerciseLog, PersonalRecord, SessionTarget, WeeklyTrainingSummary,
+    Workout, WorkoutExercise, WorkoutSession,
+)
+from .prescription import create_targets, prescribe
+from .progression import MAX_POINTS, WINDOW_DAYS, fit_trends, load_daily_bests, progression_for_user
+from .summaries import rebuild_user
+
+
+def make_exercise(name='Bench Press', category='strength', muscle_group='chest'):
+    return Exercise.objects.create(
+        name=name, description='', category=category, muscle_group=muscle_group, instructions='',
+    )
+
+
+def make_workout(creator=None, name='Push Day'):
+    return Workout.objects.create(
+        creator=creator, name=name, description='', difficulty='beginner', goal='strength',
+        duration=45, estimated_calories=300,
+    )
+
+
+class ShardedWorkoutViewsTest(ShardedTestCase):
+    """Per-user pages read catalog rows from default while the user's rows sit on a shard"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('lifter', password='pw')
+        self.exercise = make_exercise()
+        self.workout = make_workout()
+        with use_shard(self.user.id):
+            self.session = WorkoutSession.objects.create(
+                user=self.user, workout=self.workout, scheduled_date=datetime.date(2024, 5, 6),
+                status='completed', duration_minutes=40,
+            )
+            ExerciseLog.objects.create(
+                session=self.session, exercise=self.exercise, sets_completed=3, reps_completed=5, weight_used=100,
+            )
+            PersonalRecord.objects.create(user=self.user, exercise=self.exercise, record_type='weight', value=100, unit='kg')
+        self.client.force_login(self.user)
+
+    def render_context(self, url):
+        with mock.patch('workouts.views.render', return_value=HttpResponse()) as render:
+            self.client.get(url)
+        return render.call_args[0][2]
+
+    def test_rows_live_on_the_users_shard(self):
+        shard = shard_for_user(self.user.id)
+        self.assertEqual(WorkoutSession.objects.using(shard).count(), 1)
+        self.assertEqual(WorkoutSession.objects.using('default').count(), 0)
+        self.assertEqual(Workout.objects.using(shard).count(), 0)
+
+    def test_workout_history_includes_workouts(self):
+        sessions = self.render_context('/workouts/my-workouts/')['sessions']
+        self.assertEqual([s.workout.name for s in sessions], ['Push Day'])
+
+    def test_personal_records_include_exercises(self):
+        records = self.render_context('/workouts/personal-records/')['records']
+        self.assertEqual([r.exercise.name for r in records], ['Bench Press'])
+
+    def test_training_log_groups_by_exercise_muscle_group(self):
+        with use_shard(self.user.id):
+            log = TrainingLog.for_user(self.user)
+        self.assertEqual(len(log), 1)
+        self.assertEqual(log.muscle_groups.tolist(), [MUSCLE_GROUPS.index('chest')])
+        self.assertEqual(log.volume.tolist(), [1500.0])
+
+    def test_volume_data_by_category(self):
+        data = self.client.get('/workouts/analytics/volume/data/?period=month&by=category').json()
+        self.assertEqual(data['total_volume'], 1500.0)
+
+
+class TrainingAnalyticsTest(TestCase):
+    """Volume and frequency per period and group, and acute:chronic workload, from the log arrays"""
+
+    def setUp(self):
+        day = datetime.date
+        self.log = TrainingLog.from_rows([
+            (day(2024, 5, 6), 1, 1, 'chest', 'strength', 3, 5, 100, 60),
+            (day(2024, 5, 6), 1, 2, 'chest', 'strength', 2, 10, 20, 60),
+            (day(2024, 5, 8), 2, 3, 'legs', 'strength', 5, 5, 140, 45),
+            (day(2024, 5, 8), 2, 4, 'core', 'balance', 3, 0, 0, 45),
+            (day(2024, 5, 13), 3, 1, 'chest', 'strength', 3, 5, 100, 30),
+            (day(2024, 6, 3), 4, 1, 'chest', 'strength', 1, 1, 100, 20),
+        ])
+
+    def column(self, data, name, labels=MUSCLE_GROUPS):
+        index = labels.index(name)
+        return [row[index] for row in data['volume']], [row[index] for row in data['frequency']]
+
+    def test_weekly_volume_by_muscle_group(self):
+        data = volume_by_period(self.log)
+        self.assertEqual(data['periods'], ['2024-05-06', '2024-05-13', '2024-06-03'])
+        self.assertEqual(self.column(data, 'chest'), ([1900.0, 1500.0, 100.0], [1, 1, 1]))
+        self.assertEqual(self.column(data, 'legs'), ([3500.0, 0.0, 0.0], [1, 0, 0]))
+        # Logs without reps or weight count towards frequency only
+        self.assertEqual(self.column(data, 'core'), ([0.0, 0.0, 0.0], [1, 0, 0]))
+
+    def test_monthly_volume_by_category(self):
+        data = volume_by_period(self.log, period='month', by='category')
+        self.assertEqual(data['periods'], ['2024-05', '2024-06'])
+        self.assertEqual(self.column(data, 'strength', CATEGORIES), ([6900.0, 100.0], [3, 1]))
+
+    def test_empty_log(self):
+        data = volume_by_period(TrainingLog.from_rows([]))
+        self.assertEqual((data['periods'], data['volume']), ([], []))
+
+    def test_workload_ratios(self):
+        data = workload_ratios(self.log, until=datetime.date(2024, 5, 19), weeks=3)
+        self.assertEqual(data['dates'], ['2024-05-05', '2024-05-12', '2024-05-19'])
+        self.assertEqual(data['acute'], [0.0, 5400.0, 1500.0])
+        self.assertEqual(data['chronic'], [0.0, 1350.0, 1725.0])
+        self.assertEqual(data['ratio'], [None, 4.0, 0.87])
+
+
+class WeeklyTrainingSummaryTest(TestCase):
+    """The materialized weekly table is filled for existing logs and fresh without a worker"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('lifter', password='pw')
+        self.bench = make_exercise()
+        self.squat = make_exercise(name='Squat', muscle_group='legs')
+        workout = make_workout()
+        for day, weight in [(6, 100), (8, 105), (14, 110)]:
+            session = WorkoutSession.objects.create(
+                user=self.user, workout=workout, scheduled_date=datetime.date(2024, 5, day),
+                status='completed', duration_minutes=40,
+            )
+            ExerciseLog.objects.create(session=session, exercise=self.bench, sets_completed=3, reps_completed=5, weight_used=weight)
+            ExerciseLog.objects.create(session=session, exercise=self.bench, sets_completed=1, reps_completed=8, weight_used=80)
+            ExerciseLog.objects.create(session=session, exercise=self.squat, sets_completed=5, reps_completed=5, weight_used=140)
+        self.client.force_login(self.user)
+
+    def summary_rows(self):
+        return list(WeeklyTrainingSummary.objects.filter(user=self.user).order_by('week_start', 'muscle_group').values(
+            'week_start', 'muscle_group', 'sets', 'reps', 'volume', 'sessions', 'minutes',
+        ))
+
+    def test_migration_backfills_existing_logs(self):
+        rebuild_user(self.user.id)
+        expected = self.summary_rows()
+        WeeklyTrainingSummary.objects.all().delete()
+
+        migration = importlib.import_module('workouts.migrations.0003_dirtytrainingweek_weeklytrainingsummary')
+        migration.backfill_summaries(apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual(self.summary_rows(), expected)
+        self.assertEqual(expected[0], {
+            'week_start': datetime.date(2024, 5, 6), 'muscle_group': 'chest',
+            'sets': 8, 'reps': 46, 'volume': 4355.0, 'sessions': 2, 'minutes': 80,
+        })
+
+    def test_default_view_refreshes_pending_weeks(self):
+        self.assertTrue(DirtyTrainingWeek.objects.filter(user=self.user).exists())
+        self.assertFalse(WeeklyTrainingSummary.objects.exists())
+
+        data = self.client.get('/workouts/analytics/volume/data/').json()
+
+        self.assertFalse(DirtyTrainingWeek.objects.filter(user=self.user).exists())
+        self.assertEqual(data['total_volume'], 4355.0 + 2290.0 + 3 * 3500.0)
+
+
+class RebalancedHistoryTest(ShardedTestCase):
+    """Exercise histories keep pointing at the user's own sessions after a move between shards"""
+
+    def setUp(self):
+        cache.clear()
+        self.source, self.target = SHARDS
+        self.user = user_on(self.source, 'lifter')
+        other = user_on(self.target, 'other')
+        self.exercise = make_exercise(name='Squat', muscle_group='legs')
+        self.workout = make_workout()
+        WorkoutExercise.objects.create(workout=self.workout, exercise=self.exercise, sets=3, reps=5)
+
+        with use_shard(other.id):
+            for day in range(1, 4):
+                WorkoutSession.objects.create(user=other, workout=self.workout, scheduled_date=datetime.date(2024, 1, day))
+        with use_shard(self.user.id):
+            self.session = WorkoutSession.objects.create(
+                user=self.user, workout=self.workout, scheduled_date=datetime.date(2024, 1, 8), status='in_progress',
+            )
+            ExerciseLog.objects.create(session=self.session, exercise=self.exercise, sets_completed=3, reps_completed=5, weight_used=100)
+
+    def test_rating_a_session_after_a_move_reaches_its_history(self):
+        move_user(self.user.id, self.source, self.target)
+
+        with use_shard(self.user.id):
+            session = WorkoutSession.objects.get(user=self.user)
+            session.status, session.difficulty_rating = 'completed', 4
+            session.save()
+
+            history = ExerciseHistory.objects.get(user=self.user, exercise=self.exercise)
+            self.assertEqual(history.last_session_id, session.pk)
+            self.assertEqual(history.last_difficulty, 4)
+
+            upcoming = WorkoutSession.objects.create(user=self.user, workout=self.workout, scheduled_date=datetime.date(2024, 1, 15))
+            target = create_targets(upcoming)[self.exercise.id]
+        self.assertEqual((target.target_reps, target.target_weight), (6, 100))
+
+
+class PrescriptionTest(TestCase):
+    """Double progression from the latest performance of each exercise"""
+
+    def prescribe(self, sets, reps, weight, rating=None, muscle_group='chest'):
+        planned = WorkoutExercise(exercise=Exercise(muscle_group=muscle_group), sets=3, reps=5)
+        history = ExerciseHistory(last_sets=sets, last_reps=reps, last_weight=weight, last_difficulty=rating)
+        return prescribe(planned, history)
+
+    def test_double_progression(self):
+        self.assertEqual(self.prescribe(3, 5, Decimal('100'), rating=3), (3, 5, Decimal('102.5'), 'Add 2.5 kg'))
+        self.assertEqual(self.prescribe(3, 5, Decimal('100'), muscle_group='legs'), (3, 5, Decimal('105'), 'Add 5 kg'))
+        self.assertEqual(self.prescribe(3, 5, Decimal('100'), rating=4), (3, 6, Decimal('100'), 'Same weight, one more rep'))
+        self.assertEqual(self.prescribe(3, 7, Decimal('100'), rating=4), (3, 5, Decimal('102.5'), 'Add 2.5 kg'))
+        self.assertEqual(self.prescribe(3, 4, Decimal('100')), (3, 5, Decimal('100'), 'Repeat last load'))
+        self.assertEqual(self.prescribe(3, 2, Decimal('100')), (3, 5, Decimal('90.0'), 'Deload after a tough session'))
+        self.assertEqual(self.prescribe(3, 5, Decimal('57.5'), rating=5), (3, 5, Decimal('52.0'), 'Deload after a tough session'))
+
+    def test_without_weighted_history_the_plan_is_kept(self):
+        planned = WorkoutExercise(exercise=Exercise(muscle_group='chest'), sets=3, reps=5)
+        self.assertEqual(prescribe(planned, None), (3, 5, None, 'Following the workout plan'))
+        self.assertEqual(self.prescribe(3, 5, None)[2:], (None, 'Following the workout plan'))
+
+    def test_targets_follow_the_latest_log(self):
+        user = User.objects.create_user('lifter', password='pw')
+        bench, plank = make_exercise(), make_exercise(name='Plank', category='balance', muscle_group='core')
+        workout = make_workout()
+        WorkoutExercise.objects.create(workout=workout, exercise=bench, sets=3, reps=5)
+        WorkoutExercise.objects.create(workout=workout, exercise=plank, sets=3, duration=60)
+        for day, weight in [(1, 95), (8, 100)]:
+            session = WorkoutSession.objects.create(user=user, workout=workout, scheduled_date=datetime.date(2024, 5, day), difficulty_rating=3)
+            log = ExerciseLog.objects.create(session=session, exercise=bench, sets_completed=3, reps_completed=5, weight_used=weight)
+
+        history = ExerciseHistory.objects.get(user=user, exercise=bench)
+        self.assertEqual((history.last_session_id, history.last_weight, history.times_logged), (session.pk, 100, 2))
+
+        upcoming = WorkoutSession.objects.create(user=user, workout=workout, scheduled_date=datetime.date(2024, 5, 15))
+        with self.assertNumQueries(3):
+            targets = create_targets(upcoming)
+        self.assertEqual((targets[bench.id].target_weight, targets[plank.id].target_weight), (Decimal('102.5'), None))
+        self.assertEqual(SessionTarget.objects.filter(session=upcoming).count(), 2)
+
+        log.delete()
+        self.assertEqual(ExerciseHistory.objects.get(user=user, exercise=bench).last_weight, 95)
+
+
+class ProgressionTest(TestCase):
+    """Theil-Sen trends of the daily best e1RM"""
+    today = datetime.date(2024, 6, 1)
+
+    def series(self, exercise_id, offsets, values):
+        days = np.array([self.today.toordinal() + offset for offset in offsets], dtype=np.int64)
+        return np.full(len(days), exercise_id, dtype=np.int64), days, np.array(values, dtype=np.float64)
+
+    def fit(self, *series):
+        return fit_trends(*(np.concatenate(parts) for parts in zip(*series)), today=self.today)
+
+    def test_classifies_each_exercise(self):
+        offsets = list(range(-35, 1, 7))
+        results = self.fit(
+            self.series(1, offsets, [100 + 0.5 * (x + 35) for x in offsets]),
+            self.series(2, offsets, [100, 100, 60, 100, 100, 100]),
+            self.series(3, offsets, [100 - 0.2 * (x + 35) for x in offsets]),
+            self.series(4, offsets[:3], [100, 110, 120]),
+        )
+        self.assertEqual({e: r['status'] for e, r in results.items()}, {
+            1: 'progressing', 2: 'plateau', 3: 'regressing', 4: 'insufficient_data',
+        })
+        self.assertEqual(results[1]['slope_per_week'], 3.5)
+        self.assertEqual(results[1]['current'], 117.5)
+        self.assertEqual(results[1]['projections'], {'4w': 131.5, '8w': 145.5, '12w': 159.5})
+        # One bad day does not drag the robust fit down
+        self.assertEqual((results[2]['slope_per_week'], results[2]['current']), (0.0, 100.0))
+        self.assertIsNone(results[4]['slope_per_week'])
+
+    def test_only_recent_points_are_fitted(self):
+        old = list(range(-WINDOW_DAYS - 70, -WINDOW_DAYS, 7))
+        recent = list(range(-MAX_POINTS - 30, 1))
+        results = self.fit(self.series(1, old + recent, [200] * len(old) + [100] * len(recent)))
+        self.assertEqual(results[1]['points_in_window'], MAX_POINTS)
+        self.assertEqual(results[1]['current'], 100.0)
+        self.assertEqual(len(results[1]['dates']), len(old) + len(recent))
+
+    def test_daily_best_is_loaded_once_per_day(self):
+        user = User.objects.create_user('lifter', password='pw')
+        bench = make_exercise()
+        session = WorkoutSession.objects.create(user=user, workout=make_workout(), scheduled_date=datetime.date(2024, 5, 6))
+        for sets, reps, weight in [(3, 5, 100), (1, 1, 110), (1, 10, 90), (2, 8, 0)]:
+            ExerciseLog.objects.create(session=session, exercise=bench, sets_completed=sets, reps_completed=reps, weight_used=weight)
+
+        exercises, days, e1rm = load_daily_bests(user.id)
+        self.assertEqual(exercises.tolist(), [bench.id])
+        self.assertEqual(days.tolist(), [datetime.date(2024, 5, 6).toordinal()])
+        self.assertEqual(e1rm.tolist(), [120.0])  # 90 x 10 beats 100 x 5 and a 110 single
+
+    def test_cached_curves_are_dropped_when_a_log_changes(self):
+        cache.clear()
+        user = User.objects.create_user('lifter', password='pw')
+        bench = make_exercise()
+        session = WorkoutSession.objects.create(user=user, workout=make_workout(), scheduled_date=datetime.date(2024, 5, 6))
+        ExerciseLog.objects.create(session=session, exercise=bench, sets_completed=3, reps_completed=1, weight_used=100)
+        self.assertEqual(progression_for_user(user.id)[bench.id]['e1rm'], [100.0])
+
+        with self.assertNumQueries(0):
+            progression_for_user(user.id, [bench.id])
+        ExerciseLog.objects.create(session=session, exercise=bench, sets_completed=1, reps_completed=1, weight_used=105)
+        self.assertEqual(progression_for_user(user.id)[bench.id]['e1rm'], [105.0])
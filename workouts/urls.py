@@ -22,4 +22,9 @@ urlpatterns = [
     
     # Personal Records
     path('personal-records/', views.personal_records, name='personal_records'),
+    
+    # Analytics
+    path('analytics/volume/', views.training_volume, name='training_volume'),
+    path('analytics/volume/data/', views.training_volume_data, name='training_volume_data'),
+    path('analytics/strength/data/', views.strength_progression_data, name='strength_progression_data'),
 ]
\ No newline at end of file
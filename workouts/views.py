@@ -1,12 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
 from django.utils import timezone
 from datetime import date
+from FitTrack.sharding import attach_global
 from .models import (
     Exercise, Workout, WorkoutExercise, WorkoutSession, 
     ExerciseLog, PersonalRecord
 )
+from .tasks import check_personal_records
+from .analytics import training_summary
+from .progression import progression_for_user
+from .prescription import create_targets
+from jobs.queue import enqueue
 
 
 @login_required
@@ -144,6 +151,7 @@ def start_workout(request, workout_id):
         started_at=timezone.now(),
         status='in_progress',
     )
+    create_targets(session)
     
     messages.success(request, f'Workout "{workout.name}" started!')
     return redirect('workout_session', session_id=session.id)
@@ -158,6 +166,11 @@ def workout_session(request, session_id):
     # Get existing exercise logs for this session
     exercise_logs = ExerciseLog.objects.filter(session=session)
     
+    # Attach the prescribed load to each exercise
+    targets = {t.exercise_id: t for t in session.targets.all()}
+    for we in workout_exercises:
+        we.target = targets.get(we.exercise_id)
+    
     context = {
         'title': f'Session: {session.workout.name}',
         'session': session,
@@ -235,6 +248,8 @@ def complete_workout(request, session_id):
         session.notes = request.POST.get('notes', '')
         session.save()
         
+        enqueue(check_personal_records, args=[session.id], dedupe_key=f'session-prs:{session.id}')
+        
         messages.success(request, 'Workout completed! Great job! 💪')
         return redirect('dashboard')
     
@@ -249,7 +264,7 @@ def complete_workout(request, session_id):
 @login_required
 def my_workouts(request):
     """View user's workout history"""
-    sessions = WorkoutSession.objects.filter(user=request.user).select_related('workout')
+    sessions = attach_global(WorkoutSession.objects.filter(user=request.user), 'workout')
     
     context = {
         'title': 'My Workout History',
@@ -303,11 +318,15 @@ def exercise_detail(request, exercise_id):
         exercise=exercise
     ).select_related('session')[:10]
     
+    # Estimated 1RM trend, plateau status and projections
+    progression = progression_for_user(request.user.id, [exercise.id]).get(exercise.id)
+    
     context = {
         'title': exercise.name,
         'exercise': exercise,
         'personal_record': pr,
         'recent_logs': recent_logs,
+        'progression': progression,
     }
     
     return render(request, 'workouts/exercise_detail.html', context)
@@ -316,11 +335,64 @@ def exercise_detail(request, exercise_id):
 @login_required
 def personal_records(request):
     """View all personal records"""
-    records = PersonalRecord.objects.filter(user=request.user).select_related('exercise')
+    records = attach_global(PersonalRecord.objects.filter(user=request.user), 'exercise')
     
     context = {
         'title': 'Personal Records',
         'records': records,
     }
     
-    return render(request, 'workouts/personal_records.html', context)
\ No newline at end of file
+    return render(request, 'workouts/personal_records.html', context)
+
+
+def _training_params(request):
+    """Validated period/breakdown query parameters for the analytics views"""
+    period = request.GET.get('period', 'week')
+    by = request.GET.get('by', 'muscle_group')
+    if period not in ('week', 'month'):
+        period = 'week'
+    if by not in ('muscle_group', 'category'):
+        by = 'muscle_group'
+    return period, by
+
+
+@login_required
+def training_volume(request):
+    """Training volume, frequency and workload ratios"""
+    period, by = _training_params(request)
+    summary = training_summary(request.user, period=period, by=by)
+    volume = summary['volume']
+    
+    # Most recent periods first, one row per period
+    rows = list(zip(volume['periods'], volume['volume'], volume['frequency']))[-12:]
+    rows.reverse()
+    workload = summary['workload']
+    
+    context = {
+        'title': 'Training Volume',
+        'summary': summary,
+        'period': period,
+        'by': by,
+        'groups': volume['groups'],
+        'rows': rows,
+        'workload_rows': list(zip(workload['dates'], workload['acute'], workload['chronic'], workload['ratio']))[::-1],
+    }
+    
+    return render(request, 'workouts/training_volume.html', context)
+
+
+@login_required
+def training_volume_data(request):
+    """Training volume analytics as JSON"""
+    period, by = _training_params(request)
+    return JsonResponse(training_summary(request.user, period=period, by=by))
+
+
+@login_required
+def strength_progression_data(request):
+    """Estimated-1RM curves, plateau status and projections as JSON"""
+    exercise_id = request.GET.get('exercise')
+    exercise_ids = [int(exercise_id)] if exercise_id and exercise_id.isdigit() else None
+    results = progression_for_user(request.user.id, exercise_ids)
+    
+    return JsonResponse({'exercises': list(results.values())})